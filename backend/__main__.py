@@ -0,0 +1,23 @@
+"""Development server: ``python -m backend``.
+
+The password hashing workers are ``spawn`` children, which re-import the
+main module of the parent. ``multiprocessing`` never does so for a package's
+``__main__``, so the workers import only ``backend.hashing``: no app, no
+database connections.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+
+def main() -> None:
+    # Before the app is imported, so backend/config.py sees the .env values.
+    load_dotenv()
+    from .app import app
+
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 10000)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""Admission control for the ``/api/`` routes.
+
+A few open group tabs poll balances and expenses several times a second, and
+one runaway script can hold every pooled connection. ``install`` adds a
+``before_request`` hook that turns excess requests away before they touch the
+database:
+
+- Rate limits: each request takes a token from a bucket for its session user
+  (the client address before login) and, on group routes, one for the group.
+  Buckets refill at ``RATE_LIMIT_*_RATE`` tokens per second up to
+  ``RATE_LIMIT_*_BURST``. A request that finds a bucket empty gets
+  ``429 rate_limited`` with ``Retry-After`` set to when a token will be there.
+- Concurrency: at most ``ADMISSION_MAX_CONCURRENT`` requests (default: the DB
+  pool size) run at once per process. A request waits up to
+  ``ADMISSION_QUEUE_TIMEOUT`` seconds for a slot, then gets
+  ``503 server_busy``.
+- Writes before reads: reads may not use the last ``ADMISSION_WRITE_RESERVE``
+  fraction of a bucket's tokens or of the slots, and waiting writes are let in
+  before waiting reads, so polling cannot starve expenses and payments.
+- Streamed bodies: a view marked ``@streamed`` keeps its slot until its body
+  has been sent (the view wraps the body in ``stream_with_context``, which
+  defers the teardown that releases it), and at most ``ADMISSION_MAX_STREAMS``
+  of them run at once per process; more get ``503 server_busy`` at once.
+
+The native routes of ``backend/asgi.py`` go through the same controller with
+``check`` and ``release``, so a poller is limited the same way whichever path
+serves it.
+
+Buckets live in a store (``ADMISSION_STORE``): ``memory`` limits each worker
+process on its own; ``sqlite`` keeps them in a small SQLite file shared by the
+workers on one host, a stand-in for a network store such as Redis. Counters
+are reported at ``/metrics`` under ``admission``.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flask import Flask, g, jsonify, request, session
+
+try:
+    from .config import config
+    from .metrics import Histogram
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from config import config  # type: ignore
+    from metrics import Histogram  # type: ignore
+
+# (key, refill rate per second, burst, tokens that must be left after taking one)
+Bucket = Tuple[str, float, float, float]
+# (status, error code, Retry-After seconds)
+Rejection = Tuple[int, str, str]
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+PRUNE_EVERY = 1000
+
+
+def _refill(tokens: float, updated: float, rate: float, burst: float, now: float) -> float:
+    return min(burst, tokens + max(now - updated, 0.0) * rate)
+
+
+def _take(levels: Sequence[float], buckets: Sequence[Bucket]) -> Tuple[float, Optional[str]]:
+    """Seconds until every bucket can give a token (0 when they can now) and the first one short."""
+    wait, short = 0.0, None
+    for tokens, (key, rate, _, floor) in zip(levels, buckets):
+        missing = floor + 1 - tokens
+        if missing > 0:
+            seconds = missing / rate if rate > 0 else math.inf
+            if seconds > wait:
+                wait, short = seconds, key
+    return wait, short
+
+
+class MemoryBucketStore:
+    """Token buckets for this process only."""
+
+    def __init__(self) -> None:
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, buckets: Sequence[Bucket], now: float) -> Tuple[float, Optional[str]]:
+        """Take one token from every bucket, or from none; see ``_take``."""
+        with self._lock:
+            levels = []
+            for key, rate, burst, _ in buckets:
+                bucket = self._buckets.get(key)
+                levels.append(burst if bucket is None else _refill(bucket[0], bucket[1], rate, burst, now))
+            wait, short = _take(levels, buckets)
+            if short is None:
+                for tokens, (key, *_) in zip(levels, buckets):
+                    self._buckets[key] = [tokens - 1, now]
+            self._takes += 1
+            if self._takes % PRUNE_EVERY == 0:
+                self._prune(now)
+        return wait, short
+
+    def _prune(self, now: float) -> None:
+        # A bucket untouched for the longest refill time is full again; forget it.
+        horizon = max(config.RATE_LIMIT_USER_BURST, config.RATE_LIMIT_GROUP_BURST) / min(
+            config.RATE_LIMIT_USER_RATE, config.RATE_LIMIT_GROUP_RATE
+        )
+        for key in [key for key, (_, updated) in self._buckets.items() if now - updated > horizon]:
+            del self._buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"store": "memory", "buckets": len(self._buckets)}
+
+
+class SqliteBucketStore:
+    """Token buckets in a SQLite file, shared by every process that opens it."""
+
+    SCHEMA = "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or config.ADMISSION_SQLITE_PATH
+        self._local = threading.local()
+        self._takes = 0
+        with self._connection() as conn:
+            conn.execute(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=config.SQLITE_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing the last buckets in a power cut only resets some limits.
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, buckets: Sequence[Bucket], now: float) -> Tuple[float, Optional[str]]:
+        conn = self._connection()
+        keys = [bucket[0] for bucket in buckets]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = dict(
+                (key, (tokens, updated))
+                for key, tokens, updated in conn.execute(
+                    f"SELECT key, tokens, updated FROM buckets WHERE key IN ({', '.join('?' * len(keys))})", keys
+                )
+            )
+            levels = []
+            for key, rate, burst, _ in buckets:
+                row = rows.get(key)
+                levels.append(burst if row is None else _refill(row[0], row[1], rate, burst, now))
+            wait, short = _take(levels, buckets)
+            if short is None:
+                conn.executemany(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens=excluded.tokens, updated=excluded.updated",
+                    [(key, tokens - 1, now) for tokens, key in zip(levels, keys)],
+                )
+            self._takes += 1
+            if self._takes % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 3600,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait, short
+
+    def stats(self) -> Dict[str, Any]:
+        (count,) = self._connection().execute("SELECT COUNT(*) FROM buckets").fetchone()
+        return {"store": "sqlite", "path": self.path, "buckets": count}
+
+
+STORES = {
+    "memory": MemoryBucketStore,
+    "sqlite": SqliteBucketStore,
+}
+
+
+class ConcurrencyLimiter:
+    """At most ``limit`` holders; reads only below ``read_limit`` and after every waiting write."""
+
+    def __init__(self, limit: int, write_reserve: float, timeout: float) -> None:
+        self.limit = max(limit, 1)
+        self.read_limit = max(self.limit - math.ceil(self.limit * write_reserve), 1)
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._peak = 0
+        self._waiting_writes = 0
+        self.wait_seconds = Histogram()
+
+    def _free(self, write: bool) -> bool:
+        if write:
+            return self._active < self.limit
+        return self._active < self.read_limit and not self._waiting_writes
+
+    def acquire(self, write: bool) -> bool:
+        start = time.monotonic()
+        with self._cond:
+            if not self._free(write):
+                if write:
+                    self._waiting_writes += 1
+                try:
+                    if not self._cond.wait_for(lambda: self._free(write), timeout=self.timeout):
+                        return False
+                finally:
+                    if write:
+                        self._waiting_writes -= 1
+            self._active += 1
+            self._peak = max(self._peak, self._active)
+        self.wait_seconds.observe(time.monotonic() - start)
+        return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            # Wake everyone: a write may be waiting behind reads that cannot go yet.
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                "limit": self.limit,
+                "read_limit": self.read_limit,
+                "active": self._active,
+                "peak_active": self._peak,
+                "waiting_writes": self._waiting_writes,
+            }
+        stats["wait_seconds"] = self.wait_seconds.snapshot()
+        return stats
+
+
+def streamed(view):
+    """Mark a view whose streamed body reads the database; see the module docstring."""
+    view.admission_streamed = True
+    return view
+
+
+class AdmissionController:
+    def __init__(self, store: Any, limiter: ConcurrencyLimiter, streams: ConcurrencyLimiter) -> None:
+        self.store = store
+        self.limiter = limiter
+        self.streams = streams
+        self._lock = threading.Lock()
+        self._counters = {
+            "admitted": 0,
+            "rate_limited_user": 0,
+            "rate_limited_group": 0,
+            "busy": 0,
+            "busy_streams": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def buckets(self, write: bool, user_key: str, group_id: Optional[int]) -> List[Bucket]:
+        reserve = 0.0 if write else config.ADMISSION_WRITE_RESERVE
+        buckets = [
+            (
+                user_key,
+                config.RATE_LIMIT_USER_RATE,
+                config.RATE_LIMIT_USER_BURST,
+                config.RATE_LIMIT_USER_BURST * reserve,
+            )
+        ]
+        if group_id is not None:
+            buckets.append(
+                (
+                    f"group:{group_id}",
+                    config.RATE_LIMIT_GROUP_RATE,
+                    config.RATE_LIMIT_GROUP_BURST,
+                    config.RATE_LIMIT_GROUP_BURST * reserve,
+                )
+            )
+        return buckets
+
+    def check(self, write: bool, user_key: str, group_id: Optional[int], streamed: bool = False) -> Optional[Rejection]:
+        """``None`` when the request may run (holding a slot, and a stream slot if ``streamed``), else the rejection."""
+        wait, short = self.store.take(self.buckets(write, user_key, group_id), time.time())
+        if short is not None:
+            self._count("rate_limited_group" if short.startswith("group:") else "rate_limited_user")
+            return 429, "rate_limited", str(max(math.ceil(wait), 1) if math.isfinite(wait) else 60)
+        if not self.limiter.acquire(write):
+            self._count("busy")
+            return 503, "server_busy", "1"
+        if streamed and not self.streams.acquire(write):
+            self.limiter.release()
+            self._count("busy_streams")
+            return 503, "server_busy", "1"
+        self._count("admitted")
+        return None
+
+    def admit(self, streamed: bool = False):
+        """``check`` for the current Flask request; the rejection as a response."""
+        user_id = session.get("user_id")
+        rejection = self.check(
+            request.method not in READ_METHODS,
+            f"user:{user_id}" if user_id is not None else f"addr:{request.remote_addr}",
+            (request.view_args or {}).get("group_id"),
+            streamed,
+        )
+        if rejection is None:
+            return None
+        status, error, retry_after = rejection
+        response = jsonify({"error": error})
+        response.status_code = status
+        response.headers["Retry-After"] = retry_after
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "concurrency": self.limiter.stats(),
+            "streams": self.streams.stats(),
+            **self.store.stats(),
+        }
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def stats() -> Dict[str, Any]:
+    return _controller.stats() if _controller is not None else {"enabled": False}
+
+
+def check(method: str, user_key: str, group_id: Optional[int]) -> Optional[Rejection]:
+    """Admit a request served outside Flask; ``None`` when it may run (or admission is off).
+
+    May block for up to ``ADMISSION_QUEUE_TIMEOUT``; an admitted caller must
+    call ``release`` once its response has been sent.
+    """
+    if _controller is None:
+        return None
+    return _controller.check(method not in READ_METHODS, user_key, group_id)
+
+
+def release() -> None:
+    if _controller is not None:
+        _controller.limiter.release()
+
+
+def install(app: Flask) -> None:
+    global _controller
+    if not config.ADMISSION_ENABLED:
+        return
+    _controller = controller = AdmissionController(
+        STORES[config.ADMISSION_STORE](),
+        ConcurrencyLimiter(
+            config.ADMISSION_MAX_CONCURRENT, config.ADMISSION_WRITE_RESERVE, config.ADMISSION_QUEUE_TIMEOUT
+        ),
+        # No queue: a stream would hold its general slot while it waited.
+        ConcurrencyLimiter(config.ADMISSION_MAX_STREAMS, 0.0, 0.0),
+    )
+
+    @app.before_request
+    def admit_request():
+        if not request.path.startswith("/api/") or request.method == "OPTIONS":
+            return None
+        is_streamed = getattr(app.view_functions.get(request.endpoint), "admission_streamed", False)
+        rejection = controller.admit(is_streamed)
+        if rejection is None:
+            g.admission_slot = True
+            g.admission_stream = is_streamed
+        return rejection
+
+    @app.teardown_request
+    def release_admission_slot(exc: Optional[BaseException]) -> None:
+        if g.pop("admission_stream", False):
+            controller.streams.release()
+        if g.pop("admission_slot", False):
+            controller.limiter.release()
@@ -1,35 +1,87 @@
 
 from __future__ import annotations
 
+import base64
+import heapq
+import hmac
+import json
 import math
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from datetime import datetime
 from functools import wraps
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 
 from flask import (
     Flask,
+    Response,
     jsonify,
     request,
     session,
     send_from_directory,
+    stream_with_context,
 )
 from flask_cors import CORS
-from werkzeug.security import check_password_hash, generate_password_hash
 
 try:
+    from . import (
+        admission,
+        assets,
+        changes,
+        compression,
+        exporter,
+        importer,
+        instrumentation,
+        ledger,
+        membership,
+        money,
+        payments,
+        positions,
+        queries,
+        response_cache,
+        settlement,
+    )
+    from .async_db import adb
     from .config import config
     from .db import db
+    from .events import hub
+    from .hashing import HashingBusy, hasher
+    from .json_provider import FastJSONProvider
+    from .pool import PoolTimeout
 except ImportError:  # pragma: no cover - fallback for direct execution
+    import admission  # type: ignore
+    import assets  # type: ignore
+    import changes  # type: ignore
+    import compression  # type: ignore
+    import exporter  # type: ignore
+    import importer  # type: ignore
+    import instrumentation  # type: ignore
+    import ledger  # type: ignore
+    import membership  # type: ignore
+    import money  # type: ignore
+    import payments  # type: ignore
+    import positions  # type: ignore
+    import queries  # type: ignore
+    import response_cache  # type: ignore
+    import settlement  # type: ignore
+    from async_db import adb  # type: ignore
     from config import config  # type: ignore
     from db import db  # type: ignore
-
+    from events import hub  # type: ignore
+    from hashing import HashingBusy, hasher  # type: ignore
+    from json_provider import FastJSONProvider  # type: ignore
+    from pool import PoolTimeout  # type: ignore
+
+EXPENSE_PAGE_DEFAULT = 50
+EXPENSE_PAGE_MAX = 200
+ACTIVITY_PAGE_DEFAULT = 20
+ACTIVITY_PAGE_MAX = 100
+ACTIVITY_GROUPS_PER_QUERY = 100
+IMPORT_ERRORS_MAX = 100
+SETTLE_BUDGET_MAX_MS = 1000
 
 def create_app() -> Flask:
-    app = Flask(
-        __name__,
-        static_folder="../frontend",
-        static_url_path="",
-    )
+    # No built-in static route: serve_frontend serves frontend/ or, once built, the hashed assets.
+    app = Flask(__name__, static_folder=None)
+    app.json = FastJSONProvider(app)
     app.config["SECRET_KEY"] = config.SECRET_KEY
     app.config["SESSION_COOKIE_NAME"] = config.SESSION_COOKIE_NAME
     app.config["SESSION_COOKIE_HTTPONLY"] = config.SESSION_COOKIE_HTTPONLY
@@ -41,7 +93,30 @@ def create_app() -> Flask:
         resources={r"/api/*": {"origins": config.CORS_ORIGINS}},
     )
 
+    instrumentation.install(app)
+    admission.install(app)
+    # Registered after instrumentation so it runs first and its time is in Server-Timing.
+    compression.install(app)
     register_routes(app)
+
+    @app.errorhandler(PoolTimeout)
+    def database_busy(exc: PoolTimeout):
+        response = jsonify({"error": "database_busy"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+
+    @app.errorhandler(payments.SettlementError)
+    def settlement_error(exc: payments.SettlementError):
+        return jsonify({"error": exc.code, **exc.details}), exc.status
+
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(exc: HashingBusy):
+        response = jsonify({"error": "auth_busy"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+
     return app
 
 
@@ -56,10 +131,37 @@ def require_login(func):
 
 
 def register_routes(app: Flask) -> None:
+    asset_index = assets.load()
+
     @app.route("/", defaults={"path": "index.html"})
     @app.route("/<path:path>")
     def serve_frontend(path: str):
-        return send_from_directory(app.static_folder, path)
+        asset = asset_index.lookup(path) if asset_index is not None else None
+        if asset is not None:
+            return asset_index.response(*asset)
+        return send_from_directory(assets.SOURCE_DIR, path)
+
+    @app.get("/metrics")
+    def metrics():
+        if not config.METRICS_ENABLED:
+            return jsonify({"error": "not_found"}), 404
+        if config.METRICS_TOKEN and not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {config.METRICS_TOKEN}"
+        ):
+            return jsonify({"error": "authentication_required"}), 401
+        return jsonify(
+            {
+                "admission": admission.stats(),
+                "membership_cache": membership.stats(),
+                "my_balances_cache": positions.stats(),
+                "response_cache": response_cache.stats(),
+                "db": db.stats(),
+                "async_db": adb.stats(),
+                "compression": compression.stats(),
+                "password_hashing": hasher.stats(),
+                **instrumentation.snapshot(),
+            }
+        )
 
     @app.post("/api/register")
     def register():
@@ -71,15 +173,21 @@ def register_routes(app: Flask) -> None:
         if not name or not email or not password:
             return jsonify({"error": "missing_fields"}), 400
 
-        existing = db.fetch_one("SELECT id FROM users WHERE email=%s", (email,))
-        if existing:
+        # Cheap check first: a duplicate must not cost a KDF run or a hashing queue slot.
+        if db.fetch_one(queries.EMAIL_IN_USE_SQL, (email,)):
             return jsonify({"error": "email_in_use"}), 409
 
-        password_hash = generate_password_hash(password)
-        user_id = db.execute(
-            "INSERT INTO users (name, email, password) VALUES (%s, %s, %s)",
-            (name, email, password_hash),
-        )
+        password_hash = hasher.hash(password)
+        with db.transaction() as tx:
+            # Again inside the transaction, for a registration that raced this one.
+            existing = tx.fetch_one(queries.EMAIL_IN_USE_SQL, (email,))
+            if existing:
+                return jsonify({"error": "email_in_use"}), 409
+
+            user_id = tx.execute(
+                "INSERT INTO users (name, email, password) VALUES (%s, %s, %s)",
+                (name, email, password_hash),
+            )
 
         session["user_id"] = user_id
         session["user_name"] = name
@@ -95,9 +203,18 @@ def register_routes(app: Flask) -> None:
         if not email or not password:
             return jsonify({"error": "missing_fields"}), 400
 
-        user = db.fetch_one("SELECT id, name, password FROM users WHERE email=%s", (email,))
-        if not user or not check_password_hash(user["password"], password):
+        user = db.fetch_one(queries.USER_BY_EMAIL_SQL, (email,))
+        if not user:
+            return jsonify({"error": "invalid_credentials"}), 401
+        ok, rehashed = hasher.verify(user["password"], password)
+        if not ok:
             return jsonify({"error": "invalid_credentials"}), 401
+        if rehashed is not None:
+            # Hashing parameters changed since this password was stored; upgrade it.
+            db.execute(
+                "UPDATE users SET password=%s WHERE id=%s AND password=%s",
+                (rehashed, user["id"], user["password"]),
+            )
 
         session["user_id"] = user["id"]
         session["user_name"] = user["name"]
@@ -125,19 +242,34 @@ def register_routes(app: Flask) -> None:
     @require_login
     def list_groups():
         user_id = session["user_id"]
-        groups = db.fetch_all(
-            """
-            SELECT g.id, g.group_name, u.name AS created_by_name
-            FROM `groups` g
-            JOIN users u ON g.created_by = u.id
-            JOIN group_members gm ON gm.group_id = g.id
-            WHERE gm.user_id = %s
-            ORDER BY g.group_name
-            """,
-            (user_id,),
-        )
+        groups = db.fetch_all(queries.LIST_GROUPS_SQL, (user_id,))
         return jsonify(groups)
 
+    @app.get("/api/me/activity")
+    @require_login
+    def get_my_activity():
+        try:
+            limit = _parse_limit(request.args.get("limit"), ACTIVITY_PAGE_DEFAULT, ACTIVITY_PAGE_MAX)
+            cursor = _decode_cursor(request.args.get("cursor"))
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+
+        group_ids = [row["group_id"] for row in db.fetch_all(queries.MY_GROUP_IDS_SQL, (session["user_id"],))]
+        candidates: List[Dict[str, Any]] = []
+        for start in range(0, len(group_ids), ACTIVITY_GROUPS_PER_QUERY):
+            batch = group_ids[start : start + ACTIVITY_GROUPS_PER_QUERY]
+            candidates.extend(db.fetch_all(*queries.activity_query(batch, limit, cursor)))
+        # At most limit + 1 rows per group; the page is the newest limit + 1 of them.
+        expenses = heapq.nlargest(limit + 1, candidates, key=lambda row: (row["date_added"], row["id"]))
+        expenses, next_cursor = _trim_page(expenses, limit)
+
+        return jsonify({"expenses": expenses, "next_cursor": next_cursor})
+
+    @app.get("/api/me/balances")
+    @require_login
+    def get_my_balances():
+        return jsonify(positions.for_user(session["user_id"]))
+
     @app.post("/api/groups")
     @require_login
     def create_group():
@@ -148,16 +280,18 @@ def register_routes(app: Flask) -> None:
             return jsonify({"error": "missing_group_name"}), 400
 
         user_id = session["user_id"]
-        group_id = db.execute(
-            "INSERT INTO `groups` (group_name, created_by) VALUES (%s, %s)",
-            (name, user_id),
-        )
+        with db.transaction() as tx:
+            group_id = tx.execute(
+                "INSERT INTO `groups` (group_name, created_by) VALUES (%s, %s)",
+                (name, user_id),
+            )
 
-        db.execute(
-            "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)",
-            (group_id, user_id),
-        )
+            tx.execute(
+                "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)",
+                (group_id, user_id),
+            )
 
+        hub.publish(group_id, "member_joined", user_id=user_id)
         return jsonify({"id": group_id, "group_name": name, "created_by": user_id}), 201
 
     @app.post("/api/groups/<int:group_id>/join")
@@ -165,21 +299,23 @@ def register_routes(app: Flask) -> None:
     def join_group(group_id: int):
         user_id = session["user_id"]
 
-        existing = db.fetch_one(
-            "SELECT id FROM group_members WHERE group_id=%s AND user_id=%s",
-            (group_id, user_id),
-        )
-        if existing:
-            return jsonify({"status": "already_joined"})
+        with db.transaction() as tx:
+            existing = tx.fetch_one(queries.MEMBERSHIP_SQL, (group_id, user_id))
+            if existing:
+                return jsonify({"status": "already_joined"})
 
-        group = db.fetch_one("SELECT id FROM `groups` WHERE id=%s", (group_id,))
-        if not group:
-            return jsonify({"error": "group_not_found"}), 404
+            group = tx.fetch_one("SELECT id FROM `groups` WHERE id=%s", (group_id,))
+            if not group:
+                return jsonify({"error": "group_not_found"}), 404
 
-        db.execute(
-            "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)",
-            (group_id, user_id),
-        )
+            tx.execute(
+                "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)",
+                (group_id, user_id),
+            )
+            # The member list is part of the balances response, so it moves the version too.
+            version = changes.bump(tx, group_id, [])
+        membership.invalidate(group_id, user_id)
+        hub.publish(group_id, "member_joined", user_id=user_id, version=version)
         return jsonify({"status": "joined"})
 
     @app.get("/api/groups/<int:group_id>/members")
@@ -188,16 +324,7 @@ def register_routes(app: Flask) -> None:
         if not _user_in_group(session["user_id"], group_id):
             return jsonify({"error": "not_authorized"}), 403
 
-        members = db.fetch_all(
-            """
-            SELECT u.id, u.name, u.email
-            FROM group_members gm
-            JOIN users u ON gm.user_id = u.id
-            WHERE gm.group_id=%s
-            ORDER BY u.name
-            """,
-            (group_id,),
-        )
+        members = db.fetch_all(queries.MEMBERS_SQL, (group_id,))
         return jsonify(members)
 
     @app.get("/api/groups/<int:group_id>/expenses")
@@ -206,196 +333,176 @@ def register_routes(app: Flask) -> None:
         if not _user_in_group(session["user_id"], group_id):
             return jsonify({"error": "not_authorized"}), 403
 
-        expenses = db.fetch_all(
-            """
-            SELECT e.id, e.title, e.amount, e.paid_by, e.date_added, u.name AS paid_by_name
-            FROM expenses e
-            JOIN users u ON e.paid_by = u.id
-            WHERE e.group_id=%s
-            ORDER BY e.date_added DESC
-            """,
-            (group_id,),
-        )
-
-        expense_ids = [exp["id"] for exp in expenses]
-        shares_map: Dict[int, List[Dict[str, Any]]] = {}
-        contributions_map: Dict[int, List[Dict[str, Any]]] = {}
-        contributions_total_map: Dict[Tuple[int, int], Decimal] = {}
-        payments_map: Dict[Tuple[int, int], Decimal] = {}
-
-        if expense_ids:
-            placeholders = ", ".join(["%s"] * len(expense_ids))
-            shares = db.fetch_all(
-                f"""
-                SELECT es.expense_id, es.user_id, es.share_amount, u.name
-                FROM expense_shares es
-                JOIN users u ON es.user_id = u.id
-                WHERE es.expense_id IN ({placeholders})
-                """,
-                expense_ids,
-            )
-            for share in shares:
-                shares_map.setdefault(share["expense_id"], []).append(
-                    {
-                        "user_id": share["user_id"],
-                        "name": share["name"],
-                        "share_amount": float(share["share_amount"]),
-                    }
-                )
-
-            contributions = db.fetch_all(
-                f"""
-                SELECT ec.expense_id, ec.user_id, ec.amount, u.name
-                FROM expense_contributions ec
-                JOIN users u ON ec.user_id = u.id
-                WHERE ec.expense_id IN ({placeholders})
-                """,
-                expense_ids,
-            )
-            for contribution in contributions:
-                amount_decimal = _to_decimal(contribution["amount"])
-                contributions_total_map[(contribution["expense_id"], contribution["user_id"])] = (
-                    contributions_total_map.get((contribution["expense_id"], contribution["user_id"]), Decimal("0.00"))
-                    + amount_decimal
-                )
-                contributions_map.setdefault(contribution["expense_id"], []).append(
-                    {
-                        "user_id": contribution["user_id"],
-                        "name": contribution["name"],
-                        "amount": float(amount_decimal),
-                    }
-                )
-
-            payments = db.fetch_all(
-                f"""
-                SELECT expense_id, user_id, SUM(amount) AS total_paid
-                FROM expense_payments
-                WHERE expense_id IN ({placeholders})
-                GROUP BY expense_id, user_id
-                """,
-                expense_ids,
-            )
-            for payment in payments:
-                payments_map[(payment["expense_id"], payment["user_id"])] = _to_decimal(
-                    payment["total_paid"] or 0
-                )
-
-        for expense in expenses:
-            expense_shares = shares_map.get(expense["id"], [])
-            for share in expense_shares:
-                share_amount_decimal = _to_decimal(share["share_amount"])
-                paid_amount = payments_map.get((expense["id"], share["user_id"]), Decimal("0.00"))
-                contribution_amount = contributions_total_map.get((expense["id"], share["user_id"]), Decimal("0.00"))
-                total_credit = paid_amount + contribution_amount
-                applied_credit = min(total_credit, share_amount_decimal)
-                pending_amount = (share_amount_decimal - applied_credit).quantize(Decimal("0.01"))
-                if pending_amount < Decimal("0.00"):
-                    pending_amount = Decimal("0.00")
-                share["paid_amount"] = float(applied_credit.quantize(Decimal("0.01")))
-                share["pending_amount"] = float(pending_amount)
-            expense["shares"] = expense_shares
-            if expense["id"] in contributions_map:
-                expense["contributions"] = contributions_map[expense["id"]]
-            else:
-                expense["contributions"] = [
-                    {
-                        "user_id": expense["paid_by"],
-                        "name": expense["paid_by_name"],
-                        "amount": float(expense["amount"]),
-                    }
-                ]
-            expense["amount"] = float(expense["amount"])
-
-        return jsonify(expenses)
+        try:
+            limit = _parse_limit(request.args.get("limit"))
+            cursor = _decode_cursor(request.args.get("cursor"))
+            since = _parse_since(request.args.get("since"))
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+
+        # Read the version first: anything written after it is picked up by the next delta.
+        version = changes.current_version(group_id)
+        not_modified = _not_modified(group_id, version, since)
+        if not_modified is not None:
+            return not_modified
+
+        if since is not None:
+            if since > version:
+                return jsonify({"error": "invalid_since"}), 400
+
+            def build_delta() -> Response:
+                changed_ids, deleted_ids = changes.changes_since(group_id, since)
+                if len(changed_ids) > EXPENSE_PAGE_MAX:
+                    resync = jsonify({"error": "resync_required", "version": version})
+                    resync.status_code = 409
+                    return resync
+
+                changed: List[Dict[str, Any]] = []
+                if changed_ids:
+                    changed = db.fetch_all(*queries.changed_expenses_query(group_id, changed_ids))
+                    _attach_expense_details(changed)
+                return jsonify({"version": version, "changed": changed, "deleted": sorted(deleted_ids)})
+
+            response = response_cache.cached("expense_changes", group_id, version, (since,), build_delta)
+            return _with_etag(response, group_id, version)
+
+        def build_page() -> Response:
+            expenses = db.fetch_all(*queries.expense_page_query(group_id, limit, cursor))
+            expenses, next_cursor = _trim_page(expenses, limit)
+            _attach_expense_details(expenses)
+            return jsonify({"expenses": expenses, "next_cursor": next_cursor, "version": version})
+
+        response = response_cache.cached("expenses", group_id, version, (limit, cursor), build_page)
+        return _with_etag(response, group_id, version)
 
     @app.post("/api/groups/<int:group_id>/expenses")
     @require_login
     def add_expense(group_id: int):
         payload = request.get_json(force=True) or {}
-        title = (payload.get("title") or "").strip()
-        amount = payload.get("amount")
-        paid_by = payload.get("paid_by")
-        split_among = payload.get("split_among") or []
-        shares_payload = payload.get("shares")
-        contributors_payload = payload.get("contributors") or []
-
-        if not title or amount is None:
-            return jsonify({"error": "missing_fields"}), 400
-
-        if not isinstance(amount, (int, float, str, Decimal)):
-            return jsonify({"error": "invalid_amount"}), 400
-
-        amount_decimal = _to_decimal(amount)
-        if amount_decimal <= 0:
-            return jsonify({"error": "invalid_amount"}), 400
 
+        # Resolve every referenced member in one query; the checks below hit the request memo.
+        membership.members_of(group_id, [session["user_id"], *_payload_user_ids(payload)])
         if not _user_in_group(session["user_id"], group_id):
             return jsonify({"error": "not_authorized"}), 403
 
-        shares: List[Tuple[int, Decimal]] = []
-        if shares_payload:
-            try:
-                shares = _normalize_custom_shares(shares_payload, group_id)
-            except ValueError as exc:
-                return jsonify({"error": str(exc)}), 400
-        else:
-            if not split_among:
-                return jsonify({"error": "missing_fields"}), 400
-            if not all(_user_in_group(user_id, group_id) for user_id in split_among):
-                return jsonify({"error": "invalid_split_members"}), 400
-            shares = _calculate_equal_shares(amount_decimal, split_among)
-
-        share_total = sum(share_amount for _, share_amount in shares)
-        if not _amounts_close(share_total, amount_decimal):
-            return jsonify({"error": "share_total_mismatch"}), 400
-
-        contributions: List[Tuple[int, Decimal]] = []
-        if contributors_payload:
-            try:
-                contributions = _normalize_contributions(contributors_payload, group_id)
-            except ValueError as exc:
-                return jsonify({"error": str(exc)}), 400
-        else:
-            if paid_by is None:
-                paid_by = session["user_id"]
-            if not _user_in_group(paid_by, group_id):
-                return jsonify({"error": "payer_not_in_group"}), 400
-            contributions = [(paid_by, amount_decimal)]
-
-        contribution_total = sum(amount for _, amount in contributions)
-        if not _amounts_close(contribution_total, amount_decimal):
-            return jsonify({"error": "contribution_total_mismatch"}), 400
+        try:
+            title, amount_cents, shares, contributions = _validate_expense(
+                payload,
+                lambda user_id: _user_in_group(user_id, group_id),
+                session["user_id"],
+            )
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
 
         primary_payer = contributions[0][0]
 
-        expense_id = db.execute(
-            """
-            INSERT INTO expenses (group_id, title, amount, paid_by)
-            VALUES (%s, %s, %s, %s)
-            """,
-            (group_id, title, str(amount_decimal), primary_payer),
-        )
-
-        for user_id, share_amount in shares:
-            db.execute(
+        with db.transaction() as tx:
+            expense_id = tx.execute(
                 """
-                INSERT INTO expense_shares (expense_id, user_id, share_amount)
-                VALUES (%s, %s, %s)
+                INSERT INTO expenses (group_id, title, amount, paid_by)
+                VALUES (%s, %s, %s, %s)
                 """,
-                (expense_id, user_id, str(share_amount)),
+                (group_id, title, money.to_sql(amount_cents), primary_payer),
             )
 
-        for user_id, amount_paid in contributions:
-            db.execute(
-                """
-                INSERT INTO expense_contributions (expense_id, user_id, amount)
-                VALUES (%s, %s, %s)
-                """,
-                (expense_id, user_id, str(amount_paid)),
+            tx.insert_many(
+                "expense_shares",
+                ("expense_id", "user_id", "share_amount"),
+                [(expense_id, user_id, money.to_sql(share_amount)) for user_id, share_amount in shares],
+            )
+            tx.insert_many(
+                "expense_contributions",
+                ("expense_id", "user_id", "amount"),
+                [(expense_id, user_id, money.to_sql(amount_paid)) for user_id, amount_paid in contributions],
             )
 
+            ledger.record_expense(tx, group_id, shares, contributions)
+            version = changes.bump(tx, group_id, [(expense_id, changes.UPSERT)])
+
+        hub.publish(group_id, "expense_added", expense_id=expense_id, version=version)
         return jsonify({"id": expense_id}), 201
 
+    @app.post("/api/groups/<int:group_id>/expenses/import")
+    @require_login
+    def import_expenses(group_id: int):
+        if not _user_in_group(session["user_id"], group_id):
+            return jsonify({"error": "not_authorized"}), 403
+
+        fmt = importer.detect_format(request.mimetype, request.args.get("format"))
+        if fmt is None:
+            return jsonify({"error": "unsupported_media_type"}), 415
+
+        members = membership.group_members(group_id)
+
+        def is_member(user_id: Any) -> bool:
+            return membership.as_user_id(user_id) in members
+
+        imported = 0
+        failed = 0
+        errors: List[Dict[str, Any]] = []
+        version = None
+        chunk: List[importer.ValidExpense] = []
+
+        def reject(line: int, code: str) -> None:
+            nonlocal failed
+            failed += 1
+            if len(errors) < IMPORT_ERRORS_MAX:
+                errors.append({"line": line, "error": code})
+
+        def flush() -> None:
+            nonlocal imported, version
+            if chunk:
+                expense_ids, version = importer.insert_expenses(group_id, chunk)
+                imported += len(expense_ids)
+                chunk.clear()
+
+        line = 0
+        try:
+            for line, payload, error in importer.parse(fmt, importer.open_text(request.stream)):
+                if error:
+                    reject(line, error)
+                    continue
+                try:
+                    chunk.append(_validate_expense(payload, is_member, session["user_id"]))
+                except ValueError as exc:
+                    reject(line, str(exc))
+                    continue
+                if len(chunk) >= importer.CHUNK_ROWS:
+                    flush()
+        except importer.ImportFormatError as exc:
+            # Parsing cannot continue past this point; the rows before it are still imported.
+            if not imported and not chunk:
+                return jsonify({"error": str(exc), "line": line + 1}), 400
+            reject(line + 1, str(exc))
+        flush()
+
+        if version is not None:
+            hub.publish(group_id, "expenses_imported", count=imported, version=version)
+        return jsonify({"imported": imported, "failed": failed, "errors": errors, "version": version}), 200
+
+    @app.get("/api/groups/<int:group_id>/export")
+    @require_login
+    @admission.streamed
+    def export_expenses(group_id: int):
+        if not _user_in_group(session["user_id"], group_id):
+            return jsonify({"error": "not_authorized"}), 403
+
+        fmt = request.args.get("format", "csv")
+        if fmt not in exporter.STREAMS:
+            return jsonify({"error": "invalid_format"}), 400
+
+        # Takes the connection now: a busy pool is a 503 here, not a truncated 200 later.
+        body = exporter.open_export(group_id, fmt)
+        return Response(
+            stream_with_context(body),
+            mimetype=exporter.MIMETYPES[fmt],
+            headers={
+                "Content-Disposition": f'attachment; filename="group-{group_id}-expenses.{fmt}"',
+                "Cache-Control": "no-store",
+                "X-Accel-Buffering": "no",
+            },
+        )
+
     @app.delete("/api/groups/<int:group_id>/expenses/<int:expense_id>")
     @require_login
     def delete_expense(group_id: int, expense_id: int):
@@ -403,130 +510,78 @@ def register_routes(app: Flask) -> None:
         if not _user_in_group(session["user_id"], group_id):
             return jsonify({"error": "not_authorized"}), 403
 
-        expense = db.fetch_one(
-            "SELECT id, paid_by FROM expenses WHERE id=%s AND group_id=%s",
-            (expense_id, group_id),
-        )
-        if not expense:
-            return jsonify({"error": "expense_not_found"}), 404
+        with db.transaction() as tx:
+            expense = tx.fetch_one(queries.EXPENSE_FOR_DELETE_SQL, (expense_id, group_id))
+            if not expense:
+                return jsonify({"error": "expense_not_found"}), 404
+
+            # Only the user who paid the expense may delete it
+            if expense["paid_by"] != session.get("user_id"):
+                return jsonify({"error": "forbidden_only_payer_can_delete"}), 403
 
-        # Only the user who paid the expense may delete it
-        if expense["paid_by"] != session.get("user_id"):
-            return jsonify({"error": "forbidden_only_payer_can_delete"}), 403
+            ledger.remove_expense(tx, group_id, expense_id)
 
-        # Delete related rows: payments, contributions, shares, then expense
-        db.execute("DELETE FROM expense_payments WHERE expense_id=%s", (expense_id,))
-        db.execute("DELETE FROM expense_contributions WHERE expense_id=%s", (expense_id,))
-        db.execute("DELETE FROM expense_shares WHERE expense_id=%s", (expense_id,))
-        db.execute("DELETE FROM expenses WHERE id=%s", (expense_id,))
+            # Delete related rows: payments, contributions, shares, then expense
+            for statement in queries.DELETE_EXPENSE_SQL:
+                tx.execute(statement, (expense_id,))
+            version = changes.bump(tx, group_id, [(expense_id, changes.DELETE)])
 
+        hub.publish(group_id, "expense_deleted", expense_id=expense_id, version=version)
         return jsonify({"status": "deleted"}), 200
 
-    @app.get("/api/groups/<int:group_id>/balances")
+    @app.get("/api/groups/<int:group_id>/events")
     @require_login
-    def get_group_balances(group_id: int):
+    def stream_group_events(group_id: int):
         if not _user_in_group(session["user_id"], group_id):
             return jsonify({"error": "not_authorized"}), 403
 
-        members = db.fetch_all(
-            """
-            SELECT u.id, u.name
-            FROM group_members gm
-            JOIN users u ON gm.user_id = u.id
-            WHERE gm.group_id=%s
-            """,
-            (group_id,),
-        )
+        subscription = hub.subscribe(group_id)
 
-        contributions = db.fetch_all(
-            """
-            SELECT ec.user_id, SUM(ec.amount) AS total_paid
-            FROM expense_contributions ec
-            JOIN expenses e ON ec.expense_id = e.id
-            WHERE e.group_id=%s
-            GROUP BY ec.user_id
-            """,
-            (group_id,),
+        def stream():
+            try:
+                yield "retry: 3000\n\n"
+                while True:
+                    event = subscription.get(timeout=config.EVENTS_HEARTBEAT)
+                    if event is None:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield f"data: {json.dumps(event)}\n\n"
+            finally:
+                hub.unsubscribe(subscription)
+
+        return Response(
+            stream(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
-        if not contributions:
-            contributions = db.fetch_all(
-                """
-                SELECT paid_by AS user_id, SUM(amount) AS total_paid
-                FROM expenses
-                WHERE group_id=%s
-                GROUP BY paid_by
-                """,
-                (group_id,),
-            )
 
-        owed = db.fetch_all(
-            """
-            SELECT user_id, SUM(share_amount) AS total_owed
-            FROM expense_shares es
-            JOIN expenses e ON es.expense_id = e.id
-            WHERE e.group_id=%s
-            GROUP BY user_id
-            """,
-            (group_id,),
-        )
+    @app.get("/api/groups/<int:group_id>/balances")
+    @require_login
+    def get_group_balances(group_id: int):
+        if not _user_in_group(session["user_id"], group_id):
+            return jsonify({"error": "not_authorized"}), 403
 
-        contrib_map = {row["user_id"]: _to_decimal(row["total_paid"] or 0) for row in contributions}
-        owed_map = {row["user_id"]: _to_decimal(row["total_owed"] or 0) for row in owed}
-
-        share_credit_rows = db.fetch_all(
-            """
-            SELECT es.user_id,
-                   es.share_amount,
-                   COALESCE(pay.amount, 0) AS payments_amount,
-                   COALESCE(contrib.amount, 0) AS contributions_amount
-            FROM expense_shares es
-            JOIN expenses e ON es.expense_id = e.id
-            LEFT JOIN (
-                SELECT expense_id, user_id, SUM(amount) AS amount
-                FROM expense_payments
-                GROUP BY expense_id, user_id
-            ) pay ON pay.expense_id = es.expense_id AND pay.user_id = es.user_id
-            LEFT JOIN (
-                SELECT expense_id, user_id, SUM(amount) AS amount
-                FROM expense_contributions
-                GROUP BY expense_id, user_id
-            ) contrib ON contrib.expense_id = es.expense_id AND contrib.user_id = es.user_id
-            WHERE e.group_id=%s
-            """,
-            (group_id,),
-        )
+        try:
+            since = _parse_since(request.args.get("since"))
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
 
-        share_credit_map: Dict[int, Decimal] = {}
-        for row in share_credit_rows:
-            user_id = row["user_id"]
-            share_amount = _to_decimal(row["share_amount"])
-            payments_amount = _to_decimal(row["payments_amount"] or 0)
-            contributions_amount = _to_decimal(row["contributions_amount"] or 0)
-            total_credit = min(share_amount, payments_amount + contributions_amount)
-            share_credit_map[user_id] = share_credit_map.get(user_id, Decimal("0.00")) + total_credit
-
-        balances = []
-        for member in members:
-            user_id = member["id"]
-            net_amount = contrib_map.get(user_id, Decimal("0.00")) - owed_map.get(user_id, Decimal("0.00"))
-            balances.append(
-                {
-                    "user_id": user_id,
-                    "name": member["name"],
-                    "net_balance": float(net_amount.quantize(Decimal("0.01"))),
-                }
-            )
+        try:
+            settle_mode, budget_ms = _parse_settle(request.args)
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
 
-        for balance in balances:
-            user_id = balance["user_id"]
-            paid_towards_shares = share_credit_map.get(user_id, Decimal("0.00"))
-            balance["paid_towards_shares"] = float(paid_towards_shares.quantize(Decimal("0.01")))
-            balance["pending_amount"] = float(
-                max(Decimal("0.00"), owed_map.get(user_id, Decimal("0.00")) - paid_towards_shares).quantize(Decimal("0.01"))
-            )
+        version = changes.current_version(group_id)
+        not_modified = _not_modified(group_id, version, since)
+        if not_modified is not None:
+            return not_modified
+
+        def build() -> Response:
+            rows = db.fetch_all(queries.BALANCES_SQL, (group_id,))
+            return jsonify({**_balance_summary(rows, settle_mode, budget_ms), "version": version})
 
-        settlements = _simplify_debts(balances)
-        return jsonify({"balances": balances, "settlements": settlements})
+        response = response_cache.cached("balances", group_id, version, (settle_mode, budget_ms), build)
+        return _with_etag(response, group_id, version)
 
     @app.post("/api/groups/<int:group_id>/expenses/<int:expense_id>/payments")
     @require_login
@@ -534,13 +589,6 @@ def register_routes(app: Flask) -> None:
         if not _user_in_group(session["user_id"], group_id):
             return jsonify({"error": "not_authorized"}), 403
 
-        expense = db.fetch_one(
-            "SELECT id, group_id FROM expenses WHERE id=%s AND group_id=%s",
-            (expense_id, group_id),
-        )
-        if not expense:
-            return jsonify({"error": "expense_not_found"}), 404
-
         payload = request.get_json(force=True) or {}
         user_id = payload.get("user_id")
         amount = payload.get("amount")
@@ -555,45 +603,20 @@ def register_routes(app: Flask) -> None:
         if session.get("user_id") != user_id:
             return jsonify({"error": "forbidden_only_self_can_pay"}), 403
 
-        amount_decimal = _to_decimal(amount)
-        if amount_decimal <= 0:
+        try:
+            amount_cents = money.to_cents(amount)
+        except ValueError:
+            return jsonify({"error": "invalid_amount"}), 400
+        if amount_cents <= 0:
             return jsonify({"error": "invalid_amount"}), 400
 
-        share = db.fetch_one(
-            "SELECT share_amount FROM expense_shares WHERE expense_id=%s AND user_id=%s",
-            (expense_id, user_id),
-        )
-        if not share:
-            return jsonify({"error": "user_not_in_expense"}), 400
-
-        existing_payments = db.fetch_one(
-            "SELECT SUM(amount) AS total_paid FROM expense_payments WHERE expense_id=%s AND user_id=%s",
-            (expense_id, user_id),
-        )
-        existing_contributions = db.fetch_one(
-            "SELECT SUM(amount) AS total_contributed FROM expense_contributions WHERE expense_id=%s AND user_id=%s",
-            (expense_id, user_id),
-        )
-        total_paid = _to_decimal(existing_payments["total_paid"] or 0) if existing_payments else Decimal("0.00")
-        total_contributed = (
-            _to_decimal(existing_contributions["total_contributed"] or 0) if existing_contributions else Decimal("0.00")
-        )
-        share_amount = _to_decimal(share["share_amount"])
-        total_credit = min(share_amount, total_paid + total_contributed)
-        remaining = share_amount - total_credit
-
-        if remaining <= Decimal("0.00"):
-            return jsonify({"error": "share_already_settled"}), 400
-
-        if amount_decimal > remaining:
-            return jsonify({"error": "amount_exceeds_remaining", "remaining": float(remaining)}), 400
-
-        payment_id = db.execute(
-            "INSERT INTO expense_payments (expense_id, user_id, amount) VALUES (%s, %s, %s)",
-            (expense_id, user_id, str(amount_decimal)),
-        )
+        with db.transaction() as tx:
+            result = payments.pay_share(tx, group_id, expense_id, user_id, amount_cents)
+        payment = result.payments[0]
+        version = result.groups[group_id][1]
 
-        return jsonify({"id": payment_id, "amount": float(amount_decimal)}), 201
+        hub.publish(group_id, "payment_recorded", expense_id=expense_id, user_id=user_id, version=version)
+        return jsonify({"id": payment["id"], "amount": payment["amount"]}), 201
 
     @app.post("/api/groups/<int:group_id>/balances/<int:user_id>/mark-paid")
     @require_login
@@ -609,131 +632,323 @@ def register_routes(app: Flask) -> None:
             return jsonify({"error": "forbidden_only_self_can_mark_paid"}), 403
 
         payload = request.get_json(force=True) or {}
-        amount = payload.get("amount")
-
-        share_rows = db.fetch_all(
-            """
-            SELECT es.expense_id,
-                   es.share_amount,
-                   COALESCE(pay.amount, 0) AS payments_amount,
-                   COALESCE(contrib.amount, 0) AS contributions_amount
-            FROM expense_shares es
-            JOIN expenses e ON es.expense_id = e.id
-            LEFT JOIN (
-                SELECT expense_id, user_id, SUM(amount) AS amount
-                FROM expense_payments
-                GROUP BY expense_id, user_id
-            ) pay ON pay.expense_id = es.expense_id AND pay.user_id = es.user_id
-            LEFT JOIN (
-                SELECT expense_id, user_id, SUM(amount) AS amount
-                FROM expense_contributions
-                GROUP BY expense_id, user_id
-            ) contrib ON contrib.expense_id = es.expense_id AND contrib.user_id = es.user_id
-            WHERE e.group_id=%s AND es.user_id=%s
-            ORDER BY es.expense_id
-            """,
-            (group_id, user_id),
+        amount_cents = None
+        if payload.get("amount") is not None:
+            try:
+                amount_cents = money.to_cents(payload["amount"])
+            except ValueError:
+                return jsonify({"error": "invalid_amount"}), 400
+
+        with db.transaction() as tx:
+            result = payments.settle(tx, user_id, [group_id], amount_cents)
+
+        if group_id in result.groups:
+            expense_ids, version = result.groups[group_id]
+            hub.publish(group_id, "balance_settled", user_id=user_id, expense_ids=expense_ids, version=version)
+        created = [
+            {"id": payment["id"], "expense_id": payment["expense_id"], "amount": payment["amount"]}
+            for payment in result.payments
+        ]
+        return jsonify({"payments": created, "total": money.to_json(result.total)}), 201
+
+    @app.post("/api/me/settle")
+    @require_login
+    def settle_my_balances():
+        # Pays off the user's pending shares in every group, or only in the listed group_ids.
+        user_id = session["user_id"]
+        payload = request.get_json(silent=True) or {}
+        group_ids = payload.get("group_ids")
+        if group_ids is not None:
+            if not isinstance(group_ids, list) or not all(
+                isinstance(group_id, int) and not isinstance(group_id, bool) for group_id in group_ids
+            ):
+                return jsonify({"error": "invalid_group_ids"}), 400
+
+        with db.transaction() as tx:
+            result = payments.settle(tx, user_id, group_ids)
+
+        for group_id, (expense_ids, version) in result.groups.items():
+            hub.publish(group_id, "balance_settled", user_id=user_id, expense_ids=expense_ids, version=version)
+        return (
+            jsonify(
+                {
+                    "payments": result.payments,
+                    "total": money.to_json(result.total),
+                    "groups": [
+                        {"group_id": group_id, "expense_ids": expense_ids, "version": version}
+                        for group_id, (expense_ids, version) in result.groups.items()
+                    ],
+                }
+            ),
+            201,
         )
 
-        pending_rows: List[Dict[str, Any]] = []
-        total_pending = Decimal("0.00")
-        for row in share_rows:
-            share_amount = _to_decimal(row["share_amount"])
-            payments_amount = _to_decimal(row["payments_amount"] or 0)
-            contributions_amount = _to_decimal(row["contributions_amount"] or 0)
-            total_credit = min(share_amount, payments_amount + contributions_amount)
-            pending = share_amount - total_credit
-            if pending > Decimal("0.00"):
-                pending_rows.append(
-                    {
-                        "expense_id": row["expense_id"],
-                        "pending": pending,
-                    }
-                )
-                total_pending += pending
-
-        if amount is None:
-            amount_decimal = total_pending.quantize(Decimal("0.01"))
-        else:
-            amount_decimal = _to_decimal(amount)
-
-        if amount_decimal <= Decimal("0.00"):
-            return jsonify({"error": "nothing_pending"}), 400
-
-        remaining = amount_decimal
-        payments_created = []
-
-        for row in pending_rows:
-            if remaining <= Decimal("0.00"):
-                break
-
-            expense_id = row["expense_id"]
-            pending = row["pending"]
-            payment_amount = min(remaining, pending)
-
-            if payment_amount > Decimal("0.00"):
-                payment_id = db.execute(
-                    "INSERT INTO expense_payments (expense_id, user_id, amount) VALUES (%s, %s, %s)",
-                    (expense_id, user_id, str(payment_amount)),
-                )
-                payments_created.append({"id": payment_id, "expense_id": expense_id, "amount": float(payment_amount)})
-                remaining -= payment_amount
-
-        return jsonify({"payments": payments_created, "total": float(amount_decimal - remaining)}), 201
-
 
 def _user_in_group(user_id: int, group_id: int) -> bool:
-    record = db.fetch_one(
-        "SELECT id FROM group_members WHERE group_id=%s AND user_id=%s",
-        (group_id, user_id),
-    )
-    return record is not None
-
-
-def _to_decimal(value: Any) -> Decimal:
-    if isinstance(value, Decimal):
-        return value.quantize(Decimal("0.01"))
-    if isinstance(value, (int, float)):
-        return Decimal(str(value)).quantize(Decimal("0.01"))
-    if isinstance(value, str):
-        return Decimal(value).quantize(Decimal("0.01"))
-    raise ValueError("Cannot convert value to Decimal")
-
-
-def _calculate_equal_shares(amount: Decimal, user_ids: List[int]) -> List[Tuple[int, Decimal]]:
-    count = len(user_ids)
-    if count == 0:
-        raise ValueError("user_ids must not be empty")
-
-    per_person = (amount / count).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    shares: List[Tuple[int, Decimal]] = []
-    total_assigned = Decimal("0.00")
-
-    for user_id in user_ids[:-1]:
-        shares.append((user_id, per_person))
-        total_assigned += per_person
-
-    last_share = (amount - total_assigned).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    shares.append((user_ids[-1], last_share))
+    return membership.is_member(user_id, group_id)
+
+
+def _payload_user_ids(payload: Dict[str, Any]) -> List[Any]:
+    """Collect the user ids an expense payload refers to, skipping malformed entries."""
+    user_ids: List[Any] = [payload.get("paid_by")]
+    for key in ("split_among", "shares", "contributors"):
+        entries = payload.get(key)
+        if isinstance(entries, list):
+            user_ids.extend(entry.get("user_id") if isinstance(entry, dict) else entry for entry in entries)
+    return [user_id for user_id in user_ids if user_id is not None]
+
+
+def _validate_expense(
+    payload: Dict[str, Any],
+    is_member: Callable[[Any], bool],
+    default_payer: int,
+) -> importer.ValidExpense:
+    """Validate an expense payload; raises ``ValueError`` with the API error code."""
+    title = (payload.get("title") or "").strip()
+    amount = payload.get("amount")
+    paid_by = payload.get("paid_by")
+    split_among = payload.get("split_among") or []
+    shares_payload = payload.get("shares")
+    contributors_payload = payload.get("contributors") or []
+
+    if not title or amount is None:
+        raise ValueError("missing_fields")
+
+    try:
+        amount_cents = money.to_cents(amount)
+    except ValueError:
+        raise ValueError("invalid_amount") from None
+    if amount_cents <= 0:
+        raise ValueError("invalid_amount")
+
+    shares: List[Tuple[int, int]] = []
+    if shares_payload:
+        shares = _normalize_custom_shares(shares_payload, is_member)
+    else:
+        if not split_among or not isinstance(split_among, list):
+            raise ValueError("missing_fields")
+        split_ids = [membership.as_user_id(user_id) for user_id in split_among]
+        if None in split_ids or not all(is_member(user_id) for user_id in split_ids):
+            raise ValueError("invalid_split_members")
+        shares = list(zip(split_ids, money.split_even(amount_cents, len(split_ids))))
+
+    share_total = sum(share_amount for _, share_amount in shares)
+    if not _amounts_close(share_total, amount_cents):
+        raise ValueError("share_total_mismatch")
+
+    contributions: List[Tuple[int, int]] = []
+    if contributors_payload:
+        contributions = _normalize_contributions(contributors_payload, is_member)
+    else:
+        payer = default_payer if paid_by is None else membership.as_user_id(paid_by)
+        if payer is None or not is_member(payer):
+            raise ValueError("payer_not_in_group")
+        contributions = [(payer, amount_cents)]
+
+    contribution_total = sum(amount for _, amount in contributions)
+    if not _amounts_close(contribution_total, amount_cents):
+        raise ValueError("contribution_total_mismatch")
+
+    return title, amount_cents, shares, contributions
+
+
+def _attach_expense_details(expenses: List[Dict[str, Any]]) -> None:
+    """Attach shares, contributions and payment status to a page of expense rows."""
+    detail_queries = queries.expense_detail_queries([exp["id"] for exp in expenses])
+    _merge_expense_details(expenses, *(db.fetch_all(query, params) for query, params in detail_queries))
+
+
+def _trim_page(expenses: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Cut the ``limit + 1`` probe row off a page and build the cursor for the next one."""
+    if len(expenses) <= limit:
+        return expenses, None
+    expenses = expenses[:limit]
+    return expenses, _encode_cursor(expenses[-1]["date_added"], expenses[-1]["id"])
+
+
+def _merge_expense_details(
+    expenses: List[Dict[str, Any]],
+    shares: Iterable[Dict[str, Any]] = (),
+    contributions: Iterable[Dict[str, Any]] = (),
+    payments: Iterable[Dict[str, Any]] = (),
+) -> None:
+    shares_map: Dict[int, List[Dict[str, Any]]] = {}
+    contributions_map: Dict[int, List[Dict[str, Any]]] = {}
+    contributions_total_map: Dict[Tuple[int, int], int] = {}
+    payments_map: Dict[Tuple[int, int], int] = {}
+
+    for share in shares:
+        shares_map.setdefault(share["expense_id"], []).append(
+            {
+                "user_id": share["user_id"],
+                "name": share["name"],
+                "share_amount": money.to_cents(share["share_amount"]),
+            }
+        )
 
-    return shares
+    for contribution in contributions:
+        amount_cents = money.to_cents(contribution["amount"])
+        key = (contribution["expense_id"], contribution["user_id"])
+        contributions_total_map[key] = contributions_total_map.get(key, 0) + amount_cents
+        contributions_map.setdefault(contribution["expense_id"], []).append(
+            {
+                "user_id": contribution["user_id"],
+                "name": contribution["name"],
+                "amount": money.to_json(amount_cents),
+            }
+        )
 
+    for payment in payments:
+        payments_map[(payment["expense_id"], payment["user_id"])] = money.to_cents(payment["total_paid"])
+
+    for expense in expenses:
+        expense["amount"] = money.to_json(money.to_cents(expense["amount"]))
+        expense_shares = shares_map.get(expense["id"], [])
+        for share in expense_shares:
+            share_amount = share["share_amount"]
+            paid_amount = payments_map.get((expense["id"], share["user_id"]), 0)
+            contribution_amount = contributions_total_map.get((expense["id"], share["user_id"]), 0)
+            applied_credit = min(paid_amount + contribution_amount, share_amount)
+            share["share_amount"] = money.to_json(share_amount)
+            share["paid_amount"] = money.to_json(applied_credit)
+            share["pending_amount"] = money.to_json(max(0, share_amount - applied_credit))
+        expense["shares"] = expense_shares
+        if expense["id"] in contributions_map:
+            expense["contributions"] = contributions_map[expense["id"]]
+        else:
+            expense["contributions"] = [
+                {
+                    "user_id": expense["paid_by"],
+                    "name": expense["paid_by_name"],
+                    "amount": expense["amount"],
+                }
+            ]
+
+
+def _parse_limit(
+    value: Optional[str],
+    default: int = EXPENSE_PAGE_DEFAULT,
+    maximum: int = EXPENSE_PAGE_MAX,
+) -> int:
+    if value is None or value == "":
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("invalid_limit") from None
+    if limit < 1:
+        raise ValueError("invalid_limit")
+    return min(limit, maximum)
+
+
+def _parse_since(value: Optional[str]) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        since = int(value)
+    except ValueError:
+        raise ValueError("invalid_since") from None
+    if since < 0:
+        raise ValueError("invalid_since")
+    return since
+
+
+def _parse_settle(args: Mapping[str, str]) -> Tuple[str, float]:
+    settle_mode = args.get("settle", "auto")
+    if settle_mode not in settlement.MODES:
+        raise ValueError("invalid_settle_mode")
+    try:
+        budget_ms = min(float(args.get("budget_ms", settlement.DEFAULT_BUDGET_MS)), SETTLE_BUDGET_MAX_MS)
+    except ValueError:
+        raise ValueError("invalid_budget") from None
+    if not budget_ms >= 0:
+        raise ValueError("invalid_budget")
+    return settle_mode, budget_ms
+
+
+def _balance_summary(rows: Iterable[Dict[str, Any]], settle_mode: str, budget_ms: float) -> Dict[str, Any]:
+    """Per-member balances and the settlement transfers, from ``queries.BALANCES_SQL`` rows."""
+    balances = []
+    net_cents: Dict[int, int] = {}
+    names: Dict[int, str] = {}
+    for row in rows:
+        total_owed = money.to_cents(row["total_owed"])
+        paid_towards_shares = money.to_cents(row["credited_to_shares"])
+        net_amount = money.to_cents(row["total_contributed"]) - total_owed
+        net_cents[row["id"]] = net_amount
+        names[row["id"]] = row["name"]
+        balances.append(
+            {
+                "user_id": row["id"],
+                "name": row["name"],
+                "net_balance": money.to_json(net_amount),
+                "paid_towards_shares": money.to_json(paid_towards_shares),
+                "pending_amount": money.to_json(max(0, total_owed - paid_towards_shares)),
+            }
+        )
 
-def _normalize_custom_shares(payload: List[Dict[str, Any]], group_id: int) -> List[Tuple[int, Decimal]]:
-    shares: List[Tuple[int, Decimal]] = []
+    transfers, solver = settlement.settle(net_cents, settle_mode, budget_ms)
+    settlements = [
+        {
+            "from_user_id": debtor,
+            "from_name": names[debtor],
+            "to_user_id": creditor,
+            "to_name": names[creditor],
+            "amount": money.to_json(cents),
+        }
+        for debtor, creditor, cents in transfers
+    ]
+    return {"balances": balances, "settlements": settlements, "settlement_mode": solver}
+
+
+def _not_modified(group_id: int, version: int, since: Optional[int]) -> Optional[Response]:
+    """Build a 304 when the client already holds ``version`` of this group."""
+    tag = changes.etag(group_id, version)
+    if since == version or request.if_none_match.contains_weak(tag):
+        response = Response(status=304)
+        response.set_etag(tag, weak=True)
+        return response
+    return None
+
+
+def _with_etag(response: Response, group_id: int, version: int) -> Response:
+    response.set_etag(changes.etag(group_id, version), weak=True)
+    return response
+
+
+def _encode_cursor(date_added: datetime, expense_id: int) -> str:
+    raw = json.dumps([date_added.isoformat(), expense_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(token: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        date_value, expense_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(date_value), int(expense_id)
+    except (ValueError, TypeError):
+        raise ValueError("invalid_cursor") from None
+
+
+def _normalize_custom_shares(
+    payload: List[Dict[str, Any]], is_member: Callable[[Any], bool]
+) -> List[Tuple[int, int]]:
+    shares: List[Tuple[int, int]] = []
     seen = set()
     for item in payload:
         try:
             user_id = int(item["user_id"])
-            share_amount = _to_decimal(item["share_amount"])
-        except (KeyError, TypeError, ValueError, InvalidOperation):
+            share_amount = money.to_cents(item["share_amount"])
+        except (KeyError, TypeError, ValueError):
             raise ValueError("invalid_share_payload") from None
 
         if share_amount <= 0:
             raise ValueError("invalid_share_amount")
         if user_id in seen:
             raise ValueError("duplicate_share_entry")
-        if not _user_in_group(user_id, group_id):
+        if not is_member(user_id):
             raise ValueError("invalid_split_members")
 
         seen.add(user_id)
@@ -741,87 +956,34 @@ def _normalize_custom_shares(payload: List[Dict[str, Any]], group_id: int) -> Li
     return shares
 
 
-def _normalize_contributions(payload: List[Dict[str, Any]], group_id: int) -> List[Tuple[int, Decimal]]:
-    contributions: List[Tuple[int, Decimal]] = []
+def _normalize_contributions(
+    payload: List[Dict[str, Any]], is_member: Callable[[Any], bool]
+) -> List[Tuple[int, int]]:
+    contributions: List[Tuple[int, int]] = []
     seen = set()
     for item in payload:
         amount_value = item.get("amount_paid", item.get("amount"))
         try:
             user_id = int(item["user_id"])
-            amount_decimal = _to_decimal(amount_value)
-        except (KeyError, TypeError, ValueError, InvalidOperation):
+            amount_cents = money.to_cents(amount_value)
+        except (KeyError, TypeError, ValueError):
             raise ValueError("invalid_contribution_payload") from None
 
-        if amount_decimal <= 0:
+        if amount_cents <= 0:
             raise ValueError("invalid_contribution_amount")
         if user_id in seen:
             raise ValueError("duplicate_contribution_entry")
-        if not _user_in_group(user_id, group_id):
+        if not is_member(user_id):
             raise ValueError("invalid_contribution_member")
 
         seen.add(user_id)
-        contributions.append((user_id, amount_decimal))
+        contributions.append((user_id, amount_cents))
     return contributions
 
 
-def _simplify_debts(balances: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    debtors = []
-    creditors = []
-
-    for balance in balances:
-        amount = Decimal(str(balance["net_balance"])).quantize(Decimal("0.01"))
-        if amount > 0:
-            creditors.append({"user_id": balance["user_id"], "name": balance["name"], "amount": amount})
-        elif amount < 0:
-            debtors.append({"user_id": balance["user_id"], "name": balance["name"], "amount": -amount})
-
-    settlements: List[Dict[str, Any]] = []
-
-    debtor_idx = 0
-    creditor_idx = 0
-
-    while debtor_idx < len(debtors) and creditor_idx < len(creditors):
-        debtor = debtors[debtor_idx]
-        creditor = creditors[creditor_idx]
-
-        settled_amount = min(debtor["amount"], creditor["amount"])
-        if settled_amount > Decimal("0.00"):
-            settlements.append(
-                {
-                    "from_user_id": debtor["user_id"],
-                    "from_name": debtor["name"],
-                    "to_user_id": creditor["user_id"],
-                    "to_name": creditor["name"],
-                    "amount": float(settled_amount.quantize(Decimal("0.01"))),
-                }
-            )
-
-        debtor["amount"] -= settled_amount
-        creditor["amount"] -= settled_amount
-
-        if debtor["amount"] <= Decimal("0.00"):
-            debtor_idx += 1
-        if creditor["amount"] <= Decimal("0.00"):
-            creditor_idx += 1
-
-    return settlements
-
-
-def _amounts_close(a: Decimal, b: Decimal, tolerance: Decimal = Decimal("0.01")) -> bool:
+def _amounts_close(a: int, b: int, tolerance: int = 1) -> bool:
     return abs(a - b) <= tolerance
 
 
 app = create_app()
 
-# ... all your existing helper functions like _simplify_debts(), etc.
-
-if __name__ == "__main__":
-    from dotenv import load_dotenv
-    import os
-
-    load_dotenv()
-    port = int(os.getenv("PORT", 10000))
-
-    app = create_app()
-    app.run(host="0.0.0.0", port=port)
-
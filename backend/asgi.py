@@ -0,0 +1,482 @@
+"""Asyncio serving mode for clients that poll or hold streams open.
+
+Run it with any ASGI server, for example::
+
+    pip install uvicorn
+    uvicorn backend.asgi:app --workers 4
+
+These endpoints are served on the event loop with ``AsyncDatabase``, so an
+idle poller or event stream costs a coroutine rather than a worker thread:
+
+- ``GET /api/groups/<id>/members``
+- ``GET /api/groups/<id>/expenses`` (pages and ``?since`` deltas)
+- ``GET /api/groups/<id>/balances``
+- ``GET /api/groups/<id>/events``
+
+Their responses match the Flask routes, which share the SQL and response
+shaping in backend/app.py with this module. The change version is still read
+before the data it describes; the queries that follow it are independent and
+run concurrently. Every other request (writes, auth, static files) is handed to
+the Flask app on a thread pool of ``ASGI_WSGI_THREADS``, so one process serves
+the whole site.
+
+The Flask hooks do not run for the native routes, so ``_serve_native`` and
+``_respond`` apply the same concerns themselves: admission control (the
+shared controller in ``backend/admission.py``), ``Server-Timing`` and the
+per-route metrics (``backend/instrumentation.py``) and compression
+(``backend/compression.py``). ``AsyncDatabase`` pings and recycles its
+connections like the blocking pool, and its counters are reported at
+``/metrics`` under ``async_db``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from itsdangerous import BadSignature
+from werkzeug.http import parse_accept_header, parse_cookie, parse_etags, quote_etag
+
+try:
+    from . import admission, changes, compression, instrumentation, membership, queries, response_cache
+    from .app import (
+        EXPENSE_PAGE_MAX,
+        _balance_summary,
+        _decode_cursor,
+        _merge_expense_details,
+        _parse_limit,
+        _parse_settle,
+        _parse_since,
+        _trim_page,
+        app as flask_app,
+    )
+    from .async_db import adb
+    from .config import config
+    from .events import AsyncSubscription, hub
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import admission  # type: ignore
+    import changes  # type: ignore
+    import compression  # type: ignore
+    import instrumentation  # type: ignore
+    import membership  # type: ignore
+    import queries  # type: ignore
+    import response_cache  # type: ignore
+    from app import (  # type: ignore
+        EXPENSE_PAGE_MAX,
+        _balance_summary,
+        _decode_cursor,
+        _merge_expense_details,
+        _parse_limit,
+        _parse_settle,
+        _parse_since,
+        _trim_page,
+        app as flask_app,
+    )
+    from async_db import adb  # type: ignore
+    from config import config  # type: ignore
+    from events import AsyncSubscription, hub  # type: ignore
+
+# (status, JSON payload or its encoded bytes or None, extra headers)
+Result = Tuple[int, Any, Dict[str, str]]
+
+_executor = ThreadPoolExecutor(max_workers=config.ASGI_WSGI_THREADS, thread_name_prefix="asgi-wsgi")
+_session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+_cors_origins = [origin.strip() for origin in config.CORS_ORIGINS.split(",") if origin.strip()]
+
+
+class Request:
+    def __init__(self, scope: Dict[str, Any]) -> None:
+        self.scope = scope
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])
+        }
+        self.args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        self.accept_encodings = parse_accept_header(self.headers.get("accept-encoding"))
+
+    def session_user(self) -> Optional[int]:
+        """The ``user_id`` from Flask's signed session cookie, if it is valid."""
+        cookie = parse_cookie(self.headers.get("cookie", "")).get(flask_app.config["SESSION_COOKIE_NAME"])
+        if not cookie or _session_serializer is None:
+            return None
+        try:
+            data = _session_serializer.loads(
+                cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds())
+            )
+        except BadSignature:
+            return None
+        return data.get("user_id")
+
+
+def _error(status: int, code: str, **extra: Any) -> Result:
+    return status, {"error": code, **extra}, {}
+
+
+def _etag_header(group_id: int, version: int) -> Dict[str, str]:
+    return {"ETag": quote_etag(changes.etag(group_id, version), weak=True)}
+
+
+def _not_modified(request: Request, group_id: int, version: int, since: Optional[int]) -> Optional[Result]:
+    tag = changes.etag(group_id, version)
+    if since == version or parse_etags(request.headers.get("if-none-match")).contains_weak(tag):
+        return 304, None, _etag_header(group_id, version)
+    return None
+
+
+async def _is_member(user_id: int, group_id: int) -> bool:
+    key = (group_id, user_id)
+    if membership.cache.contains(key):
+        return True
+    row = await adb.fetch_one(queries.MEMBERSHIP_SQL, (group_id, user_id))
+    if row:
+        membership.cache.add([key])
+    return row is not None
+
+
+async def _version(group_id: int) -> int:
+    return changes.version_of(await adb.fetch_one(changes.VERSION_SQL, (group_id,)))
+
+
+def _cached(request: Request, endpoint: str, group_id: int, version: int, params: Tuple[Any, ...]) -> Optional[Result]:
+    hit = response_cache.lookup(endpoint, group_id, version, params, request.accept_encodings)
+    if hit is None:
+        return None
+    return 200, hit[0], {**_content_encoding(hit[1]), **_etag_header(group_id, version)}
+
+
+def _encode(
+    request: Request, endpoint: str, group_id: int, version: int, params: Tuple[Any, ...], payload: Any
+) -> Result:
+    body, coding = response_cache.store(
+        endpoint, group_id, version, params, flask_app.json.dumps(payload).encode(), request.accept_encodings
+    )
+    return 200, body, {**_content_encoding(coding), **_etag_header(group_id, version)}
+
+
+def _content_encoding(coding: Optional[str]) -> Dict[str, str]:
+    return {} if coding is None else {"Content-Encoding": coding}
+
+
+async def _attach_expense_details(expenses: List[Dict[str, Any]]) -> None:
+    detail_queries = queries.expense_detail_queries([expense["id"] for expense in expenses])
+    results = await asyncio.gather(*(adb.fetch_all(query, params) for query, params in detail_queries))
+    _merge_expense_details(expenses, *results)
+
+
+async def group_members(request: Request, group_id: int) -> Result:
+    return 200, await adb.fetch_all(queries.MEMBERS_SQL, (group_id,)), {}
+
+
+async def group_expenses(request: Request, group_id: int) -> Result:
+    try:
+        limit = _parse_limit(request.args.get("limit"))
+        cursor = _decode_cursor(request.args.get("cursor"))
+        since = _parse_since(request.args.get("since"))
+    except ValueError as exc:
+        return _error(400, str(exc))
+
+    version = await _version(group_id)
+    not_modified = _not_modified(request, group_id, version, since)
+    if not_modified is not None:
+        return not_modified
+
+    if since is not None:
+        if since > version:
+            return _error(400, "invalid_since")
+        hit = _cached(request, "expense_changes", group_id, version, (since,))
+        if hit is not None:
+            return hit
+        changed_ids, deleted_ids = changes.split_changes(
+            await adb.fetch_all(changes.CHANGES_SINCE_SQL, (group_id, since))
+        )
+        if len(changed_ids) > EXPENSE_PAGE_MAX:
+            return _error(409, "resync_required", version=version)
+        changed: List[Dict[str, Any]] = []
+        if changed_ids:
+            changed = await adb.fetch_all(*queries.changed_expenses_query(group_id, changed_ids))
+            await _attach_expense_details(changed)
+        payload = {"version": version, "changed": changed, "deleted": sorted(deleted_ids)}
+        return _encode(request, "expense_changes", group_id, version, (since,), payload)
+
+    hit = _cached(request, "expenses", group_id, version, (limit, cursor))
+    if hit is not None:
+        return hit
+    expenses = await adb.fetch_all(*queries.expense_page_query(group_id, limit, cursor))
+    expenses, next_cursor = _trim_page(expenses, limit)
+    await _attach_expense_details(expenses)
+    payload = {"expenses": expenses, "next_cursor": next_cursor, "version": version}
+    return _encode(request, "expenses", group_id, version, (limit, cursor), payload)
+
+
+async def group_balances(request: Request, group_id: int) -> Result:
+    try:
+        since = _parse_since(request.args.get("since"))
+        settle_mode, budget_ms = _parse_settle(request.args)
+    except ValueError as exc:
+        return _error(400, str(exc))
+
+    version = await _version(group_id)
+    not_modified = _not_modified(request, group_id, version, since)
+    if not_modified is not None:
+        return not_modified
+
+    hit = _cached(request, "balances", group_id, version, (settle_mode, budget_ms))
+    if hit is not None:
+        return hit
+    rows = await adb.fetch_all(queries.BALANCES_SQL, (group_id,))
+    # The exact settlement solver can use its whole time budget; keep it off the loop.
+    summary = await asyncio.get_running_loop().run_in_executor(
+        _executor, _balance_summary, rows, settle_mode, budget_ms
+    )
+    return _encode(request, "balances", group_id, version, (settle_mode, budget_ms), {**summary, "version": version})
+
+
+# (path pattern, the Flask rule it mirrors, handler); the rule names the route in /metrics.
+ROUTES: List[Tuple["re.Pattern[str]", str, Callable[[Request, int], Awaitable[Result]]]] = [
+    (re.compile(r"^/api/groups/(\d+)/members$"), "/api/groups/<int:group_id>/members", group_members),
+    (re.compile(r"^/api/groups/(\d+)/expenses$"), "/api/groups/<int:group_id>/expenses", group_expenses),
+    (re.compile(r"^/api/groups/(\d+)/balances$"), "/api/groups/<int:group_id>/balances", group_balances),
+]
+EVENTS_ROUTE = re.compile(r"^/api/groups/(\d+)/events$")
+EVENTS_RULE = "/api/groups/<int:group_id>/events"
+
+
+def _cors_headers(request: Request) -> Dict[str, str]:
+    origin = request.headers.get("origin")
+    if not origin or ("*" not in _cors_origins and origin not in _cors_origins):
+        return {}
+    return {"Access-Control-Allow-Origin": origin, "Access-Control-Allow-Credentials": "true", "Vary": "Origin"}
+
+
+def _encode_headers(headers: Dict[str, str]) -> List[Tuple[bytes, bytes]]:
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+
+async def _respond(send, request: Request, result: Result) -> None:
+    status, payload, headers = result
+    if payload is None:
+        body = b""
+    elif isinstance(payload, bytes):
+        body = payload
+    else:
+        body = flask_app.json.dumps(payload).encode()
+    headers = {**_cors_headers(request), **headers}
+    if payload is not None:
+        headers["Content-Type"] = "application/json"
+        if config.COMPRESS_ENABLED and status == 200:
+            # The same encoder as the Flask after_request hook; cached bodies arrive encoded.
+            if "Content-Encoding" not in headers:
+                body, coding = compression.encode(body, request.accept_encodings)
+                headers.update(_content_encoding(coding))
+            headers["Vary"] = ", ".join(filter(None, [headers.get("Vary"), "Accept-Encoding"]))
+    stats = instrumentation.current()
+    if stats is not None and config.SERVER_TIMING:
+        headers["Server-Timing"] = stats.server_timing()
+    await send({"type": "http.response.start", "status": status, "headers": _encode_headers(headers)})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _admit(request: Request, user_id: Optional[int], group_id: int) -> Optional[Result]:
+    """The admission check of the Flask ``before_request`` hook; ``None`` when admitted."""
+    if not config.ADMISSION_ENABLED:
+        return None
+    user_key = f"user:{user_id}" if user_id is not None else f"addr:{(request.scope.get('client') or ('', 0))[0]}"
+    # The limiter may wait for a slot and the bucket store may be a SQLite file: keep both off the loop.
+    rejection = await asyncio.get_running_loop().run_in_executor(
+        _executor, admission.check, "GET", user_key, group_id
+    )
+    if rejection is None:
+        return None
+    status, error, retry_after = rejection
+    return status, {"error": error}, {"Retry-After": retry_after}
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def group_events(request: Request, group_id: int, receive, send) -> None:
+    subscription = hub.subscribe(group_id, AsyncSubscription(group_id, asyncio.get_running_loop()))
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        headers = {
+            **_cors_headers(request),
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+        await send({"type": "http.response.start", "status": 200, "headers": _encode_headers(headers)})
+        await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+        while True:
+            next_event = asyncio.ensure_future(subscription.get(config.EVENTS_HEARTBEAT))
+            await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                next_event.cancel()
+                return
+            event = next_event.result()
+            chunk = ": keep-alive\n\n" if event is None else f"data: {json.dumps(event)}\n\n"
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    finally:
+        hub.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+class _ReceiveStream(io.RawIOBase):
+    """``wsgi.input`` that pulls the request body from ``receive`` as Flask reads it.
+
+    Read on a WSGI thread; each chunk is awaited on the event loop, so an
+    upload (``/expenses/import``) is parsed as it arrives and never held in
+    memory whole.
+    """
+
+    def __init__(self, receive, loop: asyncio.AbstractEventLoop) -> None:
+        self._receive = receive
+        self._loop = loop
+        self._chunk = b""
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                self._done = True
+                break
+            self._chunk = message.get("body", b"")
+            self._done = not message.get("more_body", False)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+async def _call_flask(scope, receive, send) -> None:
+    """Run one request through the Flask WSGI app on the thread pool."""
+    loop = asyncio.get_running_loop()
+    server = scope.get("server") or ("localhost", 80)
+    environ: Dict[str, Any] = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BufferedReader(_ReceiveStream(receive, loop)),
+        # Read to the end of the body when there is no Content-Length (chunked uploads).
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = value
+        else:
+            key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    started: Dict[str, Any] = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+    iterable = await loop.run_in_executor(_executor, flask_app.wsgi_app, environ, start_response)
+    chunks = iter(iterable)
+    try:
+        # Streaming responses (exports) are pulled one chunk per executor call.
+        first = await loop.run_in_executor(_executor, next, chunks, None)
+        await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        chunk = first
+        while chunk is not None:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await loop.run_in_executor(_executor, next, chunks, None)
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        close = getattr(iterable, "close", None)
+        if close is not None:
+            await loop.run_in_executor(_executor, close)
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await adb.close()
+            _executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _serve_native(scope, receive, send, events_match, route) -> None:
+    """Serve a native route with the admission, timing and metrics the Flask hooks give the rest."""
+    request = Request(scope)
+    group_id = int((events_match or route[2]).group(1))
+    rule = EVENTS_RULE if events_match is not None else route[0]
+    stats = instrumentation.begin()
+    user_id = request.session_user()
+    rejection = await _admit(request, user_id, group_id)
+    if rejection is not None:
+        await _respond(send, request, rejection)
+        instrumentation.finish(f"GET {rule}", stats)
+        return
+    admitted = config.ADMISSION_ENABLED
+    try:
+        if user_id is None:
+            await _respond(send, request, _error(401, "authentication_required"))
+        elif not await _is_member(user_id, group_id):
+            await _respond(send, request, _error(403, "not_authorized"))
+        elif events_match is not None:
+            # As with the Flask route, a stream holds its slot and is timed only until it starts.
+            admission.release()
+            admitted = False
+            instrumentation.finish(f"GET {rule}", stats)
+            await group_events(request, group_id, receive, send)
+            return
+        else:
+            await _respond(send, request, await route[1](request, group_id))
+    finally:
+        if admitted:
+            admission.release()
+    instrumentation.finish(f"GET {rule}", stats)
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    if scope["method"] == "GET":
+        path = scope["path"]
+        events_match = EVENTS_ROUTE.match(path)
+        route = None
+        if events_match is None:
+            route = next(
+                ((rule, handler, match) for pattern, rule, handler in ROUTES for match in [pattern.match(path)] if match),
+                None,
+            )
+        if events_match is not None or route is not None:
+            await _serve_native(scope, receive, send, events_match, route)
+            return
+
+    await _call_flask(scope, receive, send)
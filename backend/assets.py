@@ -0,0 +1,234 @@
+"""Fingerprinted, precompressed build of the static frontend.
+
+Usage::
+
+    python -m backend.assets build        # frontend/ -> dist/ (ASSETS_DIST_DIR)
+
+The build copies every file under ``frontend/`` to the dist directory:
+
+- Scripts, stylesheets and other assets get the first characters of their
+  content hash in the name (``js/api.js`` -> ``js/api.3f09c2d1ab.js``). The
+  hash of a module covers its imports after they are rewritten, so changing
+  ``api.js`` renames every module that imports it as well.
+- ES module imports, ``src``/``href`` attributes and CSS ``url()`` references to
+  those files are rewritten to the hashed names. HTML pages keep their names;
+  they are the entry points.
+- Text files get ``.gz`` and, if the optional ``brotli`` package is installed,
+  ``.br`` siblings, when those are smaller.
+- ``manifest.json`` records each file's served name, hash and encodings.
+
+When the manifest exists, ``serve_frontend`` serves from the build through
+``response``. Hashed files are cached for a year as ``immutable``; pages and
+unhashed names are revalidated. ``If-None-Match`` is answered from the
+manifest without opening the file, and the precompressed variant the client
+accepts is sent as is. A front proxy can serve the dist directory the same
+way (nginx ``gzip_static``/``brotli_static``); the Python workers then see
+no static traffic at all.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import posixpath
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Response, request, send_file
+
+try:
+    from .config import config
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from config import config  # type: ignore
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent / "frontend"
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 10
+COMPRESS_MIN_BYTES = 256
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+TEXT_SUFFIXES = {".html", ".js", ".css", ".json", ".svg", ".txt", ".map"}
+# Preferred first when the client accepts several.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# import ... from "./x.js", import "./x.js", export ... from "./x.js", import("./x.js")
+_JS_REFERENCE = re.compile(r"""(\bfrom\s*|\bimport\s*\(?\s*)(["'])(\.{1,2}/[^"']+)\2""")
+_HTML_REFERENCE = re.compile(r"""(\b(?:src|href)\s*=\s*)(["'])([^"'#?:]+)\2""")
+_CSS_REFERENCE = re.compile(r"""(url\(\s*)(["']?)([^"')#?:]+)\2""")
+_REFERENCES = {".js": _JS_REFERENCE, ".html": _HTML_REFERENCE, ".css": _CSS_REFERENCE}
+
+
+def _references(path: str, text: str) -> List[Tuple[str, str]]:
+    """``(specifier, resolved logical path)`` for each relative reference in ``text``."""
+    pattern = _REFERENCES.get(posixpath.splitext(path)[1])
+    if pattern is None:
+        return []
+    base = posixpath.dirname(path)
+    return [
+        (match.group(3), posixpath.normpath(posixpath.join(base, match.group(3))))
+        for match in pattern.finditer(text)
+    ]
+
+
+def _rewrite(path: str, text: str, served: Dict[str, str]) -> str:
+    pattern = _REFERENCES.get(posixpath.splitext(path)[1])
+    if pattern is None:
+        return text
+    base = posixpath.dirname(path)
+
+    def replace(match: "re.Match[str]") -> str:
+        target = posixpath.normpath(posixpath.join(base, match.group(3)))
+        if target not in served or served[target] == target:
+            return match.group(0)
+        specifier = posixpath.relpath(served[target], base or ".")
+        if match.group(3).startswith("./") and not specifier.startswith("."):
+            specifier = "./" + specifier
+        return f"{match.group(1)}{match.group(2)}{specifier}{match.group(2)}"
+
+    return pattern.sub(replace, text)
+
+
+def _compressed_variants(data: bytes) -> Dict[str, bytes]:
+    if len(data) < COMPRESS_MIN_BYTES:
+        return {}
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def build(source: Path = SOURCE_DIR, out: Optional[Path] = None) -> Dict[str, Any]:
+    """Build ``source`` into ``out`` and return the manifest."""
+    out = Path(out or config.ASSETS_DIST_DIR)
+    files = {
+        path.relative_to(source).as_posix(): path.read_bytes() for path in sorted(source.rglob("*")) if path.is_file()
+    }
+    texts = {
+        path: data.decode("utf-8") for path, data in files.items() if posixpath.splitext(path)[1] in TEXT_SUFFIXES
+    }
+
+    served: Dict[str, str] = {}
+    manifest_files: Dict[str, Any] = {}
+    outputs: Dict[str, bytes] = {}
+    visiting: set = set()
+
+    def emit(path: str) -> None:
+        # Depth first, so every reference is hashed before the file that makes it.
+        if path in served or path in visiting:
+            return
+        visiting.add(path)
+        if path in texts:
+            for _, target in _references(path, texts[path]):
+                if target in files:
+                    emit(target)
+            data = _rewrite(path, texts[path], served).encode("utf-8")
+        else:
+            data = files[path]
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        stem, suffix = posixpath.splitext(path)
+        served[path] = path if suffix == ".html" else f"{stem}.{digest}{suffix}"
+        outputs[served[path]] = data
+        manifest_files[path] = {"path": served[path], "etag": digest, "encodings": []}
+        visiting.discard(path)
+
+    for path in files:
+        emit(path)
+
+    if out.exists():
+        shutil.rmtree(out)
+    for path, data in outputs.items():
+        target = out / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+    for path, entry in manifest_files.items():
+        if posixpath.splitext(path)[1] not in TEXT_SUFFIXES:
+            continue
+        for encoding, body in _compressed_variants(outputs[entry["path"]]).items():
+            suffix = dict(ENCODINGS)[encoding]
+            (out / (entry["path"] + suffix)).write_bytes(body)
+            entry["encodings"].append(encoding)
+
+    manifest = {"files": manifest_files}
+    (out / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+class AssetIndex:
+    """The loaded manifest, indexed by every name a file can be requested under."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        manifest = json.loads((root / MANIFEST_NAME).read_text())
+        # request path -> (entry, served under its hashed name)
+        self.by_path: Dict[str, Tuple[Dict[str, Any], bool]] = {}
+        for logical, entry in manifest["files"].items():
+            hashed = entry["path"] != logical
+            self.by_path[logical] = (entry, False)
+            self.by_path[entry["path"]] = (entry, hashed)
+
+    def lookup(self, path: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        return self.by_path.get(path)
+
+    def response(self, entry: Dict[str, Any], immutable: bool) -> Response:
+        cache_control = IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+        if request.if_none_match.contains_weak(entry["etag"]):
+            response = Response(status=304)
+        else:
+            accepted = request.accept_encodings
+            encoding, suffix = next(
+                ((name, suffix) for name, suffix in ENCODINGS if name in entry["encodings"] and accepted[name]),
+                (None, ""),
+            )
+            response = send_file(
+                self.root / (entry["path"] + suffix),
+                mimetype=mimetypes.guess_type(entry["path"])[0] or "application/octet-stream",
+                conditional=False,
+                etag=False,
+                max_age=None,
+            )
+            if encoding is not None:
+                response.headers["Content-Encoding"] = encoding
+        if entry["encodings"]:
+            response.vary.add("Accept-Encoding")
+        response.set_etag(entry["etag"], weak=True)
+        response.headers["Cache-Control"] = cache_control
+        return response
+
+
+def load(root: Optional[Path] = None) -> Optional[AssetIndex]:
+    """The built assets, or ``None`` when there is no build (serve ``frontend/`` as is)."""
+    root = Path(root or config.ASSETS_DIST_DIR)
+    if not (root / MANIFEST_NAME).is_file():
+        return None
+    return AssetIndex(root)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the fingerprinted, precompressed frontend.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--out", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    manifest = build(out=args.out)
+    files = manifest["files"]
+    compressed = sum(1 for entry in files.values() if entry["encodings"])
+    print(f"built {len(files)} file(s), {compressed} precompressed, into {args.out or config.ASSETS_DIST_DIR}")
+    if brotli is None:
+        print("brotli is not installed; only .gz variants were written")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Asyncio counterpart of backend/db.py, built on ``mysql.connector.aio``.
+
+``mysql.connector.aio`` has no connection pool, so ``AsyncDatabase`` keeps its
+own: idle connections are reused LIFO, new ones are opened on demand up to
+``DB_ASYNC_POOL_SIZE`` and callers beyond that wait for a free slot. A
+connection whose user raised (including cancellation) is closed instead of
+returned, since it may be mid-result or disconnected. As in
+``backend/pool.py``, a connection idle for longer than ``DB_POOL_PING_AFTER``
+is pinged before use and one older than ``DB_POOL_RECYCLE`` is replaced, so a
+MySQL restart or ``wait_timeout`` costs a reconnect rather than a failed
+request. Statements and checkouts are reported to ``backend/instrumentation.py``.
+
+Nothing connects at import time; the first query opens the first connection
+inside the running event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import mysql.connector.aio
+
+try:
+    from . import instrumentation
+    from .config import config
+    from .metrics import Histogram
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import instrumentation  # type: ignore
+    from config import config  # type: ignore
+    from metrics import Histogram  # type: ignore
+
+
+async def _timed_execute(cursor, query: str, params: Optional[Iterable[Any]]) -> None:
+    start = time.perf_counter()
+    try:
+        await cursor.execute(query, params or ())
+    finally:
+        instrumentation.record_query(query, time.perf_counter() - start)
+
+
+class AsyncTransaction:
+    """Statement helpers bound to one cursor; committed or rolled back as a unit."""
+
+    def __init__(self, cursor) -> None:
+        self.cursor = cursor
+
+    async def fetch_one(self, query: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict[str, Any]]:
+        await _timed_execute(self.cursor, query, params)
+        return await self.cursor.fetchone()
+
+    async def fetch_all(self, query: str, params: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
+        await _timed_execute(self.cursor, query, params)
+        return await self.cursor.fetchall()
+
+    async def execute(self, query: str, params: Optional[Iterable[Any]] = None) -> int:
+        await _timed_execute(self.cursor, query, params)
+        return self.cursor.lastrowid
+
+
+class AsyncDatabase:
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        self.max_size = max_size or config.DB_ASYNC_POOL_SIZE
+        self.recycle = config.DB_POOL_RECYCLE
+        self.ping_after = config.DB_POOL_PING_AFTER
+        # (connection, opened at, last returned at); newest at the end
+        self._idle: List[Tuple[Any, float, float]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.wait_seconds = Histogram()
+        self._counters = {"checkouts": 0, "opened": 0, "closed": 0, "recycled": 0}
+
+    async def _connect(self):
+        return await mysql.connector.aio.connect(
+            host=config.DB_HOST,
+            port=int(config.DB_PORT),
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            database=config.DB_NAME,
+            auth_plugin="mysql_native_password",
+        )
+
+    async def _open(self) -> Tuple[Any, float]:
+        conn = await self._connect()
+        self._counters["opened"] += 1
+        return conn, time.monotonic()
+
+    async def _checked(self, conn, opened: float, returned_at: float) -> Tuple[Any, float]:
+        now = time.monotonic()
+        healthy = now - opened <= self.recycle
+        if healthy and now - returned_at > self.ping_after:
+            try:
+                await conn.ping(reconnect=False)
+            except Exception:
+                healthy = False
+        if healthy:
+            return conn, opened
+        self._counters["recycled"] += 1
+        await self._discard(conn)
+        return await self._open()
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+        start = time.perf_counter()
+        async with self._slots:
+            conn, opened = await (self._checked(*self._idle.pop()) if self._idle else self._open())
+            wait = time.perf_counter() - start
+            self._counters["checkouts"] += 1
+            self.wait_seconds.observe(wait)
+            instrumentation.record_checkout(wait)
+            try:
+                yield conn
+            except BaseException:
+                await self._discard(conn)
+                raise
+            self._idle.append((conn, opened, time.monotonic()))
+
+    async def _discard(self, conn) -> None:
+        self._counters["closed"] += 1
+        try:
+            await conn.close()
+        except Exception:  # already broken; nothing left to clean up
+            pass
+
+    @asynccontextmanager
+    async def cursor(self, dictionary: bool = True):
+        async with self.connection() as conn:
+            cursor = await conn.cursor(dictionary=dictionary)
+            try:
+                yield cursor
+                await conn.commit()
+            except BaseException:
+                try:
+                    await conn.rollback()
+                except Exception:  # the connection is discarded anyway
+                    pass
+                raise
+            finally:
+                await cursor.close()
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.cursor() as cursor:
+            yield AsyncTransaction(cursor)
+
+    async def fetch_one(self, query: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict[str, Any]]:
+        async with self.cursor() as cursor:
+            await _timed_execute(cursor, query, params)
+            return await cursor.fetchone()
+
+    async def fetch_all(self, query: str, params: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
+        async with self.cursor() as cursor:
+            await _timed_execute(cursor, query, params)
+            return await cursor.fetchall()
+
+    async def execute(self, query: str, params: Optional[Iterable[Any]] = None) -> int:
+        async with self.cursor() as cursor:
+            await _timed_execute(cursor, query, params)
+            return cursor.lastrowid
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            await self._discard(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_size": self.max_size,
+            "idle": len(self._idle),
+            **self._counters,
+            "wait_seconds": self.wait_seconds.snapshot(),
+        }
+
+
+adb = AsyncDatabase()
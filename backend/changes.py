@@ -0,0 +1,73 @@
+"""Per-group change versions and the expense change log used for delta sync.
+
+Each write transaction calls ``bump`` once: it increments
+``groups.change_version`` (row-locking the group until commit, so versions are
+gap-free and ordered) and records which expenses it touched. Deleted expenses
+stay in the log as tombstones.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+try:
+    from .db import db
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from db import db  # type: ignore
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+VERSION_SQL = "SELECT change_version FROM `groups` WHERE id=%s"
+
+CHANGES_SINCE_SQL = """
+    SELECT expense_id, change_type
+    FROM group_changes
+    WHERE group_id=%s AND version > %s
+"""
+
+
+def bump(tx, group_id: int, changes: Iterable[Tuple[int, str]]) -> int:
+    """Advance the group's version and log ``(expense_id, change_type)`` pairs."""
+    tx.execute("UPDATE `groups` SET change_version = change_version + 1 WHERE id=%s", (group_id,))
+    version = tx.fetch_one(VERSION_SQL, (group_id,))["change_version"]
+
+    unique_changes = dict(changes)
+    if unique_changes:
+        placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(unique_changes))
+        params: List[Any] = []
+        for expense_id, change_type in unique_changes.items():
+            params.extend([group_id, version, expense_id, change_type])
+        tx.execute(
+            f"INSERT INTO group_changes (group_id, version, expense_id, change_type) VALUES {placeholders}",
+            params,
+        )
+    return version
+
+
+def current_version(group_id: int) -> int:
+    return version_of(db.fetch_one(VERSION_SQL, (group_id,)))
+
+
+def version_of(row: Any) -> int:
+    return row["change_version"] if row else 0
+
+
+def changes_since(group_id: int, since: int) -> Tuple[Set[int], Set[int]]:
+    """Return ``(changed_ids, deleted_ids)`` for versions after ``since``."""
+    return split_changes(db.fetch_all(CHANGES_SINCE_SQL, (group_id, since)))
+
+
+def split_changes(rows: Iterable[Dict[str, Any]]) -> Tuple[Set[int], Set[int]]:
+    changed: Set[int] = set()
+    deleted: Set[int] = set()
+    for row in rows:
+        if row["change_type"] == DELETE:
+            deleted.add(row["expense_id"])
+        else:
+            changed.add(row["expense_id"])
+    return changed - deleted, deleted
+
+
+def etag(group_id: int, version: int) -> str:
+    return f"g{group_id}-v{version}"
@@ -0,0 +1,150 @@
+"""Compression of JSON API responses.
+
+Expense lists with nested shares and contributions are large and very
+repetitive, and ``group.js`` polls them every few seconds. ``encode``
+compresses a body of at least ``COMPRESS_MIN_BYTES``; it is the one encoder
+behind the ``after_request`` hook ``install`` adds for ``/api/`` responses,
+the compressed variants ``backend/response_cache.py`` stores, and the native
+routes in ``backend/asgi.py``:
+
+- The codec is the one the client accepts with the highest quality; ties go to
+  the fastest codec available. ``zstd`` (optional ``zstandard`` package) and
+  ``br`` (optional ``brotli`` package) are only offered when installed;
+  ``gzip`` always is.
+- Streamed responses (exports, the event stream) and responses that already
+  have a ``Content-Encoding`` are left alone.
+- Time spent and bytes saved are added to ``Server-Timing`` (``compress``) and
+  to the ``compression`` section of ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import Flask, Response, request
+
+try:
+    from . import instrumentation
+    from .config import config
+    from .metrics import Histogram
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import instrumentation  # type: ignore
+    from config import config  # type: ignore
+    from metrics import Histogram  # type: ignore
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+Compressor = Callable[[bytes], bytes]
+
+
+def _codecs() -> List[Tuple[str, Compressor]]:
+    """Available codecs, fastest first."""
+    codecs: List[Tuple[str, Compressor]] = []
+    if zstandard is not None:
+        zstd = zstandard.ZstdCompressor(level=config.COMPRESS_ZSTD_LEVEL)
+        codecs.append(("zstd", zstd.compress))
+    if brotli is not None:
+        codecs.append(("br", lambda data: brotli.compress(data, quality=config.COMPRESS_BROTLI_LEVEL)))
+    codecs.append(("gzip", lambda data: gzip.compress(data, compresslevel=config.COMPRESS_GZIP_LEVEL, mtime=0)))
+    return codecs
+
+
+CODECS = _codecs()
+
+seconds = Histogram()
+_totals: Dict[str, List[int]] = {}
+_lock = threading.Lock()
+
+
+def choose(accept_encodings) -> Optional[Tuple[str, Compressor]]:
+    best: Optional[Tuple[str, Compressor]] = None
+    best_quality = 0.0
+    for name, compress in CODECS:
+        quality = accept_encodings[name]
+        if quality > best_quality:
+            best, best_quality = (name, compress), quality
+    return best
+
+
+def encode(data: bytes, accept_encodings) -> Tuple[bytes, Optional[str]]:
+    """``data`` compressed with the best codec the client accepts, and the codec's name.
+
+    Returns ``data`` and ``None`` when compression is off, ``data`` is shorter
+    than ``COMPRESS_MIN_BYTES`` or the client accepts none of ``CODECS``.
+    """
+    if not config.COMPRESS_ENABLED or len(data) < config.COMPRESS_MIN_BYTES:
+        return data, None
+    codec = choose(accept_encodings)
+    if codec is None:
+        return data, None
+    name, compress = codec
+    start = time.perf_counter()
+    body = compress(data)
+    elapsed = time.perf_counter() - start
+    _record(name, len(data), len(body), elapsed)
+    request_stats = instrumentation.current()
+    if request_stats is not None:
+        request_stats.compress_seconds += elapsed
+    return body, name
+
+
+def _compressible(response: Response) -> bool:
+    return (
+        200 <= response.status_code < 300
+        and response.status_code != 204
+        and not response.is_streamed
+        and not response.direct_passthrough
+        and "Content-Encoding" not in response.headers
+        and response.mimetype != "text/event-stream"
+    )
+
+
+def _record(codec: str, size_in: int, size_out: int, elapsed: float) -> None:
+    seconds.observe(elapsed)
+    with _lock:
+        totals = _totals.setdefault(codec, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += size_in
+        totals[2] += size_out
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        codecs = {
+            codec: {
+                "responses": count,
+                "bytes_in": size_in,
+                "bytes_out": size_out,
+                "ratio": round(size_out / size_in, 4) if size_in else None,
+            }
+            for codec, (count, size_in, size_out) in _totals.items()
+        }
+    return {"available": [name for name, _ in CODECS], "codecs": codecs, "seconds": seconds.snapshot()}
+
+
+def install(app: Flask) -> None:
+    if not config.COMPRESS_ENABLED:
+        return
+
+    @app.after_request
+    def compress_response(response: Response) -> Response:
+        if not request.path.startswith("/api/") or not _compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        body, name = encode(response.get_data(), request.accept_encodings)
+        if name is None:
+            return response
+        response.set_data(body)
+        response.headers["Content-Encoding"] = name
+        return response
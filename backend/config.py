@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
@@ -9,9 +10,94 @@ class Config:
     DB_PASSWORD = os.environ.get("DB_PASSWORD")
     DB_NAME = os.environ.get("DB_NAME")
 
+    # Storage backend: "mysql", or "sqlite" for an embedded database file (see backend/sqlite_db.py)
+    DB_BACKEND = os.environ.get("DB_BACKEND", "mysql")
+    SQLITE_PATH = os.environ.get("SQLITE_PATH", "hostelsplit.sqlite3")
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 5.0))
+
+    # Connection pool (see backend/pool.py)
+    DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 2))
+    DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5.0))
+    DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", 3600))
+    DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", 30))
+    DB_POOL_IDLE_TIMEOUT = float(os.environ.get("DB_POOL_IDLE_TIMEOUT", 300))
+
+    # Server-side prepared statements, cached per connection (see StatementCache in backend/db.py)
+    DB_PREPARED = os.environ.get("DB_PREPARED", "0") in ("1", "true", "yes")
+    DB_PREPARED_CACHE_SIZE = int(os.environ.get("DB_PREPARED_CACHE_SIZE", 64))
+
+    # Request instrumentation (see backend/instrumentation.py)
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+    SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") not in ("0", "false", "no")
+    # /metrics shows SQL text, the database location and pool internals: off unless asked for.
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") not in ("0", "false", "no")
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+    # Password hashing worker processes (see backend/hashing.py)
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 64))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10.0))
+
+    # Admission control and rate limits for /api/ (see backend/admission.py)
+    ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") not in ("0", "false", "no")
+    ADMISSION_STORE = os.environ.get("ADMISSION_STORE", "memory")
+    ADMISSION_SQLITE_PATH = os.environ.get(
+        "ADMISSION_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "hostelsplit-admission.sqlite3")
+    )
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", DB_POOL_MAX))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 0.5))
+    ADMISSION_WRITE_RESERVE = float(os.environ.get("ADMISSION_WRITE_RESERVE", 0.25))
+    ADMISSION_MAX_STREAMS = int(os.environ.get("ADMISSION_MAX_STREAMS", 2))
+    RATE_LIMIT_USER_RATE = float(os.environ.get("RATE_LIMIT_USER_RATE", 10))
+    RATE_LIMIT_USER_BURST = float(os.environ.get("RATE_LIMIT_USER_BURST", 40))
+    RATE_LIMIT_GROUP_RATE = float(os.environ.get("RATE_LIMIT_GROUP_RATE", 20))
+    RATE_LIMIT_GROUP_BURST = float(os.environ.get("RATE_LIMIT_GROUP_BURST", 80))
+
+    # API response compression (see backend/compression.py)
+    COMPRESS_ENABLED = os.environ.get("COMPRESS_ENABLED", "1") not in ("0", "false", "no")
+    COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 5))
+    COMPRESS_ZSTD_LEVEL = int(os.environ.get("COMPRESS_ZSTD_LEVEL", 3))
+    COMPRESS_BROTLI_LEVEL = int(os.environ.get("COMPRESS_BROTLI_LEVEL", 4))
+
+    # Async serving mode (see backend/asgi.py)
+    DB_ASYNC_POOL_SIZE = int(os.environ.get("DB_ASYNC_POOL_SIZE", 20))
+    ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 16))
+
+    # Built frontend (see backend/assets.py); served instead of frontend/ when it exists
+    ASSETS_DIST_DIR = os.environ.get(
+        "ASSETS_DIST_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dist")
+    )
+
     # CORS
     CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "*")
 
+    # Group membership cache (see backend/membership.py)
+    MEMBERSHIP_CACHE_SIZE = int(os.environ.get("MEMBERSHIP_CACHE_SIZE", 50000))
+    MEMBERSHIP_CACHE_TTL = float(os.environ.get("MEMBERSHIP_CACHE_TTL", 300))
+
+    # Per-user overview for /api/me/balances (see backend/positions.py)
+    MY_BALANCES_CACHE_SIZE = int(os.environ.get("MY_BALANCES_CACHE_SIZE", 10000))
+    MY_BALANCES_CACHE_TTL = float(os.environ.get("MY_BALANCES_CACHE_TTL", 10))
+
+    # Encoded group responses keyed by change version (see backend/response_cache.py)
+    RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") not in ("0", "false", "no")
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    RESPONSE_CACHE_SQLITE_PATH = os.environ.get(
+        "RESPONSE_CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "hostelsplit-responses.sqlite3")
+    )
+
+    # Live group events (see backend/events.py)
+    EVENTS_BROADCASTER = os.environ.get("EVENTS_BROADCASTER", "local")
+    EVENTS_SOCKET_DIR = os.environ.get(
+        "EVENTS_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "hostelsplit-events")
+    )
+    EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", 1.0))
+    EVENTS_HEARTBEAT = float(os.environ.get("EVENTS_HEARTBEAT", 15.0))
+
     # Session / Cookies
     SESSION_COOKIE_NAME = os.environ.get("SESSION_COOKIE_NAME", "session")
     SESSION_COOKIE_HTTPONLY = True
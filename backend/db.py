@@ -1,17 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Sequence
 
 import mysql.connector
-from mysql.connector import pooling
 
+from . import instrumentation
 from .config import config
+from .pool import ConnectionPool
+
+
+@contextmanager
+def _timed(query: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        instrumentation.record_query(query, time.perf_counter() - start)
+
+
+class StatementCache:
+    """Per-connection LRU of server-side prepared statements, keyed by SQL text.
+
+    Each entry is a prepared cursor that keeps its statement handle between
+    executions. mysql-connector only skips the re-prepare when it is handed the
+    very string object it prepared, so ``get`` returns the cached key as well.
+    Evicted cursors are closed, which deallocates the statement on the server.
+    """
+
+    counters = {"hits": 0, "misses": 0, "evictions": 0}
+    _counters_lock = threading.Lock()
+
+    def __init__(self, conn, max_entries: int) -> None:
+        self.conn = conn
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+
+    def get(self, query: str):
+        """Return ``(cursor, query)`` with ``query`` replaced by the cached key."""
+        entry = self._entries.get(query)
+        if entry is not None:
+            self._entries.move_to_end(query)
+            self._count("hits")
+            return entry
+        self._count("misses")
+        entry = (self.conn.cursor(prepared=True, dictionary=True), query)
+        self._entries[query] = entry
+        if len(self._entries) > self.max_entries:
+            _, (cursor, _) = self._entries.popitem(last=False)
+            cursor.close()
+            self._count("evictions")
+        return entry
+
+    @classmethod
+    def _count(cls, name: str) -> None:
+        with cls._counters_lock:
+            cls.counters[name] += 1
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        with cls._counters_lock:
+            return dict(cls.counters)
+
+
+def _statement_cache(conn) -> StatementCache:
+    cache = getattr(conn, "hostelsplit_statements", None)
+    if cache is None:
+        cache = StatementCache(conn, config.DB_PREPARED_CACHE_SIZE)
+        conn.hostelsplit_statements = cache
+    return cache
+
+
+class Transaction:
+    """Statement helpers bound to one cursor; committed or rolled back as a unit.
+
+    With a ``StatementCache`` single statements run as prepared statements on
+    the same connection; bulk statements (``execute_many``, ``insert_many``)
+    differ in length every time and stay on the text-protocol cursor.
+    """
+
+    def __init__(
+        self, cursor, statements: Optional[StatementCache] = None, auto_increment_step: int = 1
+    ) -> None:
+        self.cursor = cursor
+        self.statements = statements
+        self.auto_increment_step = auto_increment_step
+
+    def _cursor_for(self, query: str):
+        if self.statements is None:
+            return self.cursor, query
+        return self.statements.get(query)
+
+    def fetch_one(self, query: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict[str, Any]]:
+        cursor, query = self._cursor_for(query)
+        with _timed(query):
+            cursor.execute(query, params or ())
+            if self.statements is None:
+                return cursor.fetchone()
+            # A prepared result must be read to the end before the connection runs anything else.
+            rows = cursor.fetchall()
+            return rows[0] if rows else None
+
+    def fetch_all(self, query: str, params: Optional[Iterable[Any]] = None) -> Iterable[Dict[str, Any]]:
+        cursor, query = self._cursor_for(query)
+        with _timed(query):
+            cursor.execute(query, params or ())
+            return cursor.fetchall()
+
+    def execute(self, query: str, params: Optional[Iterable[Any]] = None) -> int:
+        cursor, query = self._cursor_for(query)
+        with _timed(query):
+            cursor.execute(query, params or ())
+        return cursor.lastrowid
+
+    def execute_many(self, query: str, seq_params: Sequence[Iterable[Any]]) -> int:
+        if not seq_params:
+            return 0
+        with _timed(query):
+            self.cursor.executemany(query, seq_params)
+        return self.cursor.rowcount
+
+    def insert_many(
+        self,
+        table: str,
+        columns: Sequence[str],
+        rows: Sequence[Sequence[Any]],
+        chunk_size: int = 1000,
+    ) -> List[int]:
+        """Insert ``rows`` with multi-row INSERT statements and return their ids in order.
+
+        InnoDB allocates the values for a multi-row INSERT with a known row count
+        in one block, spaced by the session's ``auto_increment_increment``
+        (``auto_increment_step``; more than 1 under multi-primary replication),
+        so row ``i`` of a chunk received ``lastrowid + i * auto_increment_step``.
+        """
+        ids: List[int] = []
+        row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start : start + chunk_size]
+            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_sql] * len(chunk))}"
+            with _timed(query):
+                self.cursor.execute(query, [value for row in chunk for value in row])
+            first_id = self._first_insert_id(len(chunk))
+            step = self.auto_increment_step
+            ids.extend(range(first_id, first_id + len(chunk) * step, step))
+        return ids
+
+    def _first_insert_id(self, row_count: int) -> int:
+        return self.cursor.lastrowid
 
 
 class Database:
     def __init__(self) -> None:
-        self.pool = pooling.MySQLConnectionPool(
-            pool_name="hostelsplit_pool",
-            pool_size=10,
+        self.pool = ConnectionPool(
+            self._connect,
+            min_size=config.DB_POOL_MIN,
+            max_size=config.DB_POOL_MAX,
+            timeout=config.DB_POOL_TIMEOUT,
+            recycle=config.DB_POOL_RECYCLE,
+            ping_after=config.DB_POOL_PING_AFTER,
+            idle_timeout=config.DB_POOL_IDLE_TIMEOUT,
+        )
+        self.prepared = config.DB_PREPARED
+
+    def _connect(self):
+        conn = mysql.connector.connect(
             host=config.DB_HOST,
             port=int(config.DB_PORT),  # ✅ Convert to integer
             user=config.DB_USER,
@@ -19,42 +173,95 @@ class Database:
             database=config.DB_NAME,
             auth_plugin="mysql_native_password",
         )
+        # Fixed for the life of the session; insert_many derives row ids from it.
+        cursor = conn.cursor()
+        cursor.execute("SELECT @@SESSION.auto_increment_increment")
+        conn.hostelsplit_auto_increment_step = int(cursor.fetchone()[0])
+        cursor.close()
+        return conn
 
     @contextmanager
     def connection(self):
-        conn = self.pool.get_connection()
+        start = time.perf_counter()
+        conn = self.pool.acquire()
+        instrumentation.record_checkout(time.perf_counter() - start)
+        discard = False
         try:
             yield conn
+        except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+            # Lost or broken connection: don't hand it to the next caller.
+            discard = True
+            raise
         finally:
-            conn.close()
+            if not discard:
+                try:
+                    # Never hand the next caller a connection with a transaction still open.
+                    if conn.in_transaction:
+                        conn.rollback()
+                except mysql.connector.Error:
+                    discard = True
+            self.pool.release(conn, discard=discard)
 
     @contextmanager
     def cursor(self, dictionary: bool = True):
         with self.connection() as conn:
-            cursor = conn.cursor(dictionary=dictionary)
-            try:
+            with self._committing(conn, dictionary) as cursor:
                 yield cursor
-                conn.commit()
-            except Exception:
-                conn.rollback()
-                raise
-            finally:
-                cursor.close()
+
+    @contextmanager
+    def _committing(self, conn, dictionary: bool = True):
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def transaction(self, write: bool = True):
+        # Plain InnoDB reads take no locks, so ``write=False`` only matters to the SQLite backend.
+        with self.connection() as conn:
+            statements = _statement_cache(conn) if self.prepared else None
+            with self._committing(conn) as cursor:
+                yield Transaction(cursor, statements, conn.hostelsplit_auto_increment_step)
 
     def fetch_one(self, query: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict[str, Any]]:
-        with self.cursor() as cursor:
-            cursor.execute(query, params or ())
-            return cursor.fetchone()
+        with self.transaction() as tx:
+            return tx.fetch_one(query, params)
 
     def fetch_all(self, query: str, params: Optional[Iterable[Any]] = None) -> Iterable[Dict[str, Any]]:
-        with self.cursor() as cursor:
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
+        with self.transaction() as tx:
+            return tx.fetch_all(query, params)
 
     def execute(self, query: str, params: Optional[Iterable[Any]] = None) -> int:
-        with self.cursor() as cursor:
-            cursor.execute(query, params or ())
-            return cursor.lastrowid
+        with self.transaction() as tx:
+            return tx.execute(query, params)
+
+    def execute_many(self, query: str, seq_params: Sequence[Iterable[Any]]) -> int:
+        with self.transaction() as tx:
+            return tx.execute_many(query, seq_params)
+
+    def insert_many(self, table: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[int]:
+        with self.transaction() as tx:
+            return tx.insert_many(table, columns, rows)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"backend": "mysql", **self.pool.stats()}
+        if self.prepared:
+            stats["prepared_statements"] = StatementCache.stats()
+        return stats
+
+
+def create_database() -> Database:
+    """The storage backend selected by ``DB_BACKEND`` (``mysql`` or ``sqlite``)."""
+    if config.DB_BACKEND == "sqlite":
+        from .sqlite_db import SqliteDatabase
+
+        return SqliteDatabase()
+    return Database()
 
 
-db = Database()
+db = create_database()
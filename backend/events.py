@@ -0,0 +1,278 @@
+"""Group change events for the ``/api/groups/<id>/events`` SSE stream.
+
+Write routes call ``hub.publish`` after committing. The hub hands the event to
+a broadcaster, which delivers it to the hub of every worker process; each hub
+then fans it out to the SSE streams open for that group.
+
+Broadcasters (``EVENTS_BROADCASTER``):
+
+- ``local``: in-process only, for a single worker.
+- ``unix``: every worker binds a datagram socket in ``EVENTS_SOCKET_DIR`` and
+  publishers send to all of them.
+- ``table``: events are inserted into ``group_events`` and every worker polls
+  the table for new rows.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+try:
+    from .config import config
+    from .db import db
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from config import config  # type: ignore
+    from db import db  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+Deliver = Callable[[Event], None]
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscription:
+    def __init__(self, group_id: int) -> None:
+        self.group_id = group_id
+        self.queue: "queue.Queue[Event]" = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when events were dropped; the stream tells the client to resync.
+        self.overflowed = False
+
+    def put(self, event: Event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout: float) -> Optional[Event]:
+        if self.overflowed:
+            self.overflowed = False
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            return {"type": "resync", "group_id": self.group_id}
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """A subscription consumed from an asyncio event loop (see backend/asgi.py).
+
+    ``put`` is called from broadcaster and request threads, so events are handed
+    to the loop with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, group_id: int, loop: asyncio.AbstractEventLoop) -> None:
+        self.group_id = group_id
+        self.loop = loop
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event: Event) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has shut down; the stream is gone.
+            pass
+
+    def _put(self, event: Event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return {"type": "resync", "group_id": self.group_id}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroadcaster:
+    def __init__(self, deliver: Deliver) -> None:
+        self.deliver = deliver
+
+    def start(self) -> None:
+        pass
+
+    def publish(self, event: Event) -> None:
+        self.deliver(event)
+
+
+class UnixSocketBroadcaster:
+    """Datagram fan-out between the worker processes on one host."""
+
+    def __init__(self, deliver: Deliver, directory: Optional[str] = None) -> None:
+        self.deliver = deliver
+        self.directory = Path(directory or config.EVENTS_SOCKET_DIR)
+        self.path: Optional[Path] = None
+        self.sock: Optional[socket.socket] = None
+
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{os.getpid()}.sock"
+        if self.path.exists():
+            self.path.unlink()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(str(self.path))
+        threading.Thread(target=self._receive, name="events-unix", daemon=True).start()
+
+    def _receive(self) -> None:
+        while True:
+            data = self.sock.recv(65536)
+            try:
+                self.deliver(json.loads(data))
+            except ValueError:
+                logger.warning("dropping malformed event datagram")
+
+    def publish(self, event: Event) -> None:
+        data = json.dumps(event).encode()
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            for peer in self.directory.glob("*.sock"):
+                try:
+                    sender.sendto(data, str(peer))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # The worker that owned this socket has exited.
+                    peer.unlink(missing_ok=True)
+                except OSError:
+                    logger.warning("could not deliver event to %s", peer)
+        finally:
+            sender.close()
+
+
+class TableBroadcaster:
+    """Shares events through the ``group_events`` table."""
+
+    RETENTION_SECONDS = 3600
+
+    def __init__(self, deliver: Deliver, interval: Optional[float] = None) -> None:
+        self.deliver = deliver
+        self.interval = interval or config.EVENTS_POLL_INTERVAL
+        self.last_id = 0
+
+    def start(self) -> None:
+        row = db.fetch_one("SELECT COALESCE(MAX(id), 0) AS last_id FROM group_events")
+        self.last_id = row["last_id"]
+        threading.Thread(target=self._poll, name="events-table", daemon=True).start()
+
+    def _poll(self) -> None:
+        last_prune = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            try:
+                rows = db.fetch_all(
+                    "SELECT id, payload FROM group_events WHERE id > %s ORDER BY id LIMIT 500",
+                    (self.last_id,),
+                )
+                for row in rows:
+                    self.last_id = row["id"]
+                    self.deliver(json.loads(row["payload"]))
+                if time.monotonic() - last_prune > self.RETENTION_SECONDS:
+                    last_prune = time.monotonic()
+                    db.execute(
+                        "DELETE FROM group_events WHERE created_at < NOW() - INTERVAL %s SECOND",
+                        (self.RETENTION_SECONDS,),
+                    )
+            except Exception:  # keep polling through transient database errors
+                logger.exception("group event poll failed")
+
+    def publish(self, event: Event) -> None:
+        db.execute(
+            "INSERT INTO group_events (group_id, payload) VALUES (%s, %s)",
+            (event["group_id"], json.dumps(event)),
+        )
+
+
+BROADCASTERS = {
+    "local": LocalBroadcaster,
+    "unix": UnixSocketBroadcaster,
+    "table": TableBroadcaster,
+}
+
+
+class EventHub:
+    def __init__(self, broadcaster: str = "local") -> None:
+        self.broadcaster_name = broadcaster
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[Any]] = {}
+        self._listeners: List[Deliver] = []
+        self._broadcaster = None
+        self._pid: Optional[int] = None
+
+    def _ensure_broadcaster(self):
+        # Started lazily, and again in a forked worker, which inherits no threads.
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    broadcaster = BROADCASTERS[self.broadcaster_name](self.deliver)
+                    broadcaster.start()
+                    self._broadcaster = broadcaster
+                    self._subscribers = {}
+                    self._pid = pid
+        return self._broadcaster
+
+    def start(self) -> None:
+        """Receive events in this process; ``subscribe`` and ``publish`` do this on first use."""
+        self._ensure_broadcaster()
+
+    def add_listener(self, listener: Deliver) -> None:
+        """Call ``listener`` with every event this process receives, for any group."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def subscribe(self, group_id: int, subscription: Any = None) -> Any:
+        self._ensure_broadcaster()
+        if subscription is None:
+            subscription = Subscription(group_id)
+        with self._lock:
+            self._subscribers.setdefault(group_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Any) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.group_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.group_id]
+
+    def publish(self, group_id: int, event_type: str, **data: Any) -> None:
+        event = {"type": event_type, "group_id": group_id, **data}
+        try:
+            self._ensure_broadcaster().publish(event)
+        except Exception:
+            # The write already committed; clients still catch up on their next refresh.
+            logger.exception("could not publish %s event for group %s", event_type, group_id)
+
+    def deliver(self, event: Event) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.get("group_id"), ()))
+            listeners = list(self._listeners)
+        for subscription in subscribers:
+            subscription.put(event)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("event listener failed for %s", event.get("type"))
+
+
+hub = EventHub(config.EVENTS_BROADCASTER)
@@ -0,0 +1,176 @@
+"""Streaming expense export in the CSV and NDJSON formats ``importer`` reads.
+
+``open_export`` takes one pooled connection and opens a read transaction on it
+before the response starts, so a busy pool fails the request with
+``503 database_busy`` instead of cutting off a body already sent as 200.
+Expenses are then read oldest first in keyset pages of ``CHUNK_ROWS``; the
+shares, contributions and payments of each page are loaded on the same
+connection with one ``IN`` query per table. On MySQL the transaction's
+snapshot keeps the pages consistent with each other. Only one page is held in
+memory at a time, and each page is written to the response as a single
+string. The route keeps its admission slot until the body is sent (see
+``admission.streamed``), which bounds how many connections exports hold.
+
+CSV output has the import columns plus ``id``, ``date_added`` and
+``payments``, which the importer ignores, so an export can be re-imported into
+another group as is. Timestamps are written as in API responses.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from . import json_provider
+    from .db import db
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import json_provider  # type: ignore
+    from db import db  # type: ignore
+
+CHUNK_ROWS = 500
+
+CSV_COLUMNS = ("id", "date_added", "title", "amount", "paid_by", "shares", "contributors", "payments")
+
+MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+EXPORT_SQL = """
+    SELECT id, title, amount, paid_by, date_added
+    FROM expenses
+    WHERE group_id=%s {keyset}
+    ORDER BY date_added, id
+    LIMIT %s
+"""
+
+DETAIL_QUERIES = {
+    "shares": """
+        SELECT expense_id, user_id, share_amount AS amount
+        FROM expense_shares
+        WHERE expense_id IN ({placeholders})
+    """,
+    "contributors": """
+        SELECT expense_id, user_id, amount
+        FROM expense_contributions
+        WHERE expense_id IN ({placeholders})
+    """,
+    "payments": """
+        SELECT expense_id, user_id, SUM(amount) AS amount
+        FROM expense_payments
+        WHERE expense_id IN ({placeholders})
+        GROUP BY expense_id, user_id
+    """,
+}
+
+
+def export_page_query(group_id: int, cursor: Optional[Tuple[datetime, int]]) -> Tuple[str, List[Any]]:
+    keyset, params = "", [group_id]
+    if cursor:
+        keyset = "AND (date_added > %s OR (date_added = %s AND id > %s))"
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    params.append(CHUNK_ROWS)
+    return EXPORT_SQL.format(keyset=keyset), params
+
+
+def expenses(tx, group_id: int) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the group's expenses, oldest first, in pages with their details attached."""
+    cursor = None
+    while True:
+        chunk = tx.fetch_all(*export_page_query(group_id, cursor))
+        if not chunk:
+            return
+        _attach_details(tx, chunk)
+        yield chunk
+        if len(chunk) < CHUNK_ROWS:
+            return
+        cursor = (chunk[-1]["date_added"], chunk[-1]["id"])
+
+
+def _attach_details(tx, chunk: List[Dict[str, Any]]) -> None:
+    by_id = {}
+    for expense in chunk:
+        expense.update(shares=[], contributors=[], payments=[])
+        by_id[expense["id"]] = expense
+
+    placeholders = ", ".join(["%s"] * len(by_id))
+    for key, query in DETAIL_QUERIES.items():
+        for row in tx.fetch_all(query.format(placeholders=placeholders), list(by_id)):
+            by_id[row["expense_id"]][key].append((row["user_id"], row["amount"]))
+
+
+def _timestamp(value: Any) -> Any:
+    return json_provider.default(value) if isinstance(value, datetime) else value
+
+
+def _pairs(entries) -> str:
+    return ";".join(f"{user_id}:{amount}" for user_id, amount in entries)
+
+
+def csv_stream(pages: Iterable[List[Dict[str, Any]]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    # The header goes out before the query runs, so the client sees the first byte at once.
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+    for chunk in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        for expense in chunk:
+            writer.writerow(
+                (
+                    expense["id"],
+                    _timestamp(expense["date_added"]),
+                    expense["title"],
+                    expense["amount"],
+                    expense["paid_by"],
+                    _pairs(expense["shares"]),
+                    _pairs(expense["contributors"]),
+                    _pairs(expense["payments"]),
+                )
+            )
+        yield buffer.getvalue()
+
+
+def ndjson_stream(pages: Iterable[List[Dict[str, Any]]]) -> Iterator[str]:
+    for chunk in pages:
+        lines = []
+        for expense in chunk:
+            record = {
+                "id": expense["id"],
+                "title": expense["title"],
+                "amount": expense["amount"],
+                "paid_by": expense["paid_by"],
+                "date_added": _timestamp(expense["date_added"]),
+                "shares": [
+                    {"user_id": user_id, "share_amount": amount} for user_id, amount in expense["shares"]
+                ],
+                "contributors": [
+                    {"user_id": user_id, "amount": amount} for user_id, amount in expense["contributors"]
+                ],
+                "payments": [
+                    {"user_id": user_id, "amount": amount} for user_id, amount in expense["payments"]
+                ],
+            }
+            lines.append(json_provider.dumps(record) + "\n")
+        yield "".join(lines)
+
+
+STREAMS: Dict[str, Callable[[Iterable[List[Dict[str, Any]]]], Iterator[str]]] = {
+    "csv": csv_stream,
+    "ndjson": ndjson_stream,
+}
+
+
+def _export(group_id: int, fmt: str) -> Iterator[str]:
+    with db.transaction(write=False) as tx:
+        # open_export stops here: the connection is held before the response starts.
+        yield ""
+        yield from STREAMS[fmt](expenses(tx, group_id))
+
+
+def open_export(group_id: int, fmt: str) -> Iterator[str]:
+    """The export body in ``fmt``, with its connection and transaction already open."""
+    body = _export(group_id, fmt)
+    next(body)
+    return body
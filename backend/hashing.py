@@ -0,0 +1,193 @@
+"""Password hashing in a pool of worker processes.
+
+``generate_password_hash`` and ``check_password_hash`` run a deliberately slow
+KDF, and ``hashlib.scrypt``/``pbkdf2_hmac`` hold the GIL for most of it. Run on
+the request thread, a burst of logins stalls every other request in the worker.
+``PasswordHasher`` runs them in ``PASSWORD_HASH_WORKERS`` separate processes
+instead:
+
+- The processes are started with ``spawn`` on first use (again after
+  ``fork()``), so they share no connections or locks with the server. Like
+  any ``spawn`` child they import the parent's main module; the dev server
+  entry point ``python -m backend`` is a package ``__main__``, which they
+  skip, and the database pools connect on first use, so a worker never
+  builds the app or opens a connection.
+- At most ``PASSWORD_HASH_QUEUE`` hashes are queued or running at once. Beyond
+  that, and when a hash does not finish within ``PASSWORD_HASH_TIMEOUT``
+  seconds, callers get ``HashingBusy`` at once instead of piling up.
+- New hashes use ``PASSWORD_HASH_METHOD``. ``verify`` also returns a new hash
+  when the stored one was made with other parameters, so raising the cost
+  upgrades each account the next time it logs in.
+- Queue depth, rejections, rehashes, time spent waiting for a process and KDF
+  time are reported at ``/metrics`` under ``password_hashing``.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+try:
+    from .config import config
+    from .metrics import Histogram
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from config import config  # type: ignore
+    from metrics import Histogram  # type: ignore
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full or a hash did not finish in time."""
+
+
+def canonical_method(method: str) -> str:
+    """``method`` with werkzeug's defaults filled in, as it appears in a stored hash."""
+    name, *args = method.split(":")
+    if name == "scrypt" and not args:
+        return "scrypt:32768:8:1"
+    if name == "pbkdf2" and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+
+# Run in the worker processes; they return the KDF time so the caller can tell it from queueing.
+
+
+def _generate(password: str, method: str) -> Tuple[str, float]:
+    start = time.perf_counter()
+    password_hash = generate_password_hash(password, method=method)
+    return password_hash, time.perf_counter() - start
+
+
+def _verify(stored: str, password: str, method: str) -> Tuple[bool, Optional[str], float]:
+    start = time.perf_counter()
+    ok = check_password_hash(stored, password)
+    rehashed = None
+    if ok and stored.split("$", 1)[0] != canonical_method(method):
+        rehashed = generate_password_hash(password, method=method)
+    return ok, rehashed, time.perf_counter() - start
+
+
+class PasswordHasher:
+    def __init__(self, method: str, workers: int = 2, max_queue: int = 64, timeout: float = 10.0) -> None:
+        if workers < 1 or max_queue < 1:
+            raise ValueError("workers and max_queue must be at least 1")
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._peak = 0
+        self._counters = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0, "timeouts": 0}
+        self.wait_seconds = Histogram()
+        self.kdf_seconds = Histogram()
+        self._reset()
+        _hashers.add(self)
+
+    def _reset(self) -> None:
+        # Also run in a forked child, which must not use its parent's worker processes.
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Called with the lock held.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise HashingBusy()
+            pool = self._pool()
+            self._pending += 1
+            self._peak = max(self._peak, self._pending)
+        start = time.perf_counter()
+        try:
+            future = pool.submit(func, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next caller.
+            with self._lock:
+                self._pending -= 1
+                if self._executor is pool:
+                    self._executor = None
+            raise HashingBusy() from None
+        future.add_done_callback(self._done)
+        try:
+            *result, kdf = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._counters["timeouts"] += 1
+            raise HashingBusy() from None
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is pool:
+                    self._executor = None
+            raise HashingBusy() from None
+        self.kdf_seconds.observe(kdf)
+        self.wait_seconds.observe(max(time.perf_counter() - start - kdf, 0.0))
+        return result
+
+    def hash(self, password: str) -> str:
+        password_hash, = self._run(_generate, password, self.method)
+        with self._lock:
+            self._counters["hashed"] += 1
+        return password_hash
+
+    def verify(self, stored: str, password: str) -> Tuple[bool, Optional[str]]:
+        """``(matches, new hash to store or None)``."""
+        ok, rehashed = self._run(_verify, stored, password, self.method)
+        with self._lock:
+            self._counters["verified"] += 1
+            if rehashed is not None:
+                self._counters["rehashed"] += 1
+        return ok, rehashed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "method": canonical_method(self.method),
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._pending,
+                "peak_queued": self._peak,
+                **self._counters,
+            }
+        stats["wait_seconds"] = self.wait_seconds.snapshot()
+        stats["kdf_seconds"] = self.kdf_seconds.snapshot()
+        return stats
+
+
+_hashers: "weakref.WeakSet[PasswordHasher]" = weakref.WeakSet()
+
+
+def _after_fork_in_child() -> None:
+    for instance in list(_hashers):
+        instance._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+hasher = PasswordHasher(
+    config.PASSWORD_HASH_METHOD,
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_queue=config.PASSWORD_HASH_QUEUE,
+    timeout=config.PASSWORD_HASH_TIMEOUT,
+)
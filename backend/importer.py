@@ -0,0 +1,164 @@
+"""Bulk expense import: streaming CSV/NDJSON parsing and chunked batch inserts.
+
+Rows are parsed one at a time from the request body, so memory use depends on
+the chunk size, not the file size. Every row becomes a payload with the same
+shape ``add_expense`` accepts. NDJSON rows are that JSON object as is; CSV files
+need a header row with these columns::
+
+    title,amount,paid_by,split_among,shares,contributors
+    Groceries,30.00,1,1;2;3,,
+    Rent,900,,,1:450;2:450,1:600;2:300
+
+``split_among`` is a ``;`` separated list of user ids, while ``shares`` and
+``contributors`` are ``user_id:amount`` pairs. Empty cells are left out.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from . import changes, ledger, money
+    from .db import db
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import changes  # type: ignore
+    import ledger  # type: ignore
+    import money  # type: ignore
+    from db import db  # type: ignore
+
+# Rows per transaction; each chunk commits on its own and bumps the group version once.
+CHUNK_ROWS = 1000
+
+CSV_COLUMNS = ("title", "amount", "paid_by", "split_among", "shares", "contributors")
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+# (line number, payload, error code); exactly one of payload and error is set.
+Row = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+# (title, amount, shares, contributions) with amounts in cents
+ValidExpense = Tuple[str, int, List[Tuple[int, int]], List[Tuple[int, int]]]
+
+
+class ImportFormatError(ValueError):
+    """The body as a whole cannot be parsed; the value is the API error code."""
+
+
+def detect_format(mimetype: str, requested: Optional[str] = None) -> Optional[str]:
+    if requested in ("csv", "ndjson"):
+        return requested
+    return FORMATS.get(mimetype)
+
+
+def open_text(stream: IO[bytes]) -> io.TextIOWrapper:
+    # utf-8-sig drops the byte order mark spreadsheet exports like to start with.
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def parse(fmt: str, text: IO[str]) -> Iterator[Row]:
+    rows = parse_csv(text) if fmt == "csv" else parse_ndjson(text)
+    try:
+        yield from rows
+    except UnicodeDecodeError:
+        raise ImportFormatError("invalid_encoding") from None
+    except csv.Error:
+        raise ImportFormatError("invalid_csv") from None
+
+
+def parse_ndjson(text: IO[str]) -> Iterator[Row]:
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            yield line_number, None, "invalid_json"
+            continue
+        if not isinstance(payload, dict):
+            yield line_number, None, "invalid_json"
+            continue
+        yield line_number, payload, None
+
+
+def parse_csv(text: IO[str]) -> Iterator[Row]:
+    reader = csv.DictReader(text)
+    header = [name.strip() for name in reader.fieldnames or []]
+    if "title" not in header or "amount" not in header:
+        raise ImportFormatError("invalid_csv_header")
+    reader.fieldnames = header
+
+    for record in reader:
+        if None in record:
+            yield reader.line_num, None, "too_many_columns"
+            continue
+        cells = {key: (value or "").strip() for key, value in record.items() if key in CSV_COLUMNS}
+        if not any(cells.values()):
+            continue
+        yield reader.line_num, _csv_payload(cells), None
+
+
+def _csv_payload(cells: Dict[str, str]) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {"title": cells.get("title"), "amount": cells.get("amount") or None}
+    if cells.get("paid_by"):
+        payload["paid_by"] = cells["paid_by"]
+    if cells.get("split_among"):
+        payload["split_among"] = _split_list(cells["split_among"])
+    if cells.get("shares"):
+        payload["shares"] = _split_pairs(cells["shares"], "share_amount")
+    if cells.get("contributors"):
+        payload["contributors"] = _split_pairs(cells["contributors"], "amount")
+    return payload
+
+
+def _split_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(";") if item.strip()]
+
+
+def _split_pairs(value: str, amount_key: str) -> List[Dict[str, str]]:
+    pairs = []
+    for item in _split_list(value):
+        user_id, sep, amount = item.partition(":")
+        # A pair without an amount is left incomplete so validation reports it.
+        pairs.append({"user_id": user_id.strip(), amount_key: amount.strip()} if sep else {"user_id": user_id})
+    return pairs
+
+
+def insert_expenses(group_id: int, expenses: Sequence[ValidExpense]) -> Tuple[List[int], int]:
+    """Insert validated expenses in one transaction. Returns ``(expense_ids, version)``."""
+    with db.transaction() as tx:
+        expense_ids = tx.insert_many(
+            "expenses",
+            ("group_id", "title", "amount", "paid_by"),
+            [
+                (group_id, title, money.to_sql(amount), contributions[0][0])
+                for title, amount, _, contributions in expenses
+            ],
+        )
+        tx.insert_many(
+            "expense_shares",
+            ("expense_id", "user_id", "share_amount"),
+            [
+                (expense_id, user_id, money.to_sql(share_amount))
+                for expense_id, (_, _, shares, _) in zip(expense_ids, expenses)
+                for user_id, share_amount in shares
+            ],
+        )
+        tx.insert_many(
+            "expense_contributions",
+            ("expense_id", "user_id", "amount"),
+            [
+                (expense_id, user_id, money.to_sql(amount_paid))
+                for expense_id, (_, _, _, contributions) in zip(expense_ids, expenses)
+                for user_id, amount_paid in contributions
+            ],
+        )
+        ledger.record_expenses(tx, group_id, [(shares, contributions) for _, _, shares, contributions in expenses])
+        version = changes.bump(tx, group_id, [(expense_id, changes.UPSERT) for expense_id in expense_ids])
+    return expense_ids, version
@@ -0,0 +1,207 @@
+"""Per-request database accounting, slow-query logging and route latency.
+
+``Database`` and ``AsyncDatabase`` report every statement to
+``record_query`` and every pool checkout to ``record_checkout``. Inside a
+request both are added to the request's ``RequestStats``: kept on ``g`` for
+Flask requests, and in a context variable set by ``begin`` for the native
+routes in ``backend/asgi.py``, which the concurrent queries of one request
+inherit. ``install`` adds hooks (``backend/asgi.py`` calls ``finish`` itself)
+that:
+
+- send the totals back in a ``Server-Timing`` header
+  (``db;dur=12.4;desc="7 queries", pool;dur=0.1, app;dur=20.3``), so browser
+  dev tools show where a slow request spent its time;
+- record per-route latency, queries-per-request and checkouts-per-request
+  histograms.
+
+Statements are aggregated by their normalized text, so ``IN (%s, %s, ...)``
+lists and multi-row ``VALUES`` of any length count as one statement.
+Statements slower than ``SLOW_QUERY_MS`` are logged with their normalized
+text, never with their parameters.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from flask import Flask, Response, g, has_request_context, request
+
+try:
+    from .config import config
+    from .metrics import COUNT_BUCKETS, Histogram
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from config import config  # type: ignore
+    from metrics import COUNT_BUCKETS, Histogram  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+STATEMENTS_MAX = 500
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROW_LIST = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace, literals and placeholder lists: ``IN (?)``, ``VALUES (?)``."""
+    text = _WHITESPACE.sub(" ", query).strip()
+    text = _LITERALS.sub("?", text.replace("%s", "?"))
+    text = _PLACEHOLDER_LIST.sub("(?)", text)
+    return _ROW_LIST.sub("(?)", text)
+
+
+class RequestStats:
+    __slots__ = ("started", "queries", "db_seconds", "checkouts", "pool_wait_seconds", "compress_seconds")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.checkouts = 0
+        self.pool_wait_seconds = 0.0
+        self.compress_seconds = 0.0
+
+    def server_timing(self) -> str:
+        app_ms = (time.perf_counter() - self.started) * 1000
+        timing = (
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries", '
+            f"pool;dur={self.pool_wait_seconds * 1000:.1f}, "
+            f"app;dur={app_ms:.1f}"
+        )
+        if self.compress_seconds:
+            timing += f", compress;dur={self.compress_seconds * 1000:.1f}"
+        return timing
+
+
+class StatementStats:
+    """Count, total and max time per normalized statement, for the first ``STATEMENTS_MAX``."""
+
+    def __init__(self, max_entries: int = STATEMENTS_MAX) -> None:
+        self.max_entries = max_entries
+        self._entries: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def add(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._entries.get(statement)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    self.dropped += 1
+                    return
+                entry = self._entries[statement] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def snapshot(self, limit: int = 50) -> Dict[str, Any]:
+        with self._lock:
+            entries = sorted(self._entries.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+            dropped = self.dropped
+        return {
+            "by_total_time": [
+                {
+                    "sql": statement,
+                    "count": count,
+                    "total_seconds": round(total, 6),
+                    "mean_seconds": round(total / count, 6),
+                    "max_seconds": round(longest, 6),
+                }
+                for statement, (count, total, longest) in entries
+            ],
+            "dropped": dropped,
+        }
+
+
+statements = StatementStats()
+queries_per_request = Histogram(COUNT_BUCKETS)
+checkouts_per_request = Histogram(COUNT_BUCKETS)
+_route_latency: Dict[str, Histogram] = {}
+_route_lock = threading.Lock()
+_async_stats: ContextVar[Optional[RequestStats]] = ContextVar("async_request_stats", default=None)
+
+
+def begin() -> RequestStats:
+    """Start accounting for a request served outside Flask, in the current context."""
+    stats = RequestStats()
+    _async_stats.set(stats)
+    return stats
+
+
+def current() -> Optional[RequestStats]:
+    if not has_request_context():
+        return _async_stats.get()
+    stats = g.get("db_stats")
+    if stats is None:
+        stats = g.db_stats = RequestStats()
+    return stats
+
+
+def record_query(query: str, seconds: float) -> None:
+    statement = normalize_sql(query)
+    statements.add(statement, seconds)
+    if seconds * 1000 >= config.SLOW_QUERY_MS:
+        logger.warning("slow query (%.1f ms): %s", seconds * 1000, statement)
+    stats = current()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+
+def record_checkout(wait_seconds: float) -> None:
+    stats = current()
+    if stats is not None:
+        stats.checkouts += 1
+        stats.pool_wait_seconds += wait_seconds
+
+
+def _route_histogram(route: str) -> Histogram:
+    histogram = _route_latency.get(route)
+    if histogram is None:
+        with _route_lock:
+            histogram = _route_latency.setdefault(route, Histogram())
+    return histogram
+
+
+def finish(route: str, stats: RequestStats) -> None:
+    """Record a finished request's latency, queries and checkouts under ``route``."""
+    _route_histogram(route).observe(time.perf_counter() - stats.started)
+    queries_per_request.observe(stats.queries)
+    checkouts_per_request.observe(stats.checkouts)
+
+
+def snapshot() -> Dict[str, Any]:
+    with _route_lock:
+        routes = dict(_route_latency)
+    return {
+        "routes": {route: histogram.snapshot() for route, histogram in sorted(routes.items())},
+        "queries_per_request": queries_per_request.snapshot(),
+        "checkouts_per_request": checkouts_per_request.snapshot(),
+        "statements": statements.snapshot(),
+    }
+
+
+def install(app: Flask) -> None:
+    @app.before_request
+    def start_request_stats() -> None:
+        g.db_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response: Response) -> Response:
+        stats = g.get("db_stats")
+        if stats is None or not request.path.startswith("/api/"):
+            return response
+        if config.SERVER_TIMING:
+            response.headers["Server-Timing"] = stats.server_timing()
+        # Streamed responses are timed up to their first byte.
+        rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        finish(f"{request.method} {rule}", stats)
+        return response
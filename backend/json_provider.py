@@ -0,0 +1,59 @@
+"""JSON provider for API responses built straight from database rows.
+
+mysql-connector returns ``DECIMAL`` columns as ``Decimal`` and ``DATETIME``
+columns as ``datetime``, so routes can hand rows to ``jsonify`` unchanged:
+
+- ``Decimal`` is written as a JSON number. Amounts are ``DECIMAL(10,2)``, whose
+  values convert to the double with the same shortest repr, so ``12.30``
+  is sent as ``12.3`` with no rounding noise.
+- ``datetime`` is written in ISO 8601. Naive values are UTC, as Flask's
+  default provider assumes, so they get a ``Z`` suffix.
+
+Responses are encoded once with a shared compact encoder and keys in row
+order. Flask's default provider sorts keys and re-creates its encoder on every
+call.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+
+def default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text + "Z" if value.tzinfo is None else text
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+_encoder = json.JSONEncoder(default=default, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps(value: Any) -> str:
+    """Encode ``value`` the way API responses are encoded, outside a Flask app."""
+    return _encoder.encode(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    sort_keys = False
+    ensure_ascii = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if not kwargs:
+            return _encoder.encode(obj)
+        kwargs.setdefault("default", default)
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(f"{_encoder.encode(obj)}\n", mimetype=self.mimetype)
@@ -0,0 +1,263 @@
+"""Per-(group, user) balance ledger.
+
+``group_balances`` holds running totals so the balances endpoint can read one
+row per member instead of aggregating every expense in the group. The write
+routes apply deltas inside their own transaction; ``rebuild`` and ``verify``
+recompute the totals from the raw expense tables.
+
+Usage::
+
+    python -m backend.ledger verify [--group-id N]
+    python -m backend.ledger rebuild [--group-id N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from . import money
+    from .db import db
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import money  # type: ignore
+    from db import db  # type: ignore
+
+# user_id -> (total_contributed, total_owed, credited_to_shares), in cents
+LedgerTotals = Dict[int, Tuple[int, int, int]]
+
+EXPENSE_CONTRIBUTIONS_SQL = """
+    SELECT user_id, SUM(amount) AS amount
+    FROM expense_contributions
+    WHERE expense_id=%s
+    GROUP BY user_id
+"""
+
+# Legacy expenses without contribution rows count the payer in full.
+LEGACY_CONTRIBUTION_SQL = "SELECT paid_by AS user_id, amount FROM expenses WHERE id=%s"
+
+SHARE_CREDITS_SQL = """
+    SELECT es.user_id,
+           es.share_amount,
+           COALESCE((
+               SELECT SUM(p.amount) FROM expense_payments p
+               WHERE p.expense_id = es.expense_id AND p.user_id = es.user_id
+           ), 0) AS payments_amount,
+           COALESCE((
+               SELECT SUM(c.amount) FROM expense_contributions c
+               WHERE c.expense_id = es.expense_id AND c.user_id = es.user_id
+           ), 0) AS contributions_amount
+    FROM expense_shares es
+    JOIN expenses e ON es.expense_id = e.id
+    WHERE {where}
+"""
+
+
+def _add(totals: LedgerTotals, user_id: int, contributed: int = 0, owed: int = 0, credited: int = 0) -> None:
+    current = totals.get(user_id, (0, 0, 0))
+    totals[user_id] = (current[0] + contributed, current[1] + owed, current[2] + credited)
+
+
+def apply_deltas(tx, group_id: int, deltas: LedgerTotals) -> None:
+    """Add ``deltas`` to the ledger rows of ``group_id``, creating rows as needed."""
+    if not deltas:
+        return
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(deltas))
+    params: List[Any] = []
+    for user_id, (contributed, owed, credited) in deltas.items():
+        params.extend([group_id, user_id, money.to_sql(contributed), money.to_sql(owed), money.to_sql(credited)])
+    tx.execute(
+        f"""
+        INSERT INTO group_balances (group_id, user_id, total_contributed, total_owed, credited_to_shares)
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            total_contributed = total_contributed + VALUES(total_contributed),
+            total_owed = total_owed + VALUES(total_owed),
+            credited_to_shares = credited_to_shares + VALUES(credited_to_shares)
+        """,
+        params,
+    )
+
+
+def _expense_deltas(
+    deltas: LedgerTotals,
+    shares: Iterable[Tuple[int, int]],
+    contributions: Iterable[Tuple[int, int]],
+) -> None:
+    contribution_map: Dict[int, int] = {}
+    for user_id, amount in contributions:
+        contribution_map[user_id] = contribution_map.get(user_id, 0) + amount
+        _add(deltas, user_id, contributed=amount)
+    for user_id, share_amount in shares:
+        credited = min(share_amount, contribution_map.get(user_id, 0))
+        _add(deltas, user_id, owed=share_amount, credited=credited)
+
+
+def record_expense(
+    tx,
+    group_id: int,
+    shares: Iterable[Tuple[int, int]],
+    contributions: Iterable[Tuple[int, int]],
+) -> None:
+    """Account for a newly inserted expense (no payments exist for it yet)."""
+    record_expenses(tx, group_id, [(shares, contributions)])
+
+
+def record_expenses(
+    tx,
+    group_id: int,
+    expenses: Iterable[Tuple[Iterable[Tuple[int, int]], Iterable[Tuple[int, int]]]],
+) -> None:
+    """Account for a batch of new ``(shares, contributions)`` expenses in one upsert."""
+    deltas: LedgerTotals = {}
+    for shares, contributions in expenses:
+        _expense_deltas(deltas, shares, contributions)
+    apply_deltas(tx, group_id, deltas)
+
+
+def remove_expense(tx, group_id: int, expense_id: int) -> None:
+    """Reverse an expense's ledger effect. Must run before its rows are deleted."""
+    deltas: LedgerTotals = {}
+
+    contributions = tx.fetch_all(EXPENSE_CONTRIBUTIONS_SQL, (expense_id,))
+    if not contributions:
+        contributions = tx.fetch_all(LEGACY_CONTRIBUTION_SQL, (expense_id,))
+    for row in contributions:
+        _add(deltas, row["user_id"], contributed=-money.to_cents(row["amount"]))
+
+    for user_id, share_amount, credited in _share_credits(tx, "es.expense_id=%s", (expense_id,)):
+        _add(deltas, user_id, owed=-share_amount, credited=-credited)
+
+    apply_deltas(tx, group_id, deltas)
+
+
+def record_payment(tx, group_id: int, user_id: int, amount: int) -> None:
+    """Credit a payment (in cents) that was already capped at the share's remaining amount."""
+    apply_deltas(tx, group_id, {user_id: (0, 0, amount)})
+
+
+def _share_credits(tx, where: str, params: Tuple[Any, ...]) -> List[Tuple[int, int, int]]:
+    rows = tx.fetch_all(SHARE_CREDITS_SQL.format(where=where), params)
+    credits = []
+    for row in rows:
+        share_amount = money.to_cents(row["share_amount"])
+        paid = money.to_cents(row["payments_amount"]) + money.to_cents(row["contributions_amount"])
+        credits.append((row["user_id"], share_amount, min(share_amount, paid)))
+    return credits
+
+
+def compute_group(tx, group_id: int) -> LedgerTotals:
+    """Recompute a group's ledger from the raw expense tables."""
+    totals: LedgerTotals = {}
+
+    contributions = tx.fetch_all(
+        """
+        SELECT x.user_id, SUM(x.amount) AS amount
+        FROM (
+            SELECT ec.user_id, ec.amount
+            FROM expense_contributions ec
+            JOIN expenses e ON ec.expense_id = e.id
+            WHERE e.group_id=%s
+            UNION ALL
+            SELECT e.paid_by AS user_id, e.amount
+            FROM expenses e
+            WHERE e.group_id=%s
+              AND NOT EXISTS (SELECT 1 FROM expense_contributions ec WHERE ec.expense_id = e.id)
+        ) x
+        GROUP BY x.user_id
+        """,
+        (group_id, group_id),
+    )
+    for row in contributions:
+        _add(totals, row["user_id"], contributed=money.to_cents(row["amount"]))
+
+    for user_id, share_amount, credited in _share_credits(tx, "e.group_id=%s", (group_id,)):
+        _add(totals, user_id, owed=share_amount, credited=credited)
+
+    return totals
+
+
+def _stored_group(tx, group_id: int) -> LedgerTotals:
+    rows = tx.fetch_all(
+        """
+        SELECT user_id, total_contributed, total_owed, credited_to_shares
+        FROM group_balances
+        WHERE group_id=%s
+        """,
+        (group_id,),
+    )
+    return {
+        row["user_id"]: (
+            money.to_cents(row["total_contributed"]),
+            money.to_cents(row["total_owed"]),
+            money.to_cents(row["credited_to_shares"]),
+        )
+        for row in rows
+    }
+
+
+def _group_ids(group_id: Optional[int]) -> List[int]:
+    if group_id is not None:
+        return [group_id]
+    return [row["id"] for row in db.fetch_all("SELECT id FROM `groups` ORDER BY id")]
+
+
+def rebuild(group_id: Optional[int] = None) -> int:
+    """Replace ledger rows with freshly computed totals. Returns groups rebuilt."""
+    group_ids = _group_ids(group_id)
+    for gid in group_ids:
+        with db.transaction() as tx:
+            # Serialise with writers that bump the group row.
+            tx.fetch_one("SELECT id FROM `groups` WHERE id=%s FOR UPDATE", (gid,))
+            totals = compute_group(tx, gid)
+            tx.execute("DELETE FROM group_balances WHERE group_id=%s", (gid,))
+            apply_deltas(tx, gid, totals)
+    return len(group_ids)
+
+
+def verify(group_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return one entry per (group, user) whose stored totals have drifted."""
+    mismatches: List[Dict[str, Any]] = []
+    for gid in _group_ids(group_id):
+        with db.transaction() as tx:
+            expected = compute_group(tx, gid)
+            stored = _stored_group(tx, gid)
+        for user_id in sorted(set(expected) | set(stored)):
+            want = expected.get(user_id, (0, 0, 0))
+            have = stored.get(user_id, (0, 0, 0))
+            if want != have:
+                mismatches.append(
+                    {
+                        "group_id": gid,
+                        "user_id": user_id,
+                        "expected": [money.to_sql(value) for value in want],
+                        "stored": [money.to_sql(value) for value in have],
+                    }
+                )
+    return mismatches
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verify or rebuild the group balance ledger.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--group-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        count = rebuild(args.group_id)
+        print(f"rebuilt ledger for {count} group(s)")
+        return 0
+
+    mismatches = verify(args.group_id)
+    for item in mismatches:
+        print(
+            f"group {item['group_id']} user {item['user_id']}: "
+            f"expected (contributed, owed, credited)={item['expected']} stored={item['stored']}"
+        )
+    print(f"{len(mismatches)} mismatched ledger row(s)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Group membership checks with batching, a process-wide cache and a per-request memo.
+
+Only confirmed memberships are cached. A user who is not (yet) a member is
+looked up again on the next request, so joining takes effect immediately in
+every worker; ``invalidate`` is there for paths that change membership.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from flask import g, has_request_context
+
+try:
+    from .config import config
+    from .db import db
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from config import config  # type: ignore
+    from db import db  # type: ignore
+
+Key = Tuple[int, int]
+
+MEMBERS_IN_SQL = "SELECT user_id FROM group_members WHERE group_id=%s AND user_id IN ({placeholders})"
+GROUP_MEMBER_IDS_SQL = "SELECT user_id FROM group_members WHERE group_id=%s"
+
+
+class MembershipCache:
+    """Bounded LRU of ``(group_id, user_id)`` pairs, each valid for ``ttl`` seconds."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Key, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def contains(self, key: Key) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None or expires < now:
+                if expires is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def add(self, keys: Iterable[Key]) -> None:
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key in keys:
+                self._entries[key] = expires
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, group_id: int, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is not None:
+                self._entries.pop((group_id, user_id), None)
+                return
+            for key in [key for key in self._entries if key[0] == group_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+cache = MembershipCache(config.MEMBERSHIP_CACHE_SIZE, config.MEMBERSHIP_CACHE_TTL)
+_counters = {"memo_hits": 0, "queries": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def _memo() -> Optional[Dict[Key, bool]]:
+    if not has_request_context():
+        return None
+    if "membership_memo" not in g:
+        g.membership_memo = {}
+    return g.membership_memo
+
+
+def as_user_id(value: Any) -> Optional[int]:
+    # Mirror what the SQL comparison would match: integers and integral strings only.
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)
+    return None
+
+
+def members_of(group_id: int, user_ids: Iterable[Any]) -> Set[int]:
+    """Return the subset of ``user_ids`` that belong to the group, in at most one query."""
+    memo = _memo()
+    members: Set[int] = set()
+    unknown: Set[int] = set()
+    memo_hits = 0
+
+    for value in user_ids:
+        user_id = as_user_id(value)
+        if user_id is None:
+            continue
+        key = (group_id, user_id)
+        if memo is not None and key in memo:
+            memo_hits += 1
+            if memo[key]:
+                members.add(user_id)
+        elif cache.contains(key):
+            members.add(user_id)
+            if memo is not None:
+                memo[key] = True
+        else:
+            unknown.add(user_id)
+
+    if memo_hits:
+        _count("memo_hits", memo_hits)
+    if unknown:
+        _count("queries")
+        placeholders = ", ".join(["%s"] * len(unknown))
+        rows = db.fetch_all(MEMBERS_IN_SQL.format(placeholders=placeholders), [group_id, *sorted(unknown)])
+        found = {row["user_id"] for row in rows}
+        cache.add((group_id, user_id) for user_id in found)
+        members |= found
+        if memo is not None:
+            for user_id in unknown:
+                memo[(group_id, user_id)] = user_id in found
+
+    return members
+
+
+def group_members(group_id: int) -> Set[int]:
+    """Load every member of the group, for requests that check many users at once."""
+    _count("queries")
+    rows = db.fetch_all(GROUP_MEMBER_IDS_SQL, (group_id,))
+    members = {row["user_id"] for row in rows}
+    cache.add((group_id, user_id) for user_id in members)
+    return members
+
+
+def is_member(user_id: Any, group_id: int) -> bool:
+    user_id = as_user_id(user_id)
+    return user_id is not None and user_id in members_of(group_id, [user_id])
+
+
+def invalidate(group_id: int, user_id: Optional[int] = None) -> None:
+    cache.invalidate(group_id, user_id)
+    memo = _memo()
+    if memo is not None:
+        for key in [key for key in memo if key[0] == group_id and user_id in (None, key[1])]:
+            del memo[key]
+
+
+def stats() -> Dict[str, Any]:
+    with _counters_lock:
+        counters = dict(_counters)
+    return {**cache.stats(), **counters}
@@ -0,0 +1,44 @@
+"""In-process metric primitives reported at ``/metrics``.
+
+Values are per worker process; a scraper that wants cluster totals sums them.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Sequence
+
+# Seconds; fine enough at the low end to tell a pool hit from a network round trip.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Bucketed observations with their count and sum, like a Prometheus histogram."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """``buckets`` maps each upper bound to the cumulative count at or below it."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        buckets: Dict[str, int] = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            buckets[f"{bound:g}"] = running
+        running += counts[-1]
+        buckets["+Inf"] = running
+        return {"count": running, "sum": round(total, 6), "buckets": buckets}
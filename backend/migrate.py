@@ -0,0 +1,220 @@
+"""Forward-only schema migrations.
+
+Migrations are the numbered ``*.sql`` files in ``database/migrations``. Each
+applied file is recorded in ``schema_migrations`` together with a checksum, so
+editing a migration after it has run is reported instead of silently ignored.
+Schema changes always go in a new file.
+
+When a run creates the ``group_balances`` ledger in a database that already
+has expenses (one created with the old ``schema.sql``), it fills the ledger
+from the raw expense tables with ``ledger.rebuild`` before releasing the
+migration lock, so no balance reads 0 after the upgrade.
+
+Usage::
+
+    python -m backend.migrate            # apply pending migrations
+    python -m backend.migrate status
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import mysql.connector
+
+try:
+    from .config import config
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from config import config  # type: ignore
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "database" / "migrations"
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def _connect(database: Optional[str] = None):
+    return mysql.connector.connect(
+        host=config.DB_HOST,
+        port=int(config.DB_PORT),
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        database=database,
+        auth_plugin="mysql_native_password",
+    )
+
+
+def discover() -> List[Tuple[str, Path]]:
+    """Return ``(version, path)`` pairs sorted by version."""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        version = path.stem.split("_", 1)[0]
+        if not version.isdigit():
+            raise MigrationError(f"migration file name must start with a number: {path.name}")
+        migrations.append((version, path))
+    versions = [version for version, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError("duplicate migration version numbers")
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    statements = []
+    current: List[str] = []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("--"):
+            continue
+        current.append(line)
+        if stripped.endswith(";"):
+            statements.append("\n".join(current).rstrip().rstrip(";"))
+            current = []
+    if current:
+        statements.append("\n".join(current))
+    return statements
+
+
+def _checksum(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _ensure_database() -> None:
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"CREATE DATABASE IF NOT EXISTS `{config.DB_NAME}` "
+            "CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+        )
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _applied(cursor) -> dict:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(32) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cursor.execute("SELECT version, name, checksum FROM schema_migrations")
+    return {version: (name, checksum) for version, name, checksum in cursor.fetchall()}
+
+
+def pending() -> List[Tuple[str, Path]]:
+    conn = _connect(config.DB_NAME)
+    try:
+        cursor = conn.cursor()
+        applied = _applied(cursor)
+        cursor.close()
+    finally:
+        conn.close()
+    return _pending(applied)
+
+
+def _pending(applied: dict) -> List[Tuple[str, Path]]:
+    result = []
+    for version, path in discover():
+        if version in applied:
+            if applied[version][1] != _checksum(path):
+                raise MigrationError(
+                    f"migration {path.name} changed after it was applied; add a new migration instead"
+                )
+            continue
+        result.append((version, path))
+    return result
+
+
+def _has_table(cursor, name: str) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema=DATABASE() AND table_name=%s", (name,)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _backfill_ledger() -> int:
+    # Imported here: the ledger needs the app's database pool, the migrations do not.
+    try:
+        from . import ledger
+    except ImportError:  # pragma: no cover - fallback for direct execution
+        import ledger  # type: ignore
+
+    try:
+        return ledger.rebuild()
+    except mysql.connector.Error as exc:
+        raise MigrationError(
+            f"group_balances was created but not filled ({exc}); run `python -m backend.ledger rebuild`"
+        ) from exc
+
+
+def migrate() -> List[str]:
+    """Apply pending migrations in order. Returns the applied file names, and the ledger backfill if one ran."""
+    _ensure_database()
+    conn = _connect(config.DB_NAME)
+    applied_names: List[str] = []
+    try:
+        cursor = conn.cursor()
+        # Only one runner at a time; DDL auto-commits so a transaction cannot guard it.
+        cursor.execute("SELECT GET_LOCK('hostelsplit_migrate', 60)")
+        if cursor.fetchone()[0] != 1:
+            raise MigrationError("could not acquire the migration lock")
+        try:
+            had_ledger = _has_table(cursor, "group_balances")
+            for version, path in _pending(_applied(cursor)):
+                for statement in split_statements(path.read_text(encoding="utf-8")):
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (version, path.name, _checksum(path)),
+                )
+                conn.commit()
+                applied_names.append(path.name)
+            if not had_ledger and _has_table(cursor, "group_balances"):
+                groups = _backfill_ledger()
+                if groups:
+                    applied_names.append(f"group_balances backfill ({groups} groups)")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('hostelsplit_migrate')")
+            cursor.fetchall()
+            cursor.close()
+    finally:
+        conn.close()
+    return applied_names
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply forward-only schema migrations.")
+    parser.add_argument("command", nargs="?", default="up", choices=["up", "status"])
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "status":
+            _ensure_database()
+            names = [path.name for _, path in pending()]
+            print("\n".join(names) if names else "database is up to date")
+            return 0
+
+        names = migrate()
+    except MigrationError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+
+    for name in names:
+        print(f"applied {name}")
+    if not names:
+        print("database is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Money as integer cents.
+
+Amounts are stored as ``DECIMAL(10,2)``. Everything between the database and
+the JSON response works on plain ``int`` cents, so sums and comparisons in the
+per-row loops are integer arithmetic with no re-quantizing.
+
+- ``to_cents`` parses database ``Decimal`` values and user input.
+- ``to_sql`` formats cents as a ``DECIMAL`` literal string for query parameters.
+- ``to_json`` turns cents into the JSON number the API returns. A single
+  division by 100 yields the double closest to the two-place value, and
+  ``json`` prints that double's shortest repr, so ``1234`` is written as
+  ``12.34`` exactly.
+"""
+
+from __future__ import annotations
+
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any, List
+
+Cents = int
+
+_CENT = Decimal("0.01")
+
+
+def to_cents(value: Any) -> Cents:
+    """Convert a database ``Decimal`` or an int, float or numeric string to cents.
+
+    Floats and strings with more than two decimal places are rounded half up.
+    Raises ``ValueError`` for anything that is not a finite number.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        raise ValueError("not an amount")
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, Decimal):
+        # DECIMAL(10,2) columns and their SUMs have exactly two places, so the
+        # scaled value is integral and needs no rounding; this is the hot path.
+        return int(value.scaleb(2))
+    if isinstance(value, float):
+        # str() gives the shortest repr, so 0.1 + 0.2 style noise does not round up.
+        value = str(value)
+    if isinstance(value, str):
+        try:
+            parsed = Decimal(value.strip())
+            if not parsed.is_finite():
+                raise ValueError("not an amount")
+            return int(parsed.quantize(_CENT, ROUND_HALF_UP).scaleb(2))
+        except InvalidOperation:
+            raise ValueError("not an amount") from None
+    raise ValueError("not an amount")
+
+
+def to_sql(cents: Cents) -> str:
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(cents), 100)
+    return f"{sign}{whole}.{frac:02d}"
+
+
+def to_json(cents: Cents) -> float:
+    return cents / 100
+
+
+def split_even(total: Cents, count: int) -> List[Cents]:
+    """Split ``total`` into ``count`` parts that differ by at most one cent.
+
+    The leftover cents go to the first ``total % count`` parts, so the parts
+    always add up to ``total`` exactly.
+    """
+    if count <= 0:
+        return []
+    base, remainder = divmod(total, count)
+    return [base + 1] * remainder + [base] * (count - remainder)
@@ -0,0 +1,186 @@
+"""Settlement of pending expense shares.
+
+``record_payment``, mark-paid and ``/api/me/settle`` all pay off a user's
+shares, and each does it in one transaction:
+
+1. ``lock_shares`` locks the user's share rows (``SELECT ... FOR UPDATE``) in
+   expense order. A concurrent payment towards the same shares waits there
+   until this one commits.
+2. The payments and contributions already credited to those shares are read
+   once the locks are held. InnoDB takes a transaction's read snapshot at its
+   first plain read, so ``lock_shares`` must be the transaction's first
+   statement; the sums then include every payment committed before the locks
+   were granted, and no share can be paid past its amount.
+3. ``allocate`` spreads the amount over the pending shares, oldest expense
+   first, in memory.
+4. ``apply`` writes every payment with one multi-row ``INSERT``, then the
+   ledger credit and change version of each group it touched.
+
+Errors the caller should report are raised as ``SettlementError``.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from . import changes, ledger, money
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import changes  # type: ignore
+    import ledger  # type: ignore
+    import money  # type: ignore
+
+LOCK_SHARES_SQL = """
+    SELECT es.expense_id, es.share_amount, e.group_id
+    FROM expense_shares es
+    JOIN expenses e ON es.expense_id = e.id
+    WHERE es.user_id=%s {where}
+    ORDER BY es.expense_id
+    FOR UPDATE OF es
+"""
+
+CREDITED_SQL = """
+    SELECT expense_id, SUM(amount) AS amount
+    FROM {table}
+    WHERE user_id=%s AND expense_id IN ({placeholders})
+    GROUP BY expense_id
+"""
+
+
+class SettlementError(Exception):
+    def __init__(self, code: str, status: int = 400, **details: Any) -> None:
+        super().__init__(code)
+        self.code = code
+        self.status = status
+        self.details = details
+
+
+class Share(NamedTuple):
+    group_id: int
+    expense_id: int
+    pending: int  # cents
+
+
+class Settlement(NamedTuple):
+    payments: List[Dict[str, Any]]
+    total: int  # cents
+    # group_id -> (expense ids paid towards, new change version)
+    groups: Dict[int, Tuple[List[int], int]]
+
+
+def credited_query(table: str, user_id: int, expense_ids: Sequence[int]) -> Tuple[str, List[Any]]:
+    placeholders = ", ".join(["%s"] * len(expense_ids))
+    return CREDITED_SQL.format(table=table, placeholders=placeholders), [user_id, *expense_ids]
+
+
+def lock_shares_query(
+    user_id: int, group_ids: Optional[Sequence[int]] = None, expense_id: Optional[int] = None
+) -> Tuple[str, List[Any]]:
+    where, params = "", [user_id]
+    if group_ids is not None:
+        where += f" AND e.group_id IN ({', '.join(['%s'] * len(group_ids))})"
+        params.extend(group_ids)
+    if expense_id is not None:
+        where += " AND es.expense_id=%s"
+        params.append(expense_id)
+    return LOCK_SHARES_SQL.format(where=where), params
+
+
+def _credited(tx, table: str, user_id: int, expense_ids: Sequence[int]) -> Dict[int, int]:
+    rows = tx.fetch_all(*credited_query(table, user_id, expense_ids))
+    return {row["expense_id"]: money.to_cents(row["amount"]) for row in rows}
+
+
+def lock_shares(
+    tx, user_id: int, group_ids: Optional[Iterable[int]] = None, expense_id: Optional[int] = None
+) -> List[Share]:
+    """Lock ``user_id``'s shares, optionally only in ``group_ids`` or of one expense, and return what is pending."""
+    if group_ids is not None:
+        group_ids = list(group_ids)
+        if not group_ids:
+            return []
+    rows = tx.fetch_all(*lock_shares_query(user_id, group_ids, expense_id))
+    if not rows:
+        return []
+
+    expense_ids = [row["expense_id"] for row in rows]
+    paid = _credited(tx, "expense_payments", user_id, expense_ids)
+    contributed = _credited(tx, "expense_contributions", user_id, expense_ids)
+    shares = []
+    for row in rows:
+        share_amount = money.to_cents(row["share_amount"])
+        credit = min(share_amount, paid.get(row["expense_id"], 0) + contributed.get(row["expense_id"], 0))
+        shares.append(Share(row["group_id"], row["expense_id"], share_amount - credit))
+    return shares
+
+
+def allocate(shares: Iterable[Share], amount: int) -> List[Tuple[Share, int]]:
+    """``(share, cents)`` pairs paying off ``amount`` over ``shares`` in order."""
+    allocations = []
+    remaining = amount
+    for share in shares:
+        if remaining <= 0:
+            break
+        if share.pending > 0:
+            cents = min(remaining, share.pending)
+            allocations.append((share, cents))
+            remaining -= cents
+    return allocations
+
+
+def apply(tx, user_id: int, allocations: Sequence[Tuple[Share, int]]) -> Settlement:
+    if not allocations:
+        return Settlement([], 0, {})
+    payment_ids = tx.insert_many(
+        "expense_payments",
+        ("expense_id", "user_id", "amount"),
+        [(share.expense_id, user_id, money.to_sql(cents)) for share, cents in allocations],
+    )
+
+    by_group: Dict[int, List[Tuple[int, int]]] = {}
+    for share, cents in allocations:
+        by_group.setdefault(share.group_id, []).append((share.expense_id, cents))
+    groups = {}
+    # Ascending group order, so two settlements lock the group rows in the same order.
+    for group_id in sorted(by_group):
+        paid = by_group[group_id]
+        ledger.record_payment(tx, group_id, user_id, sum(cents for _, cents in paid))
+        version = changes.bump(tx, group_id, [(expense_id, changes.UPSERT) for expense_id, _ in paid])
+        groups[group_id] = ([expense_id for expense_id, _ in paid], version)
+
+    payments = [
+        {
+            "id": payment_id,
+            "group_id": share.group_id,
+            "expense_id": share.expense_id,
+            "amount": money.to_json(cents),
+        }
+        for payment_id, (share, cents) in zip(payment_ids, allocations)
+    ]
+    return Settlement(payments, sum(cents for _, cents in allocations), groups)
+
+
+def pay_share(tx, group_id: int, expense_id: int, user_id: int, amount: int) -> Settlement:
+    """Pay ``amount`` towards one share; more than is pending is refused, not capped."""
+    shares = lock_shares(tx, user_id, [group_id], expense_id=expense_id)
+    if not shares:
+        expense = tx.fetch_one("SELECT id FROM expenses WHERE id=%s AND group_id=%s", (expense_id, group_id))
+        if not expense:
+            raise SettlementError("expense_not_found", 404)
+        raise SettlementError("user_not_in_expense")
+    pending = shares[0].pending
+    if pending <= 0:
+        raise SettlementError("share_already_settled")
+    if amount > pending:
+        raise SettlementError("amount_exceeds_remaining", remaining=money.to_json(pending))
+    return apply(tx, user_id, [(shares[0], amount)])
+
+
+def settle(tx, user_id: int, group_ids: Optional[Iterable[int]] = None, amount: Optional[int] = None) -> Settlement:
+    """Pay off ``user_id``'s pending shares, all of them or up to ``amount`` cents, oldest first."""
+    shares = lock_shares(tx, user_id, group_ids)
+    if amount is None:
+        amount = sum(share.pending for share in shares)
+    if amount <= 0:
+        raise SettlementError("nothing_pending")
+    return apply(tx, user_id, allocate(shares, amount))
@@ -0,0 +1,231 @@
+"""Blocking MySQL connection pool with health checks and metrics.
+
+``mysql.connector.pooling`` raises ``PoolError`` the moment all connections
+are checked out, so a short burst above the pool size fails requests that
+would have been served a few milliseconds later. This pool queues them instead:
+
+- Up to ``max_size`` connections are opened on demand; ``min_size`` of them
+  are opened by the first checkout and never closed for being idle. Nothing
+  connects at import, so a process that never queries (a password hashing
+  worker importing the main script) opens no connections.
+- When all are in use, callers wait on a condition for up to ``timeout``
+  seconds, then get ``PoolTimeout``.
+- Idle connections are reused newest first. One idle for longer than
+  ``ping_after`` seconds is pinged before use, and one older than ``recycle``
+  seconds is replaced, so connections dropped by a MySQL restart or
+  ``wait_timeout`` are reopened instead of failing the request.
+- Connections above ``min_size`` that sit idle for ``idle_timeout`` seconds are
+  closed.
+- After ``fork()`` the child forgets the parent's connections without closing
+  them (closing would end the parent's sessions) and opens its own.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+try:
+    from .metrics import Histogram
+except ImportError:  # pragma: no cover - fallback for direct execution
+    from metrics import Histogram  # type: ignore
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool timeout."""
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 2,
+        max_size: int = 10,
+        timeout: float = 5.0,
+        recycle: float = 3600.0,
+        ping_after: float = 30.0,
+        idle_timeout: float = 300.0,
+    ) -> None:
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.idle_timeout = idle_timeout
+        self.wait_seconds = Histogram()
+        self._reset()
+        _pools.add(self)
+
+    def _reset(self) -> None:
+        self._cond = threading.Condition()
+        # (connection, last returned at); newest at the right
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        # id(connection) -> opened at, for every connection this process owns
+        self._opened: Dict[int, float] = {}
+        self._filled = False
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._counters = {"checkouts": 0, "timeouts": 0, "opened": 0, "closed": 0, "recycled": 0, "broken": 0}
+
+    def fill(self) -> None:
+        """Open connections until ``min_size`` exist."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self) -> Any:
+        if not self._filled:
+            # Once only: after a failed fill, connections are opened on demand below.
+            self._filled = True
+            self.fill()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry: Optional[Tuple[Any, float]] = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve the slot now; the connection is opened outside the lock.
+                    self._size += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeout(f"no database connection free after {self.timeout:g}s")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+            self._counters["checkouts"] += 1
+        self.wait_seconds.observe(time.monotonic() - start)
+
+        try:
+            return self._open() if entry is None else self._checked(*entry)
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        """Return ``conn``; ``discard`` closes it instead (e.g. after a connection error)."""
+        now = time.monotonic()
+        with self._cond:
+            opened = self._opened.get(id(conn))
+            if opened is None:
+                # Checked out before a fork; it belongs to the parent.
+                return
+            self._in_use -= 1
+            if discard or now - opened > self.recycle:
+                self._counters["broken" if discard else "recycled"] += 1
+                self._size -= 1
+                del self._opened[id(conn)]
+                expired = [conn]
+            else:
+                self._idle.append((conn, now))
+                expired = self._expire_idle(now)
+            self._cond.notify()
+        for stale in expired:
+            self._close(stale)
+
+    def _expire_idle(self, now: float) -> list:
+        # Oldest idle connections sit at the left; only trim down to min_size.
+        expired = []
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            del self._opened[id(conn)]
+            self._size -= 1
+            expired.append(conn)
+        return expired
+
+    def _checked(self, conn: Any, returned_at: float) -> Any:
+        now = time.monotonic()
+        opened = self._opened.get(id(conn), now)
+        healthy = now - opened <= self.recycle
+        if healthy and now - returned_at > self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                healthy = False
+        if healthy:
+            return conn
+        with self._cond:
+            self._opened.pop(id(conn), None)
+            self._counters["recycled"] += 1
+        self._close(conn)
+        return self._open()
+
+    def _open(self) -> Any:
+        conn = self._connect()
+        with self._cond:
+            self._opened[id(conn)] = time.monotonic()
+            self._counters["opened"] += 1
+        return conn
+
+    def _close(self, conn: Any) -> None:
+        with self._cond:
+            self._counters["closed"] += 1
+        try:
+            conn.close()
+        except Exception:  # already gone; the slot is free either way
+            pass
+
+    def close(self) -> None:
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            for conn in idle:
+                self._opened.pop(id(conn), None)
+            self._size -= len(idle)
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                **self._counters,
+            }
+        stats["wait_seconds"] = self.wait_seconds.snapshot()
+        return stats
+
+
+_pools: "weakref.WeakSet[ConnectionPool]" = weakref.WeakSet()
+
+
+def _after_fork_in_child() -> None:
+    for pool in list(_pools):
+        pool._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
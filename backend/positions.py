@@ -0,0 +1,170 @@
+"""A user's net position in every group, for ``/api/me/balances``.
+
+``POSITIONS_SQL`` reads the user's ``group_balances`` ledger row in each of
+their groups, one indexed lookup per membership, so the overview costs the
+same however large the groups are. The result is cached per user for
+``MY_BALANCES_CACHE_TTL`` seconds. Every event published for a group (see
+``backend/events.py``) drops the entries of that group's cached members in
+every worker, so a write is visible on the next read and the TTL only bounds
+staleness when an event is lost.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    from . import money
+    from .config import config
+    from .db import db
+    from .events import hub
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import money  # type: ignore
+    from config import config  # type: ignore
+    from db import db  # type: ignore
+    from events import hub  # type: ignore
+
+POSITIONS_SQL = """
+    SELECT g.id AS group_id,
+           g.group_name,
+           COALESCE(gb.total_contributed, 0) AS total_contributed,
+           COALESCE(gb.total_owed, 0) AS total_owed,
+           COALESCE(gb.credited_to_shares, 0) AS credited_to_shares
+    FROM group_members gm
+    JOIN `groups` g ON g.id = gm.group_id
+    LEFT JOIN group_balances gb ON gb.group_id = gm.group_id AND gb.user_id = gm.user_id
+    WHERE gm.user_id=%s
+    ORDER BY g.group_name, g.id
+"""
+
+
+class PositionCache:
+    """Bounded LRU of per-user overviews, each valid for ``ttl`` seconds or until one of its groups changes."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # user_id -> (expires, overview, group ids)
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any], Tuple[int, ...]]]" = OrderedDict()
+        # group_id -> users with a cached overview that includes it
+        self._by_group: Dict[int, Set[int]] = {}
+        # Bumped on every invalidation, so an overview read before a write is not cached after it.
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._drop(user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, overview: Dict[str, Any], group_ids: List[int], generation: int) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._drop(user_id)
+            self._entries[user_id] = (time.monotonic() + self.ttl, overview, tuple(group_ids))
+            for group_id in group_ids:
+                self._by_group.setdefault(group_id, set()).add(user_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, user_id: int) -> None:
+        # Called with the lock held.
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        for group_id in entry[2]:
+            users = self._by_group.get(group_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self._by_group[group_id]
+
+    def invalidate_group(self, group_id: int) -> None:
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            for user_id in list(self._by_group.get(group_id, ())):
+                self._drop(user_id)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self.generation += 1
+            self._drop(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+cache = PositionCache(config.MY_BALANCES_CACHE_SIZE, config.MY_BALANCES_CACHE_TTL)
+
+
+def _on_event(event: Dict[str, Any]) -> None:
+    group_id = event.get("group_id")
+    if group_id is not None:
+        cache.invalidate_group(group_id)
+    if event.get("type") == "member_joined" and event.get("user_id") is not None:
+        # The joining user's cached overview does not list the group yet.
+        cache.invalidate_user(event["user_id"])
+
+
+hub.add_listener(_on_event)
+
+
+def compute(user_id: int) -> Dict[str, Any]:
+    groups = []
+    totals = {"net_balance": 0, "total_owed": 0, "paid_towards_shares": 0, "pending_amount": 0}
+    for row in db.fetch_all(POSITIONS_SQL, (user_id,)):
+        total_owed = money.to_cents(row["total_owed"])
+        credited = money.to_cents(row["credited_to_shares"])
+        position = {
+            "net_balance": money.to_cents(row["total_contributed"]) - total_owed,
+            "total_owed": total_owed,
+            "paid_towards_shares": credited,
+            "pending_amount": max(0, total_owed - credited),
+        }
+        for key, cents in position.items():
+            totals[key] += cents
+        groups.append(
+            {
+                "group_id": row["group_id"],
+                "group_name": row["group_name"],
+                **{key: money.to_json(cents) for key, cents in position.items()},
+            }
+        )
+    return {"groups": groups, "totals": {key: money.to_json(cents) for key, cents in totals.items()}}
+
+
+def for_user(user_id: int) -> Dict[str, Any]:
+    # Invalidations arrive through the event hub, which is started lazily in each worker.
+    hub.start()
+    overview = cache.get(user_id)
+    if overview is None:
+        generation = cache.generation
+        overview = compute(user_id)
+        cache.put(user_id, overview, [group["group_id"] for group in overview["groups"]], generation)
+    return overview
+
+
+def stats() -> Dict[str, Any]:
+    return cache.stats()
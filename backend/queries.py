@@ -0,0 +1,169 @@
+"""SQL issued by the request handlers in backend/app.py and backend/asgi.py.
+
+Fixed statements are ``*_SQL`` constants; statements whose shape depends on
+the request (``IN`` lists, keyset cursors) are built by functions returning
+``(sql, params)``. ``backend/query_plans.py`` EXPLAINs these same objects, so
+the checked plans are the plans of the statements that run. SQL owned by
+other modules (``changes``, ``ledger``, ``payments``, ...) is checked from
+those modules in the same way.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+EMAIL_IN_USE_SQL = "SELECT id FROM users WHERE email=%s"
+
+USER_BY_EMAIL_SQL = "SELECT id, name, password FROM users WHERE email=%s"
+
+LIST_GROUPS_SQL = """
+    SELECT g.id, g.group_name, u.name AS created_by_name
+    FROM `groups` g
+    JOIN users u ON g.created_by = u.id
+    JOIN group_members gm ON gm.group_id = g.id
+    WHERE gm.user_id = %s
+    ORDER BY g.group_name
+"""
+
+MEMBERSHIP_SQL = "SELECT id FROM group_members WHERE group_id=%s AND user_id=%s"
+
+MY_GROUP_IDS_SQL = "SELECT group_id FROM group_members WHERE user_id=%s"
+
+MEMBERS_SQL = """
+    SELECT u.id, u.name, u.email
+    FROM group_members gm
+    JOIN users u ON gm.user_id = u.id
+    WHERE gm.group_id=%s
+    ORDER BY u.name
+"""
+
+BALANCES_SQL = """
+    SELECT u.id,
+           u.name,
+           COALESCE(gb.total_contributed, 0) AS total_contributed,
+           COALESCE(gb.total_owed, 0) AS total_owed,
+           COALESCE(gb.credited_to_shares, 0) AS credited_to_shares
+    FROM group_members gm
+    JOIN users u ON gm.user_id = u.id
+    LEFT JOIN group_balances gb ON gb.group_id = gm.group_id AND gb.user_id = gm.user_id
+    WHERE gm.group_id=%s
+"""
+
+# Locked so two concurrent deletes cannot both reverse the ledger.
+EXPENSE_FOR_DELETE_SQL = "SELECT id, paid_by FROM expenses WHERE id=%s AND group_id=%s FOR UPDATE"
+
+# Payments, contributions, shares, then the expense itself.
+DELETE_EXPENSE_SQL = (
+    "DELETE FROM expense_payments WHERE expense_id=%s",
+    "DELETE FROM expense_contributions WHERE expense_id=%s",
+    "DELETE FROM expense_shares WHERE expense_id=%s",
+    "DELETE FROM expenses WHERE id=%s",
+)
+
+
+def activity_query(
+    group_ids: Sequence[int], limit: int, cursor: Optional[Tuple[datetime, int]]
+) -> Tuple[str, List[Any]]:
+    """The newest ``limit + 1`` expenses of each group, one ``UNION ALL`` branch per group.
+
+    Each branch walks ``idx_expenses_group_date`` backwards from the cursor and
+    stops after ``limit + 1`` rows, so the work is bounded by the number of
+    groups whatever their size or age. The caller merges the branches.
+    """
+    keyset_clause = ""
+    if cursor:
+        keyset_clause = "AND (e.date_added < %s OR (e.date_added = %s AND e.id < %s))"
+    branches = []
+    params: List[Any] = []
+    for i, group_id in enumerate(group_ids):
+        branches.append(
+            f"""
+            SELECT * FROM (
+                SELECT e.id, e.group_id, g.group_name, e.title, e.amount, e.paid_by,
+                       u.name AS paid_by_name, e.date_added
+                FROM expenses e
+                JOIN `groups` g ON g.id = e.group_id
+                JOIN users u ON u.id = e.paid_by
+                WHERE e.group_id=%s {keyset_clause}
+                ORDER BY e.date_added DESC, e.id DESC
+                LIMIT %s
+            ) AS recent_{i}
+            """
+        )
+        params.append(group_id)
+        if cursor:
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        params.append(limit + 1)
+    return "UNION ALL".join(branches), params
+
+
+def expense_page_query(group_id: int, limit: int, cursor: Optional[Tuple[datetime, int]]) -> Tuple[str, List[Any]]:
+    keyset_clause = ""
+    params: List[Any] = [group_id]
+    if cursor:
+        keyset_clause = "AND (e.date_added < %s OR (e.date_added = %s AND e.id < %s))"
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    params.append(limit + 1)
+    return (
+        f"""
+        SELECT e.id, e.title, e.amount, e.paid_by, e.date_added, u.name AS paid_by_name
+        FROM expenses e
+        JOIN users u ON e.paid_by = u.id
+        WHERE e.group_id=%s {keyset_clause}
+        ORDER BY e.date_added DESC, e.id DESC
+        LIMIT %s
+        """,
+        params,
+    )
+
+
+def changed_expenses_query(group_id: int, expense_ids: Iterable[int]) -> Tuple[str, List[Any]]:
+    expense_ids = sorted(expense_ids)
+    placeholders = ", ".join(["%s"] * len(expense_ids))
+    return (
+        f"""
+        SELECT e.id, e.title, e.amount, e.paid_by, e.date_added, u.name AS paid_by_name
+        FROM expenses e
+        JOIN users u ON e.paid_by = u.id
+        WHERE e.group_id=%s AND e.id IN ({placeholders})
+        ORDER BY e.date_added DESC, e.id DESC
+        """,
+        [group_id, *expense_ids],
+    )
+
+
+def expense_detail_queries(expense_ids: List[int]) -> List[Tuple[str, List[int]]]:
+    """The shares, contributions and payments queries for a page; independent of each other."""
+    if not expense_ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(expense_ids))
+    return [
+        (
+            f"""
+            SELECT es.expense_id, es.user_id, es.share_amount, u.name
+            FROM expense_shares es
+            JOIN users u ON es.user_id = u.id
+            WHERE es.expense_id IN ({placeholders})
+            """,
+            expense_ids,
+        ),
+        (
+            f"""
+            SELECT ec.expense_id, ec.user_id, ec.amount, u.name
+            FROM expense_contributions ec
+            JOIN users u ON ec.user_id = u.id
+            WHERE ec.expense_id IN ({placeholders})
+            """,
+            expense_ids,
+        ),
+        (
+            f"""
+            SELECT expense_id, user_id, SUM(amount) AS total_paid
+            FROM expense_payments
+            WHERE expense_id IN ({placeholders})
+            GROUP BY expense_id, user_id
+            """,
+            expense_ids,
+        ),
+    ]
@@ -0,0 +1,239 @@
+"""EXPLAIN-plan regression check for the hot queries.
+
+Every hot query is listed in ``HOT_QUERIES`` and run through ``EXPLAIN``. The
+entries build their SQL from the constants and query builders the request
+handlers execute (``backend/queries.py`` and the modules that own the rest),
+so the plans checked are those of the statements that actually run. The
+check fails if any table is read with a full table or full index scan, or if
+a plan needs a filesort that the query has not been explicitly allowed. Run
+it against a scratch database seeded with enough rows for the optimizer to
+prefer indexes the way it does in production::
+
+    DB_NAME=hostelsplit_plans python -m backend.migrate
+    DB_NAME=hostelsplit_plans python -m backend.query_plans --seed 200000
+
+The exit status is non-zero when any plan regresses; CI runs it on every push
+(``.github/workflows/query-plans.yml``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from . import changes, exporter, ledger, membership, payments, positions, queries
+    from .migrate import _connect
+    from .config import config
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import changes  # type: ignore
+    import exporter  # type: ignore
+    import ledger  # type: ignore
+    import membership  # type: ignore
+    import payments  # type: ignore
+    import positions  # type: ignore
+    import queries  # type: ignore
+    from migrate import _connect  # type: ignore
+    from config import config  # type: ignore
+
+Sample = Dict[str, Any]
+
+PAGE = 50
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    name: str
+    # Builds ``(sql, params)`` for a sample row, with the same constant or builder the handler uses.
+    query: Callable[[Sample], Tuple[str, Sequence[Any]]]
+    # Sorting a single user's groups or a single group's members is bounded and cheap.
+    allow_filesort: bool = False
+
+
+def _pair(s: Sample) -> List[int]:
+    return [s["expense_id"], s["expense_id"] + 1]
+
+
+HOT_QUERIES: List[HotQuery] = [
+    HotQuery("user_by_email", lambda s: (queries.USER_BY_EMAIL_SQL, (s["email"],))),
+    HotQuery("email_in_use", lambda s: (queries.EMAIL_IN_USE_SQL, (s["email"],))),
+    HotQuery("list_groups", lambda s: (queries.LIST_GROUPS_SQL, (s["user_id"],)), allow_filesort=True),
+    HotQuery("my_balances", lambda s: (positions.POSITIONS_SQL, (s["user_id"],)), allow_filesort=True),
+    HotQuery("membership", lambda s: (queries.MEMBERSHIP_SQL, (s["group_id"], s["user_id"]))),
+    HotQuery(
+        "membership_batch",
+        lambda s: (
+            membership.MEMBERS_IN_SQL.format(placeholders="%s, %s"),
+            (s["group_id"], s["user_id"], s["user_id"] + 1),
+        ),
+    ),
+    HotQuery("group_member_ids", lambda s: (membership.GROUP_MEMBER_IDS_SQL, (s["group_id"],))),
+    HotQuery("group_members", lambda s: (queries.MEMBERS_SQL, (s["group_id"],)), allow_filesort=True),
+    HotQuery("expense_list", lambda s: queries.expense_page_query(s["group_id"], PAGE, None)),
+    HotQuery(
+        "expense_list_after_cursor",
+        lambda s: queries.expense_page_query(s["group_id"], PAGE, (s["date_added"], s["expense_id"])),
+    ),
+    # Sorts only the changed expenses of one delta, at most EXPENSE_PAGE_MAX rows.
+    HotQuery(
+        "expense_changes",
+        lambda s: queries.changed_expenses_query(s["group_id"], _pair(s)),
+        allow_filesort=True,
+    ),
+    HotQuery("export_expenses", lambda s: (exporter.EXPORT_SQL, (s["group_id"],))),
+    HotQuery("my_group_ids", lambda s: (queries.MY_GROUP_IDS_SQL, (s["user_id"],))),
+    HotQuery("activity_feed", lambda s: queries.activity_query([s["group_id"], s["group_id"] + 1], 20, None)),
+    HotQuery(
+        "activity_feed_after_cursor",
+        lambda s: queries.activity_query([s["group_id"]], 20, (s["date_added"], s["expense_id"])),
+    ),
+    HotQuery("expense_list_shares", lambda s: queries.expense_detail_queries(_pair(s))[0]),
+    HotQuery("expense_list_contributions", lambda s: queries.expense_detail_queries(_pair(s))[1]),
+    HotQuery("expense_list_payments", lambda s: queries.expense_detail_queries(_pair(s))[2]),
+    HotQuery("group_version", lambda s: (changes.VERSION_SQL, (s["group_id"],))),
+    HotQuery("changes_since", lambda s: (changes.CHANGES_SINCE_SQL, (s["group_id"], 0))),
+    HotQuery("expense_in_group", lambda s: (queries.EXPENSE_FOR_DELETE_SQL, (s["expense_id"], s["group_id"]))),
+    HotQuery("group_balances", lambda s: (queries.BALANCES_SQL, (s["group_id"],))),
+    HotQuery("lock_shares_in_group", lambda s: payments.lock_shares_query(s["user_id"], [s["group_id"]])),
+    HotQuery("lock_shares_all_groups", lambda s: payments.lock_shares_query(s["user_id"])),
+    HotQuery(
+        "lock_share",
+        lambda s: payments.lock_shares_query(s["user_id"], [s["group_id"]], s["expense_id"]),
+    ),
+    HotQuery(
+        "payments_for_shares",
+        lambda s: payments.credited_query("expense_payments", s["user_id"], _pair(s)),
+    ),
+    HotQuery(
+        "contributions_for_shares",
+        lambda s: payments.credited_query("expense_contributions", s["user_id"], _pair(s)),
+    ),
+    HotQuery("ledger_expense_contributions", lambda s: (ledger.EXPENSE_CONTRIBUTIONS_SQL, (s["expense_id"],))),
+    HotQuery("ledger_legacy_contribution", lambda s: (ledger.LEGACY_CONTRIBUTION_SQL, (s["expense_id"],))),
+    HotQuery(
+        "ledger_share_credits",
+        lambda s: (ledger.SHARE_CREDITS_SQL.format(where="es.expense_id=%s"), (s["expense_id"],)),
+    ),
+    *(
+        HotQuery(f"delete_{sql.split()[2]}", lambda s, sql=sql: (sql, (s["expense_id"],)))
+        for sql in queries.DELETE_EXPENSE_SQL
+    ),
+]
+
+
+def seed(conn, expense_count: int, group_count: int = 50, members_per_group: int = 8) -> None:
+    """Insert synthetic users, groups and expenses with shares, contributions and payments."""
+    cursor = conn.cursor()
+    rng = random.Random(1234)
+    user_count = group_count * members_per_group
+    cursor.executemany(
+        "INSERT INTO users (name, email, password) VALUES (%s, %s, %s)",
+        [(f"Seed {i}", f"seed-{i}-{rng.random()}@example.invalid", "x") for i in range(user_count)],
+    )
+    first_user = cursor.lastrowid
+    members: Dict[int, List[int]] = {}
+    for g in range(group_count):
+        owner = first_user + g * members_per_group
+        cursor.execute("INSERT INTO `groups` (group_name, created_by) VALUES (%s, %s)", (f"Seed {g}", owner))
+        group_id = cursor.lastrowid
+        members[group_id] = list(range(owner, owner + members_per_group))
+        cursor.executemany(
+            "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)",
+            [(group_id, user_id) for user_id in members[group_id]],
+        )
+    conn.commit()
+
+    group_ids = list(members)
+    for _ in range(expense_count):
+        group_id = rng.choice(group_ids)
+        payer = rng.choice(members[group_id])
+        cursor.execute(
+            "INSERT INTO expenses (group_id, title, amount, paid_by) VALUES (%s, %s, %s, %s)",
+            (group_id, "seed", members_per_group * 10, payer),
+        )
+        expense_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO expense_shares (expense_id, user_id, share_amount) VALUES (%s, %s, %s)",
+            [(expense_id, user_id, 10) for user_id in members[group_id]],
+        )
+        cursor.execute(
+            "INSERT INTO expense_contributions (expense_id, user_id, amount) VALUES (%s, %s, %s)",
+            (expense_id, payer, members_per_group * 10),
+        )
+        cursor.execute(
+            "INSERT INTO expense_payments (expense_id, user_id, amount) VALUES (%s, %s, %s)",
+            (expense_id, rng.choice(members[group_id]), 5),
+        )
+    conn.commit()
+    for table in ("users", "`groups`", "group_members", "expenses", "expense_shares", "expense_contributions", "expense_payments"):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+
+
+def _sample(conn) -> Sample:
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        """
+        SELECT e.group_id, e.id AS expense_id, e.date_added, es.user_id, u.email
+        FROM expenses e
+        JOIN expense_shares es ON es.expense_id = e.id
+        JOIN users u ON u.id = es.user_id
+        ORDER BY e.id DESC
+        LIMIT 1
+        """
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    if not row:
+        raise SystemExit("no expenses found; seed the database first (--seed N)")
+    return row
+
+
+def check(conn, queries: Optional[List[HotQuery]] = None) -> List[str]:
+    """EXPLAIN every query and return a description of each plan problem."""
+    sample = _sample(conn)
+    problems: List[str] = []
+    cursor = conn.cursor(dictionary=True)
+    for query in queries or HOT_QUERIES:
+        sql, params = query.query(sample)
+        cursor.execute("EXPLAIN " + sql, tuple(params))
+        for row in cursor.fetchall():
+            table = row.get("table") or ""
+            if table.startswith("<"):
+                # <derivedN>/<unionN,M>: an intermediate result, bounded by the checked plans that feed it.
+                continue
+            access = row.get("type")
+            extra = row.get("Extra") or ""
+            if access in ("ALL", "index"):
+                problems.append(f"{query.name}: full {'table' if access == 'ALL' else 'index'} scan on {table}")
+            if "Using filesort" in extra and not query.allow_filesort:
+                problems.append(f"{query.name}: filesort on {table}")
+    cursor.close()
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fail if a hot query plan scans or filesorts.")
+    parser.add_argument("--seed", type=int, default=0, metavar="EXPENSES", help="insert synthetic expenses first")
+    args = parser.parse_args(argv)
+
+    conn = _connect(config.DB_NAME)
+    try:
+        if args.seed:
+            seed(conn, args.seed)
+        problems = check(conn)
+    finally:
+        conn.close()
+
+    for problem in problems:
+        print(problem)
+    print(f"{len(HOT_QUERIES)} queries checked, {len(problems)} problem(s)")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Cache of encoded group responses, keyed by the group's change version.
+
+Every write to a group bumps ``groups.change_version`` in its own transaction
+(see ``backend/changes.py``). The expenses and balances endpoints already
+read that version first to answer ``If-None-Match``; ``cached`` then looks up
+the JSON body encoded for the same endpoint, group, version and query
+parameters, and only runs the queries and the encoder on a miss; the native
+handlers in ``backend/asgi.py`` share the entries through ``lookup`` and
+``store``. Next to the plain body, each entry keeps the body compressed with
+every codec a client has asked for (see ``backend/compression.py``), so a
+hit is sent as stored rather than compressed again.
+A write produces a new version and so a new key: entries are never
+invalidated, and never served after the data they were built from has
+changed. Older versions
+of a group are dropped when a newer one is stored, and the least recently
+used entries go once the cache holds ``RESPONSE_CACHE_MAX_BYTES``.
+
+Backends (``RESPONSE_CACHE_BACKEND``):
+
+- ``memory``: per worker process.
+- ``sqlite``: one SQLite file shared by the workers on one host
+  (``RESPONSE_CACHE_SQLITE_PATH``), a stand-in for a network cache, so a body
+  encoded by one worker serves them all.
+
+Hits, misses, evictions and the cached bytes are reported at ``/metrics``
+under ``response_cache``.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from flask import Response, request
+
+try:
+    from . import compression
+    from .config import config
+except ImportError:  # pragma: no cover - fallback for direct execution
+    import compression  # type: ignore
+    from config import config  # type: ignore
+
+JSON_MIMETYPE = "application/json"
+
+
+class MemoryResponseCache:
+    """LRU of encoded bodies, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        # key -> (group_id, version, body)
+        self._entries: "OrderedDict[str, Tuple[int, int, bytes]]" = OrderedDict()
+        self._by_group: Dict[int, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key: str, group_id: int, version: int, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            for old_key in list(self._by_group.get(group_id, ())):
+                if self._entries[old_key][1] < version:
+                    self._drop(old_key)
+            self._drop(key)
+            self._entries[key] = (group_id, version, body)
+            self._by_group.setdefault(group_id, set()).add(key)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        # Called with the lock held.
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[2])
+        keys = self._by_group[entry[0]]
+        keys.discard(key)
+        if not keys:
+            del self._by_group[entry[0]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class SqliteResponseCache:
+    """Encoded bodies in a SQLite file, shared by every process that opens it."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            group_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_group ON responses (group_id, version);
+        CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+    """
+
+    def __init__(self, max_bytes: int, path: Optional[str] = None) -> None:
+        self.max_bytes = max_bytes
+        self.path = path or config.RESPONSE_CACHE_SQLITE_PATH
+        self._local = threading.local()
+        self.evictions = 0
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=config.SQLITE_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # A cache: losing the last writes in a power cut only costs a few misses.
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        conn = self._connection()
+        row = conn.execute("SELECT body, used FROM responses WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        # Recency only needs to be rough; skip the write on most hits.
+        if now - row[1] > 1.0:
+            conn.execute("UPDATE responses SET used=? WHERE key=?", (now, key))
+        return row[0]
+
+    def put(self, key: str, group_id: int, version: int, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM responses WHERE group_id=? AND version<?", (group_id, version))
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, group_id, version, body, size, used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, group_id, version, body, len(body), time.time()),
+            )
+            (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            while total > self.max_bytes:
+                oldest = conn.execute("SELECT key, size FROM responses ORDER BY used LIMIT 1").fetchone()
+                conn.execute("DELETE FROM responses WHERE key=?", (oldest[0],))
+                total -= oldest[1]
+                self.evictions += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+BACKENDS = {
+    "memory": MemoryResponseCache,
+    "sqlite": SqliteResponseCache,
+}
+
+cache: Optional[Any] = (
+    BACKENDS[config.RESPONSE_CACHE_BACKEND](config.RESPONSE_CACHE_MAX_BYTES) if config.RESPONSE_CACHE_ENABLED else None
+)
+_counters: Dict[str, Dict[str, int]] = {}
+_counters_lock = threading.Lock()
+
+
+def _count(endpoint: str, outcome: str) -> None:
+    with _counters_lock:
+        counters = _counters.setdefault(endpoint, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+
+def _key(endpoint: str, group_id: int, version: int, params: Tuple[Hashable, ...]) -> str:
+    return f"{endpoint}:{group_id}:{version}:{params!r}"
+
+
+def _encoded(key: str, group_id: int, version: int, body: bytes, accept_encodings) -> Tuple[bytes, Optional[str]]:
+    """``body`` in the codec the client prefers, compressed now and stored under its own key."""
+    encoded, coding = compression.encode(body, accept_encodings)
+    if coding is not None:
+        cache.put(f"{key}:{coding}", group_id, version, encoded)
+    return encoded, coding
+
+
+def lookup(
+    endpoint: str, group_id: int, version: int, params: Tuple[Hashable, ...], accept_encodings
+) -> Optional[Tuple[bytes, Optional[str]]]:
+    """The body cached for ``endpoint`` at this version and ``params`` and its ``Content-Encoding``.
+
+    The stored variant in the client's preferred codec is returned as is; the
+    first hit for a codec compresses the plain body and stores the result.
+    Counted as a hit or a miss.
+    """
+    if cache is None:
+        return None
+    key = _key(endpoint, group_id, version, params)
+    codec = compression.choose(accept_encodings) if config.COMPRESS_ENABLED else None
+    if codec is not None:
+        body = cache.get(f"{key}:{codec[0]}")
+        if body is not None:
+            _count(endpoint, "hits")
+            return body, codec[0]
+    body = cache.get(key)
+    _count(endpoint, "misses" if body is None else "hits")
+    if body is None:
+        return None
+    return _encoded(key, group_id, version, body, accept_encodings)
+
+
+def store(
+    endpoint: str, group_id: int, version: int, params: Tuple[Hashable, ...], body: bytes, accept_encodings
+) -> Tuple[bytes, Optional[str]]:
+    """Cache ``body`` and its variant for this client; returns the bytes to send and their ``Content-Encoding``.
+
+    With the cache off, ``body`` is returned unchanged for the caller's usual
+    compression to handle.
+    """
+    if cache is None:
+        return body, None
+    key = _key(endpoint, group_id, version, params)
+    cache.put(key, group_id, version, body)
+    return _encoded(key, group_id, version, body, accept_encodings)
+
+
+def cached(
+    endpoint: str, group_id: int, version: int, params: Tuple[Hashable, ...], build: Callable[[], Response]
+) -> Response:
+    """The cached response for ``endpoint`` at this version and ``params``, else ``build()``'s, cached if 200."""
+    hit = lookup(endpoint, group_id, version, params, request.accept_encodings)
+    if hit is not None:
+        response = Response(hit[0], mimetype=JSON_MIMETYPE)
+        coding = hit[1]
+    else:
+        response = build()
+        if response.status_code != 200 or response.mimetype != JSON_MIMETYPE:
+            return response
+        body, coding = store(endpoint, group_id, version, params, response.get_data(), request.accept_encodings)
+        response.set_data(body)
+    if coding is not None:
+        # The after_request hook leaves encoded responses alone, Vary included.
+        response.headers["Content-Encoding"] = coding
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+def stats() -> Dict[str, Any]:
+    if cache is None:
+        return {"enabled": False}
+    with _counters_lock:
+        endpoints = {
+            endpoint: {
+                **counters,
+                "hit_rate": round(counters["hits"] / (counters["hits"] + counters["misses"]), 4),
+            }
+            for endpoint, counters in _counters.items()
+        }
+    return {**cache.stats(), "endpoints": endpoints}
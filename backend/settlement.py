@@ -0,0 +1,146 @@
+"""Turn net balances into a short list of transfers that settles a group.
+
+Balances are integer cents keyed by user id: positive means the group owes the
+user, negative means the user owes the group. Two solvers are available:
+
+- ``greedy`` repeatedly matches the largest debtor with the largest creditor
+  using two heaps. It is O(n log n) and needs at most n - 1 transfers.
+- ``exact`` finds the minimum number of transfers. A group whose members can be
+  split into k subgroups that each sum to zero needs n - k transfers, so the
+  solver looks for the largest such split with a DP over member subsets. That
+  is O(2^n * n) and is only tried for ``EXACT_MAX_MEMBERS`` non-zero members.
+  If the time budget runs out it falls back to ``greedy``.
+
+``auto`` uses ``exact`` for groups small enough to always solve within a few
+milliseconds, and ``greedy`` above that.
+"""
+
+from __future__ import annotations
+
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+MODES = ("auto", "greedy", "exact")
+EXACT_MAX_MEMBERS = 20
+AUTO_EXACT_MEMBERS = 12
+DEFAULT_BUDGET_MS = 50
+
+# (from_user_id, to_user_id, cents)
+Transfer = Tuple[int, int, int]
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def settle(
+    balances: Dict[int, int], mode: str = "auto", budget_ms: Optional[float] = None
+) -> Tuple[List[Transfer], str]:
+    """Return the transfers and the solver that produced them (``greedy`` or ``exact``)."""
+    if mode not in MODES:
+        raise ValueError(f"unknown settlement mode: {mode}")
+    nonzero = {user_id: cents for user_id, cents in balances.items() if cents}
+    limit = AUTO_EXACT_MEMBERS if mode == "auto" else EXACT_MAX_MEMBERS
+    if mode != "greedy":
+        transfers, rest = _match_opposites(nonzero)
+        if len(rest) <= limit:
+            budget = DEFAULT_BUDGET_MS if budget_ms is None else budget_ms
+            try:
+                return transfers + exact(rest, time.perf_counter() + budget / 1000), "exact"
+            except BudgetExceeded:
+                pass
+    return greedy(nonzero), "greedy"
+
+
+def greedy(balances: Dict[int, int]) -> List[Transfer]:
+    # Max-heaps via negated cents; user ids break ties so output is deterministic.
+    creditors = [(-cents, user_id) for user_id, cents in balances.items() if cents > 0]
+    debtors = [(cents, user_id) for user_id, cents in balances.items() if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers: List[Transfer] = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return transfers
+
+
+def _match_opposites(balances: Dict[int, int]) -> Tuple[List[Transfer], Dict[int, int]]:
+    """Settle pairs with exactly opposite balances directly.
+
+    A zero-sum pair is always one of the subgroups of some optimal split, so
+    pulling pairs out first never costs a transfer and shrinks the exact search.
+    """
+    waiting: Dict[int, List[int]] = {}
+    transfers: List[Transfer] = []
+    rest: Dict[int, int] = {}
+    for user_id in sorted(balances):
+        cents = balances[user_id]
+        partners = waiting.get(-cents)
+        if partners:
+            partner = partners.pop()
+            rest.pop(partner)
+            debtor, creditor = (user_id, partner) if cents < 0 else (partner, user_id)
+            transfers.append((debtor, creditor, abs(cents)))
+        else:
+            waiting.setdefault(cents, []).append(user_id)
+            rest[user_id] = cents
+    return transfers, rest
+
+
+def exact(balances: Dict[int, int], deadline: float) -> List[Transfer]:
+    """Minimum-transfer settlement; raises ``BudgetExceeded`` after ``deadline``."""
+    users = sorted(balances)
+    values = [balances[user_id] for user_id in users]
+    n = len(users)
+    if n == 0:
+        return []
+
+    size = 1 << n
+    sums = [0] * size
+    # best[mask]: most zero-sum subgroups that ``mask`` can be split into, plus a
+    # partial subgroup holding whatever is left over.
+    best = [0] * size
+    for mask in range(1, size):
+        if not mask & 0xFFF and time.perf_counter() > deadline:
+            raise BudgetExceeded
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + values[low.bit_length() - 1]
+        top = 0
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            if best[mask ^ bit] > top:
+                top = best[mask ^ bit]
+            bits ^= bit
+        best[mask] = top + (sums[mask] == 0)
+
+    # Walk back from the full set, removing one member at a time along an
+    # optimal path; every zero-sum mask on the way closes a subgroup.
+    transfers: List[Transfer] = []
+    mask = size - 1
+    group: Dict[int, int] = {}
+    while mask:
+        target = best[mask] - (sums[mask] == 0)
+        if sums[mask] == 0 and group:
+            transfers.extend(greedy(group))
+            group = {}
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            if best[mask ^ bit] == target:
+                break
+            bits ^= bit
+        index = bit.bit_length() - 1
+        group[users[index]] = values[index]
+        mask ^= bit
+    transfers.extend(greedy(group))
+    return transfers
@@ -0,0 +1,177 @@
+"""Embedded SQLite storage backend, selected with ``DB_BACKEND=sqlite``.
+
+``SqliteDatabase`` has the same interface as the MySQL ``Database``, so the
+rest of the backend does not know which one it talks to:
+
+- Each thread gets its own connection (a new one after ``fork()``), opened in
+  WAL mode so readers never wait for the single writer.
+- The MySQL statements in the backend are translated once per distinct SQL
+  string by ``translate``. It converts ``%s`` placeholders and backticks,
+  ``ON DUPLICATE KEY UPDATE`` upserts and ``NOW() - INTERVAL`` arithmetic. It
+  drops ``FOR UPDATE [OF ...]``, because write transactions start with
+  ``BEGIN IMMEDIATE`` and hold the database write lock instead.
+- Plain reads run as single autocommit statements. A ``transaction()`` that
+  starts while the thread's connection is already inside one joins it instead
+  of taking a second pooled connection as it would on MySQL.
+- Columns declared ``DECIMAL``, ``DATETIME`` and ``TIMESTAMP`` are read back
+  as ``Decimal`` and ``datetime``, like mysql-connector returns them.
+  ``DECIMAL`` values are stored with ``NUMERIC`` affinity and read back
+  rounded to cents.
+
+The schema comes from database/sqlite_schema.sql and is applied at startup.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from .config import config
+from .db import Database, Transaction
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "database" / "sqlite_schema.sql"
+
+_CENT = Decimal("0.01")
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE(?:\s+OF\s+\w+(?:\s*,\s*\w+)*)?\b", re.IGNORECASE)
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_REF = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+_NOW_MINUS_INTERVAL = re.compile(
+    r"\bNOW\(\)\s*-\s*INTERVAL\s+(\?|\d+)\s+(SECOND|MINUTE|HOUR|DAY)\b", re.IGNORECASE
+)
+_NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def translate(query: str) -> str:
+    """Rewrite one MySQL statement as used in this backend into SQLite SQL."""
+    sql = query.replace("%s", "?").replace("%%", "%").replace("`", '"')
+    sql = _FOR_UPDATE.sub("", sql)
+    match = _ON_DUPLICATE.search(sql)
+    if match:
+        # SQLite 3.35+ accepts a DO UPDATE without a conflict target.
+        head, tail = sql[: match.start()], sql[match.end() :]
+        sql = head + "ON CONFLICT DO UPDATE SET" + _VALUES_REF.sub(r"excluded.\1", tail)
+    sql = _NOW_MINUS_INTERVAL.sub(
+        lambda m: f"datetime('now', '-' || {m.group(1)} || ' {m.group(2).lower()}s')", sql
+    )
+    return _NOW.sub("CURRENT_TIMESTAMP", sql)
+
+
+def _dict_row(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _to_decimal(value: bytes) -> Decimal:
+    return Decimal(value.decode()).quantize(_CENT)
+
+
+def _to_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DECIMAL", _to_decimal)
+sqlite3.register_converter("DATETIME", _to_datetime)
+sqlite3.register_converter("TIMESTAMP", _to_datetime)
+
+
+class SqliteCursor:
+    """A ``sqlite3`` cursor that takes the backend's MySQL statements."""
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._cursor = cursor
+
+    def execute(self, query: str, params: Iterable[Any] = ()) -> None:
+        self._cursor.execute(translate(query), tuple(params))
+
+    def executemany(self, query: str, seq_params: Iterable[Iterable[Any]]) -> None:
+        self._cursor.executemany(translate(query), [tuple(params) for params in seq_params])
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+
+class SqliteTransaction(Transaction):
+    def _first_insert_id(self, row_count: int) -> int:
+        # SQLite reports the id of the last row of a multi-row INSERT.
+        return self.cursor.lastrowid - row_count + 1
+
+
+class SqliteDatabase(Database):
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or config.SQLITE_PATH
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = 0
+        with self.connection() as conn:
+            conn.executescript(SCHEMA_PATH.read_text())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=config.SQLITE_BUSY_TIMEOUT,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,  # transactions are begun explicitly
+        )
+        conn.row_factory = _dict_row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        yield conn
+
+    @contextmanager
+    def cursor(self, dictionary: bool = True, write: bool = True):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if not dictionary:
+                cursor.row_factory = None
+            # Single reads need no explicit transaction; each statement sees one snapshot.
+            owner = write and not conn.in_transaction
+            if owner:
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield SqliteCursor(cursor)
+                if owner:
+                    conn.execute("COMMIT")
+            except BaseException:
+                if owner and conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaction(self, write: bool = True):
+        with self.cursor(write=write) as cursor:
+            yield SqliteTransaction(cursor)
+
+    def fetch_one(self, query: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict[str, Any]]:
+        with self.transaction(write=False) as tx:
+            return tx.fetch_one(query, params)
+
+    def fetch_all(self, query: str, params: Optional[Iterable[Any]] = None) -> Iterable[Dict[str, Any]]:
+        with self.transaction(write=False) as tx:
+            return tx.fetch_all(query, params)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "sqlite", "path": self.path, "connections_opened": self._opened}
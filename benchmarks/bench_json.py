@@ -0,0 +1,110 @@
+"""JSON encoding cost of a large ``get_group_expenses`` response.
+
+    python benchmarks/bench_json.py [--expenses 10000] [--repeat 5]
+
+The payload has the shape the route returns: expense rows with ``Decimal``
+amounts and ``datetime`` timestamps, each with shares and contributions. The
+default case converts amounts with ``float()`` first and encodes with Flask's
+default provider, as the routes did before; the fast case hands the rows to
+``FastJSONProvider`` as they come from the database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.json_provider import FastJSONProvider  # noqa: E402
+
+
+def make_expenses(count, rng):
+    start = datetime(2024, 1, 1)
+    expenses = []
+    for expense_id in range(1, count + 1):
+        members = rng.sample(range(1, 41), 4)
+        amount = Decimal(rng.randint(100, 500_000)).scaleb(-2)
+        expenses.append(
+            {
+                "id": expense_id,
+                "title": f"Expense {expense_id}",
+                "amount": amount,
+                "paid_by": members[0],
+                "paid_by_name": f"User {members[0]}",
+                "date_added": start + timedelta(minutes=expense_id),
+                "shares": [
+                    {
+                        "user_id": user_id,
+                        "name": f"User {user_id}",
+                        "share_amount": 12.5,
+                        "paid_amount": 0.0,
+                        "pending_amount": 12.5,
+                    }
+                    for user_id in members
+                ],
+                "contributions": [{"user_id": members[0], "name": f"User {members[0]}", "amount": amount}],
+            }
+        )
+    return expenses
+
+
+def encode_default(app, expenses):
+    for expense in expenses:
+        expense["amount"] = float(expense["amount"])
+        for contribution in expense["contributions"]:
+            contribution["amount"] = float(contribution["amount"])
+    return app.json.response({"expenses": expenses, "next_cursor": None, "version": 1}).get_data()
+
+
+def encode_fast(app, expenses):
+    return app.json.response({"expenses": expenses, "next_cursor": None, "version": 1}).get_data()
+
+
+def best_of(repeat, fn, app, count):
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        expenses = make_expenses(count, random.Random(5))
+        start = time.perf_counter()
+        body = fn(app, expenses)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, body
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    default_app = Flask(__name__)
+    default_app.json = DefaultJSONProvider(default_app)
+    fast_app = Flask(__name__)
+    fast_app.json = FastJSONProvider(fast_app)
+
+    default_ms, default_body = best_of(args.repeat, encode_default, default_app, args.expenses)
+    fast_ms, fast_body = best_of(args.repeat, encode_fast, fast_app, args.expenses)
+
+    old, new = json.loads(default_body)["expenses"], json.loads(fast_body)["expenses"]
+    for before, after in zip(old, new):
+        before.pop("date_added"), after.pop("date_added")
+    assert old == new, "the two encodings disagree"
+
+    print(f"{args.expenses} expenses, {len(fast_body) / 1e6:.1f} MB")
+    print(f"default provider  {default_ms:8.1f} ms")
+    print(f"fast provider     {fast_ms:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
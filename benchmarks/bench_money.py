@@ -0,0 +1,95 @@
+"""Decimal vs integer-cents cost of the per-row money work in the read paths.
+
+    python benchmarks/bench_money.py [--rows 100000]
+
+Rows are ``Decimal`` values, as mysql-connector returns ``DECIMAL`` columns.
+Each case does the work one share row (expense list) or one member row
+(balances) costs: parse, credit/pending arithmetic and JSON conversion.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import money  # noqa: E402
+
+
+def _to_decimal(value):
+    # The helper backend/app.py used before money.py.
+    if isinstance(value, Decimal):
+        return value.quantize(Decimal("0.01"))
+    if isinstance(value, (int, float)):
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    return Decimal(value).quantize(Decimal("0.01"))
+
+
+def share_rows_decimal(rows):
+    out = []
+    for share_amount, paid, contributed in rows:
+        share_amount = _to_decimal(share_amount)
+        applied = min(_to_decimal(paid) + _to_decimal(contributed), share_amount)
+        pending = (share_amount - applied).quantize(Decimal("0.01"))
+        if pending < Decimal("0.00"):
+            pending = Decimal("0.00")
+        out.append((float(share_amount), float(applied.quantize(Decimal("0.01"))), float(pending)))
+    return out
+
+
+def share_rows_cents(rows):
+    out = []
+    for share_amount, paid, contributed in rows:
+        share_amount = money.to_cents(share_amount)
+        applied = min(money.to_cents(paid) + money.to_cents(contributed), share_amount)
+        out.append((money.to_json(share_amount), money.to_json(applied), money.to_json(max(0, share_amount - applied))))
+    return out
+
+
+def equal_split_decimal(amount, count):
+    per_person = (amount / count).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    shares = [per_person] * (count - 1)
+    shares.append((amount - per_person * (count - 1)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+    return shares
+
+
+def equal_split_cents(amount, count):
+    return money.split_even(amount, count)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(3)
+    rows = [
+        tuple(Decimal(rng.randint(0, 50_000)).scaleb(-2) for _ in range(3))
+        for _ in range(args.rows)
+    ]
+    decimal_ms, decimal_out = timed(share_rows_decimal, rows)
+    cents_ms, cents_out = timed(share_rows_cents, rows)
+    assert decimal_out == cents_out, "the two paths disagree"
+    print(f"share rows x{args.rows}: decimal {decimal_ms:8.1f} ms   cents {cents_ms:8.1f} ms")
+
+    amounts = [Decimal(rng.randint(100, 1_000_000)).scaleb(-2) for _ in range(args.rows // 10)]
+    cents = [money.to_cents(amount) for amount in amounts]
+    decimal_ms, _ = timed(lambda: [equal_split_decimal(amount, 7) for amount in amounts])
+    cents_ms, _ = timed(lambda: [equal_split_cents(amount, 7) for amount in cents])
+    print(f"equal split x{len(amounts)}: decimal {decimal_ms:8.1f} ms   cents {cents_ms:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
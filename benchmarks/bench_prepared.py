@@ -0,0 +1,69 @@
+"""Text protocol vs server-side prepared statements on the hot read queries.
+
+    DB_NAME=hostelsplit_plans python -m backend.query_plans --seed 200000
+    DB_NAME=hostelsplit_plans python benchmarks/bench_prepared.py [--iterations 5000]
+
+Needs a MySQL database with data in it; the seeded database from
+``backend.query_plans`` works. Each case runs the membership check and the
+group balances query back to back on one connection, through the same
+``Transaction`` helpers the routes use, with and without a ``StatementCache``
+(what ``DB_PREPARED=1`` turns on).
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.queries import BALANCES_SQL  # noqa: E402
+from backend.db import StatementCache, Transaction, db  # noqa: E402
+
+MEMBERSHIP_SQL = "SELECT user_id FROM group_members WHERE group_id=%s AND user_id IN (%s)"
+
+
+def run(tx: Transaction, queries, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for query, params in queries:
+            tx.fetch_all(query, params)
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    sample = db.fetch_one("SELECT group_id, user_id FROM group_members ORDER BY group_id DESC LIMIT 1")
+    if sample is None:
+        raise SystemExit("no group members found; seed the database first")
+    cases = {
+        "membership": [(MEMBERSHIP_SQL, (sample["group_id"], sample["user_id"]))],
+        "balances": [(BALANCES_SQL, (sample["group_id"],))],
+    }
+
+    with db.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        text = Transaction(cursor)
+        prepared = Transaction(cursor, StatementCache(conn, max_entries=16))
+        for name, queries in cases.items():
+            # Warm both paths (and prepare the statements) before timing.
+            run(text, queries, 10)
+            run(prepared, queries, 10)
+            text_s = run(text, queries, args.iterations)
+            prepared_s = run(prepared, queries, args.iterations)
+            print(
+                f"{name:<11} text {args.iterations / text_s:9.0f} q/s   "
+                f"prepared {args.iterations / prepared_s:9.0f} q/s   ({text_s / prepared_s:.2f}x)"
+            )
+        cursor.close()
+        conn.rollback()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Concurrent settlement: the previous per-row mark-paid against ``backend.payments``.
+
+    DB_BACKEND=sqlite SQLITE_PATH=/tmp/bench-settle.sqlite3 python benchmarks/bench_settle_concurrency.py
+    DB_NAME=hostelsplit_bench python benchmarks/bench_settle_concurrency.py [--users 20] [--expenses 100]
+
+Run it against a scratch database; it creates users, groups and payments.
+Each case seeds one group whose expenses are split among ``--users`` members,
+then has every member settle their whole balance from ``--duplicates``
+threads at once, like a double-clicked "mark paid" button, and checks that
+no share received more than its amount.
+
+``per-row`` is the previous behaviour: the pending shares are read without
+locks, then each payment is inserted and committed on its own. ``engine`` goes
+through the mark-paid route, which locks the shares and writes one
+multi-row insert per settlement. Admission control is turned off, so the
+rate limits do not cut the burst short.
+
+The exit status is non-zero when ``engine`` overpays any share or settles
+fewer shares per second than ``per-row``, so CI runs it as a check.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("ADMISSION_ENABLED", "0")
+
+from backend import money  # noqa: E402
+from backend.app import app  # noqa: E402
+from backend.db import db  # noqa: E402
+
+PASSWORD = "bench-password"
+
+PENDING_SQL = """
+    SELECT es.expense_id,
+           es.share_amount,
+           COALESCE((
+               SELECT SUM(p.amount) FROM expense_payments p
+               WHERE p.expense_id = es.expense_id AND p.user_id = es.user_id
+           ), 0) AS payments_amount,
+           COALESCE((
+               SELECT SUM(c.amount) FROM expense_contributions c
+               WHERE c.expense_id = es.expense_id AND c.user_id = es.user_id
+           ), 0) AS contributions_amount
+    FROM expense_shares es
+    JOIN expenses e ON es.expense_id = e.id
+    WHERE e.group_id=%s AND es.user_id=%s
+    ORDER BY es.expense_id
+"""
+
+OVERPAID_SQL = """
+    SELECT COUNT(*) AS overpaid
+    FROM (
+        SELECT es.share_amount,
+               COALESCE((
+                   SELECT SUM(p.amount) FROM expense_payments p
+                   WHERE p.expense_id = es.expense_id AND p.user_id = es.user_id
+               ), 0) AS paid,
+               COALESCE((
+                   SELECT SUM(c.amount) FROM expense_contributions c
+                   WHERE c.expense_id = es.expense_id AND c.user_id = es.user_id
+               ), 0) AS contributed
+        FROM expense_shares es
+        JOIN expenses e ON es.expense_id = e.id
+        WHERE e.group_id=%s
+    ) credits
+    WHERE paid > 0 AND paid + contributed > share_amount
+"""
+
+
+def client(email: str, name: str = ""):
+    test_client = app.test_client()
+    if name:
+        response = test_client.post("/api/register", json={"name": name, "email": email, "password": PASSWORD})
+    else:
+        response = test_client.post("/api/login", json={"email": email, "password": PASSWORD})
+    if response.status_code != 200:
+        raise SystemExit(f"could not sign in {email}: {response.get_json()}")
+    return test_client, response.get_json()["id"]
+
+
+def seed(users: int, expenses: int):
+    """A group of ``users`` members with ``expenses`` expenses paid by the first and split among all."""
+    run = uuid.uuid4().hex[:8]
+    members = [client(f"bench-{run}-{i}@example.com", f"Bench {i}") for i in range(users)]
+    owner, owner_id = members[0]
+    group_id = owner.post("/api/groups", json={"group_name": f"bench {run}"}).get_json()["id"]
+    for member, _ in members[1:]:
+        member.post(f"/api/groups/{group_id}/join")
+    user_ids = [user_id for _, user_id in members]
+    for i in range(expenses):
+        response = owner.post(
+            f"/api/groups/{group_id}/expenses",
+            json={
+                "title": f"expense {i}",
+                "amount": f"{users * 3}.{i % 100:02d}",
+                "paid_by": owner_id,
+                "split_among": user_ids,
+            },
+        )
+        if response.status_code != 201:
+            raise SystemExit(f"could not seed expenses: {response.get_json()}")
+    # Every request in the burst below is made by a debtor; the payer has nothing pending.
+    return group_id, members[1:]
+
+
+def per_row_mark_paid(group_id: int, user_id: int) -> int:
+    created = 0
+    for row in db.fetch_all(PENDING_SQL, (group_id, user_id)):
+        share = money.to_cents(row["share_amount"])
+        paid = money.to_cents(row["payments_amount"]) + money.to_cents(row["contributions_amount"])
+        pending = share - min(share, paid)
+        if pending > 0:
+            db.execute(
+                "INSERT INTO expense_payments (expense_id, user_id, amount) VALUES (%s, %s, %s)",
+                (row["expense_id"], user_id, money.to_sql(pending)),
+            )
+            created += 1
+    return created
+
+
+def burst(calls: List[Callable[[], int]]) -> tuple:
+    created: List[int] = []
+    lock = threading.Lock()
+
+    def worker(call: Callable[[], int]) -> None:
+        count = call()
+        with lock:
+            created.append(count)
+
+    threads = [threading.Thread(target=worker, args=(call,)) for call in calls]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sum(created)
+
+
+def engine_call(test_client, group_id: int, user_id: int) -> Callable[[], int]:
+    def call() -> int:
+        response = test_client.post(f"/api/groups/{group_id}/balances/{user_id}/mark-paid", json={})
+        return len(response.get_json().get("payments", [])) if response.status_code == 201 else 0
+
+    return call
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--expenses", type=int, default=100)
+    parser.add_argument("--duplicates", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    cases = {
+        "per-row": lambda group_id, members: [
+            (lambda user_id=user_id: per_row_mark_paid(group_id, user_id)) for _, user_id in members
+        ],
+        "engine": lambda group_id, members: [
+            engine_call(test_client, group_id, user_id) for test_client, user_id in members
+        ],
+    }
+    results = {}
+    for name, make_calls in cases.items():
+        group_id, members = seed(args.users, args.expenses)
+        calls = make_calls(group_id, members) * args.duplicates
+        elapsed, created = burst(calls)
+        overpaid = db.fetch_one(OVERPAID_SQL, (group_id,))["overpaid"]
+        shares = len(members) * args.expenses
+        print(
+            f"{name:<8} {len(calls)} requests in {elapsed:6.2f}s   {shares / elapsed:8.0f} shares settled/s   "
+            f"{created} payment rows for {shares} shares   overpaid shares: {overpaid}"
+        )
+        results[name] = (shares / elapsed, overpaid)
+
+    failures = []
+    engine_rate, engine_overpaid = results["engine"]
+    if engine_overpaid > 0:
+        failures.append(f"engine overpaid {engine_overpaid} shares")
+    per_row_rate = results["per-row"][0]
+    if engine_rate <= per_row_rate:
+        failures.append(f"engine settled {engine_rate:.0f} shares/s, not more than per-row's {per_row_rate:.0f}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Latency and transfer count of the settlement solvers at different group sizes.
+
+    python benchmarks/bench_settlement.py [--repeat 20] [--seed 7]
+
+``in-order`` is the previous behaviour: debtors and creditors paired in the
+order the members query returned them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend import settlement  # noqa: E402
+
+SIZES = (10, 100, 5000)
+
+
+def make_balances(members: int, rng: random.Random) -> Dict[int, int]:
+    # Roommate-style groups: most balances are a few round amounts, so zero-sum
+    # subgroups exist and the exact solver has something to find.
+    values = [rng.choice([-1, 1]) * rng.choice([500, 1000, 1500, 2500, 4000]) for _ in range(members - 1)]
+    values.append(-sum(values))
+    return {user_id: cents for user_id, cents in enumerate(values, start=1)}
+
+
+def in_order(balances: Dict[int, int]) -> List[settlement.Transfer]:
+    debtors = [[user_id, -cents] for user_id, cents in balances.items() if cents < 0]
+    creditors = [[user_id, cents] for user_id, cents in balances.items() if cents > 0]
+    transfers = []
+    d = c = 0
+    while d < len(debtors) and c < len(creditors):
+        amount = min(debtors[d][1], creditors[c][1])
+        transfers.append((debtors[d][0], creditors[c][0], amount))
+        debtors[d][1] -= amount
+        creditors[c][1] -= amount
+        d += debtors[d][1] == 0
+        c += creditors[c][1] == 0
+    return transfers
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    solvers = {
+        "in-order": lambda b: (in_order(b), "in-order"),
+        "greedy": lambda b: settlement.settle(b, "greedy"),
+        "auto": lambda b: settlement.settle(b, "auto"),
+        "exact": lambda b: settlement.settle(b, "exact"),
+    }
+
+    print(f"{'members':>8} {'solver':>9} {'used':>9} {'transfers':>10} {'median ms':>10} {'p95 ms':>8}")
+    for members in SIZES:
+        cases = [make_balances(members, rng) for _ in range(args.repeat)]
+        for name, solve in solvers.items():
+            timings, counts, used = [], [], set()
+            for balances in cases:
+                start = time.perf_counter()
+                transfers, mode = solve(balances)
+                timings.append((time.perf_counter() - start) * 1000)
+                counts.append(len(transfers))
+                used.add(mode)
+            p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+            print(
+                f"{members:>8} {name:>9} {'/'.join(sorted(used)):>9} {statistics.mean(counts):>10.1f} "
+                f"{statistics.median(timings):>10.3f} {p95:>8.3f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
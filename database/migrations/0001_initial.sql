@@ -1,5 +1,4 @@
-CREATE DATABASE IF NOT EXISTS hostelsplit CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
-USE hostelsplit;
+-- Baseline schema: the tables previously created by database/schema.sql.
 
 CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -66,3 +65,13 @@ CREATE TABLE IF NOT EXISTS expense_payments (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS group_balances (
+    group_id INT NOT NULL,
+    user_id INT NOT NULL,
+    total_contributed DECIMAL(12,2) NOT NULL DEFAULT 0,
+    total_owed DECIMAL(12,2) NOT NULL DEFAULT 0,
+    credited_to_shares DECIMAL(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (group_id, user_id),
+    FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
@@ -0,0 +1,14 @@
+-- Secondary indexes for the queries issued by backend/app.py.
+-- Composite indexes lead with the foreign key column, so InnoDB reuses them for
+-- the FK checks and the single-column FK indexes become redundant.
+
+CREATE INDEX idx_group_members_user ON group_members (user_id, group_id);
+
+CREATE INDEX idx_expenses_group_date ON expenses (group_id, date_added, id);
+
+CREATE INDEX idx_expense_shares_expense_user ON expense_shares (expense_id, user_id, share_amount);
+CREATE INDEX idx_expense_shares_user_expense ON expense_shares (user_id, expense_id, share_amount);
+
+CREATE INDEX idx_expense_contributions_expense_user ON expense_contributions (expense_id, user_id, amount);
+
+CREATE INDEX idx_expense_payments_expense_user ON expense_payments (expense_id, user_id, amount);
@@ -0,0 +1,4 @@
+-- Lets the cross-group activity feed walk expenses newest-first and stop after
+-- one page instead of sorting every expense in the user's groups.
+
+CREATE INDEX idx_expenses_date ON expenses (date_added, id);
@@ -0,0 +1,10 @@
+-- Event log shared between worker processes when EVENTS_BROADCASTER=table.
+-- Rows are pruned by the broadcaster after an hour.
+
+CREATE TABLE IF NOT EXISTS group_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    group_id INT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_group_events_created (created_at)
+);
@@ -0,0 +1,15 @@
+-- Per-group change version and expense change log for delta sync.
+-- Every write bumps groups.change_version and records the touched expenses;
+-- deletions are kept as tombstones so clients can drop them locally.
+
+ALTER TABLE `groups` ADD COLUMN change_version BIGINT NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS group_changes (
+    group_id INT NOT NULL,
+    version BIGINT NOT NULL,
+    expense_id INT NOT NULL,
+    change_type VARCHAR(16) NOT NULL,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_id, version, expense_id),
+    FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
+);
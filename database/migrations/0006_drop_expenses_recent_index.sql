@@ -0,0 +1,5 @@
+-- The activity feed now reads the newest expenses of each group through
+-- idx_expenses_group_date (group_id, date_added, id) and merges them, so the
+-- global date index from 0003 has no readers left and only slows down writes.
+
+DROP INDEX idx_expenses_date ON expenses;
@@ -0,0 +1,92 @@
+-- SQLite schema for DB_BACKEND=sqlite, equivalent to migrations 0001-0005.
+-- Applied by backend/sqlite_db.py on startup; every statement is idempotent.
+-- Amounts keep their DECIMAL declarations so reads convert them back to Decimal.
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS "groups" (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name VARCHAR(100) NOT NULL,
+    created_by INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    change_version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS group_members (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL REFERENCES "groups"(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (group_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL REFERENCES "groups"(id) ON DELETE CASCADE,
+    title VARCHAR(100) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    paid_by INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    date_added DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS expense_shares (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    expense_id INTEGER NOT NULL REFERENCES expenses(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    share_amount DECIMAL(10,2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS expense_contributions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    expense_id INTEGER NOT NULL REFERENCES expenses(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    amount DECIMAL(10,2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS expense_payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    expense_id INTEGER NOT NULL REFERENCES expenses(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    amount DECIMAL(10,2) NOT NULL,
+    paid_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS group_balances (
+    group_id INTEGER NOT NULL REFERENCES "groups"(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    total_contributed DECIMAL(12,2) NOT NULL DEFAULT 0,
+    total_owed DECIMAL(12,2) NOT NULL DEFAULT 0,
+    credited_to_shares DECIMAL(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (group_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS group_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS group_changes (
+    group_id INTEGER NOT NULL REFERENCES "groups"(id) ON DELETE CASCADE,
+    version BIGINT NOT NULL,
+    expense_id INTEGER NOT NULL,
+    change_type VARCHAR(16) NOT NULL,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_id, version, expense_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (user_id, group_id);
+CREATE INDEX IF NOT EXISTS idx_expenses_group_date ON expenses (group_id, date_added, id);
+DROP INDEX IF EXISTS idx_expenses_date;
+CREATE INDEX IF NOT EXISTS idx_expense_shares_expense_user ON expense_shares (expense_id, user_id, share_amount);
+CREATE INDEX IF NOT EXISTS idx_expense_shares_user_expense ON expense_shares (user_id, expense_id, share_amount);
+CREATE INDEX IF NOT EXISTS idx_expense_contributions_expense_user ON expense_contributions (expense_id, user_id, amount);
+CREATE INDEX IF NOT EXISTS idx_expense_payments_expense_user ON expense_payments (expense_id, user_id, amount);
+CREATE INDEX IF NOT EXISTS idx_group_events_created ON group_events (created_at);
@@ -19,7 +19,8 @@ async function apiRequest(path, options = {}) {
     },
   });
 
-  if (response.status === 204) {
+  // 304: the caller's copy (identified by `since` or an ETag) is still current
+  if (response.status === 204 || response.status === 304) {
     return null;
   }
 
@@ -35,6 +36,13 @@ async function apiRequest(path, options = {}) {
   return data;
 }
 
+function withQuery(path, params = {}) {
+  const query = new URLSearchParams(
+    Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== "")
+  ).toString();
+  return query ? `${path}?${query}` : path;
+}
+
 export const api = {
   session: () => apiRequest("/session"),
   login: (payload) =>
@@ -51,6 +59,9 @@ export const api = {
     apiRequest("/logout", {
       method: "POST",
     }),
+  me: {
+    activity: ({ limit, cursor } = {}) => apiRequest(withQuery("/me/activity", { limit, cursor })),
+  },
   groups: {
     list: () => apiRequest("/groups"),
     create: (payload) =>
@@ -63,9 +74,12 @@ export const api = {
         method: "POST",
       }),
     members: (groupId) => apiRequest(`/groups/${groupId}/members`),
-    balances: (groupId) => apiRequest(`/groups/${groupId}/balances`),
+    balances: (groupId, { since } = {}) => apiRequest(withQuery(`/groups/${groupId}/balances`, { since })),
+    events: (groupId) => new EventSource(`${API_BASE_URL}/groups/${groupId}/events`, { withCredentials: true }),
     expenses: {
-      list: (groupId) => apiRequest(`/groups/${groupId}/expenses`),
+      list: (groupId, { limit, cursor } = {}) =>
+        apiRequest(withQuery(`/groups/${groupId}/expenses`, { limit, cursor })),
+      changes: (groupId, since) => apiRequest(withQuery(`/groups/${groupId}/expenses`, { since })),
       create: (groupId, payload) =>
         apiRequest(`/groups/${groupId}/expenses`, {
           method: "POST",
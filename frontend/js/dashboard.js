@@ -166,23 +166,9 @@ function renderRecent(expenses) {
 
 async function loadData() {
   try {
-    const groups = await api.groups.list();
+    const [groups, activity] = await Promise.all([api.groups.list(), api.me.activity({ limit: 5 })]);
     renderGroups(groups);
-
-    const expenseResponses = await Promise.all(
-      groups.map(async (group) => {
-        const groupExpenses = await api.groups.expenses.list(group.id);
-        return groupExpenses.map((expense) => ({
-          ...expense,
-          group_name: group.group_name,
-          group_id: group.id,
-        }));
-      })
-    );
-
-    const expenses = expenseResponses.flat();
-    expenses.sort((a, b) => new Date(b.date_added) - new Date(a.date_added));
-    renderRecent(expenses);
+    renderRecent(activity.expenses);
   } catch (error) {
     alertError("Unable to load your groups right now.");
     console.error(error);
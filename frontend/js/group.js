@@ -12,10 +12,18 @@ const expenseList = document.querySelector("#expense-list");
 const logoutBtn = document.querySelector("#logout-btn");
 const addExpenseLink = document.querySelector("#add-expense-link");
 
+const EXPENSE_PAGE_SIZE = 50;
+
 // current signed-in user (filled during bootstrap)
 let currentUser = null;
-let _lastBalancesSnapshot = null;
+let loadedExpenses = [];
+let nextExpenseCursor = null;
+let loadingMoreExpenses = false;
+// change version of the group data currently on screen
+let groupVersion = null;
 let _balancesPollHandle = null;
+let _eventSource = null;
+let _refreshTimer = null;
 // Simple toast helper
 function showToast(msg, opts = {}) {
   const t = document.createElement("div");
@@ -123,83 +131,178 @@ function renderExpenses(expenses) {
     expenseList.innerHTML = '<div class="empty-state">No expenses yet. Add one to get started.</div>';
     return;
   }
+  appendExpenses(expenses);
+}
 
-  expenses.forEach((expense) => {
-    const card = document.createElement("article");
-    card.className = "list-item";
-    const date = new Date(expense.date_added).toLocaleString();
+function appendExpenses(expenses) {
+  const fragment = document.createDocumentFragment();
+  expenses.forEach((expense) => fragment.appendChild(createExpenseCard(expense)));
+  expenseList.appendChild(fragment);
+}
 
-    // Determine payer display name with fallback if API doesn't include it
-    const payerName = expense.paid_by_name || (expense.contributions && expense.contributions[0] && expense.contributions[0].name) || "Unknown";
-    if (!expense.paid_by_name) {
-      console.warn(`Expense ${expense.id} missing paid_by_name; using fallback: ${payerName}`);
-    }
+function createExpenseCard(expense) {
+  const card = document.createElement("article");
+  card.className = "list-item";
+  const date = new Date(expense.date_added).toLocaleString();
 
-    const shares = expense.shares
-      .map((share) => {
-        const parts = [];
-        if (share.paid_amount > 0) {
-          parts.push(`<span class="paid-amount">Paid: ${formatCurrency(share.paid_amount)}</span>`);
-        }
-        if (share.pending_amount > 0) {
-          parts.push(`<span class="pending-amount">Pending: ${formatCurrency(share.pending_amount)}</span>`);
-        }
-        const status = parts.length ? ` <span class="share-status">${parts.join(" · ")}</span>` : "";
-
-        // If the current user owes on this share, show a per-expense mark-paid button
-        const showExpenseMarkPaid =
-          currentUser &&
-          currentUser.id === share.user_id &&
-          share.pending_amount > 0 &&
-          Number(share.pending_amount) > 0;
-
-        const buttonHtml = showExpenseMarkPaid
-          ? ` <button class="mark-paid-btn expense-mark-paid-btn" data-expense-id="${expense.id}" data-user-id="${share.user_id}" data-amount="${share.pending_amount}" type="button">Mark Paid</button>`
-          : "";
-
-        return `<span class="tag">${share.name}: ${formatCurrency(share.share_amount)}${status}${buttonHtml}</span>`;
-      })
-      .join(" ");
-    
-    const contributions = expense.contributions
-      .map((contribution) => `<span class="tag">Paid ${contribution.name}: ${formatCurrency(contribution.amount)}</span>`)
-      .join(" ");
-    
-    // Show delete button to the payer (allow deletion after settlement as well)
-    const showDelete = currentUser && currentUser.id === expense.paid_by;
-    const deleteBtnHtml = showDelete
-      ? ` <button class="secondary" data-expense-id="${expense.id}" data-action="delete-expense" type="button">Delete Expense</button>`
-      : "";
+  // Determine payer display name with fallback if API doesn't include it
+  const payerName = expense.paid_by_name || (expense.contributions && expense.contributions[0] && expense.contributions[0].name) || "Unknown";
+  if (!expense.paid_by_name) {
+    console.warn(`Expense ${expense.id} missing paid_by_name; using fallback: ${payerName}`);
+  }
 
-    card.innerHTML = `
-      <h3>${expense.title}</h3>
-      <div class="meta">Paid by ${payerName} &middot; ${date}</div>
-      <p><strong>${formatCurrency(expense.amount)}</strong></p>
-      <div class="inline">${shares}</div>
-      <div class="inline">${contributions}</div>
-      <div class="inline">${deleteBtnHtml}</div>
-    `;
-    expenseList.appendChild(card);
+  const shares = expense.shares
+    .map((share) => {
+      const parts = [];
+      if (share.paid_amount > 0) {
+        parts.push(`<span class="paid-amount">Paid: ${formatCurrency(share.paid_amount)}</span>`);
+      }
+      if (share.pending_amount > 0) {
+        parts.push(`<span class="pending-amount">Pending: ${formatCurrency(share.pending_amount)}</span>`);
+      }
+      const status = parts.length ? ` <span class="share-status">${parts.join(" · ")}</span>` : "";
+
+      // If the current user owes on this share, show a per-expense mark-paid button
+      const showExpenseMarkPaid =
+        currentUser &&
+        currentUser.id === share.user_id &&
+        share.pending_amount > 0 &&
+        Number(share.pending_amount) > 0;
+
+      const buttonHtml = showExpenseMarkPaid
+        ? ` <button class="mark-paid-btn expense-mark-paid-btn" data-expense-id="${expense.id}" data-user-id="${share.user_id}" data-amount="${share.pending_amount}" type="button">Mark Paid</button>`
+        : "";
+
+      return `<span class="tag">${share.name}: ${formatCurrency(share.share_amount)}${status}${buttonHtml}</span>`;
+    })
+    .join(" ");
+
+  const contributions = expense.contributions
+    .map((contribution) => `<span class="tag">Paid ${contribution.name}: ${formatCurrency(contribution.amount)}</span>`)
+    .join(" ");
+
+  // Show delete button to the payer (allow deletion after settlement as well)
+  const showDelete = currentUser && currentUser.id === expense.paid_by;
+  const deleteBtnHtml = showDelete
+    ? ` <button class="secondary" data-expense-id="${expense.id}" data-action="delete-expense" type="button">Delete Expense</button>`
+    : "";
+
+  card.innerHTML = `
+    <h3>${expense.title}</h3>
+    <div class="meta">Paid by ${payerName} &middot; ${date}</div>
+    <p><strong>${formatCurrency(expense.amount)}</strong></p>
+    <div class="inline">${shares}</div>
+    <div class="inline">${contributions}</div>
+    <div class="inline">${deleteBtnHtml}</div>
+  `;
+
+  // Attach handlers for per-expense mark-paid buttons
+  card.querySelectorAll(".expense-mark-paid-btn").forEach((btn) => {
+    btn.addEventListener("click", async () => {
+      const expenseId = Number(btn.dataset.expenseId);
+      const userId = Number(btn.dataset.userId);
+      const amount = Number(btn.dataset.amount);
+      try {
+        const res = await api.groups.expenses.payments.create(groupId, expenseId, { user_id: userId, amount });
+        console.debug("expense payment created", { expenseId, userId, amount, res });
+        await loadGroup();
+      } catch (error) {
+        console.error("expense payment error", error);
+        alert(error.payload?.error || "Unable to mark expense as paid. Please try again.");
+      }
+    });
+  });
+
+  // Cards are appended page by page, so the delete handler is bound per card
+  card.querySelectorAll('[data-action="delete-expense"]').forEach((btn) => {
+    btn.addEventListener("click", async () => {
+      const expenseId = Number(btn.dataset.expenseId);
+      if (!confirm("Delete this expense? This action cannot be undone.")) return;
+      try {
+        await api.groups.expenses.delete(groupId, expenseId);
+        await loadGroup();
+      } catch (error) {
+        alert(error.payload?.error || "Unable to delete expense. Please try again.");
+      }
+    });
+  });
+
+  return card;
+}
+
+function isOlderExpense(a, b) {
+  const dateDiff = new Date(a.date_added) - new Date(b.date_added);
+  return dateDiff < 0 || (dateDiff === 0 && a.id < b.id);
+}
+
+// Apply a delta from `GET /expenses?since=`: swap changed cards, drop tombstones, add new ones
+function applyExpenseDelta(delta) {
+  const deleted = new Set(delta.deleted);
+  const changed = new Map(delta.changed.map((expense) => [expense.id, expense]));
+  const expenses = loadedExpenses
+    .filter((expense) => !deleted.has(expense.id))
+    .map((expense) => changed.get(expense.id) || expense);
+
+  const known = new Set(expenses.map((expense) => expense.id));
+  const oldestLoaded = expenses[expenses.length - 1];
+  delta.changed.forEach((expense) => {
+    if (known.has(expense.id)) return;
+    // expenses older than the loaded window arrive with the next page instead
+    if (nextExpenseCursor && oldestLoaded && isOlderExpense(expense, oldestLoaded)) return;
+    expenses.push(expense);
   });
 
-    // Attach handlers for per-expense mark-paid buttons
-    expenseList.querySelectorAll(".expense-mark-paid-btn").forEach((btn) => {
-      btn.addEventListener("click", async () => {
-        const expenseId = Number(btn.dataset.expenseId);
-        const userId = Number(btn.dataset.userId);
-        const amount = Number(btn.dataset.amount);
-        try {
-          const res = await api.groups.expenses.payments.create(groupId, expenseId, { user_id: userId, amount });
-          console.debug("expense payment created", { expenseId, userId, amount, res });
-          await loadGroup();
-        } catch (error) {
-          console.error("expense payment error", error);
-          alert(error.payload?.error || "Unable to mark expense as paid. Please try again.");
-        }
-      });
+  expenses.sort((a, b) => (isOlderExpense(a, b) ? 1 : isOlderExpense(b, a) ? -1 : 0));
+  loadedExpenses = expenses;
+}
+
+// Toast payments other members made on expenses we already have on screen
+function announcePayments(changedExpenses) {
+  const previous = new Map(loadedExpenses.map((expense) => [expense.id, expense]));
+  changedExpenses.forEach((expense) => {
+    const before = previous.get(expense.id);
+    if (!before) return;
+    const paidBefore = new Map(before.shares.map((share) => [share.user_id, Number(share.paid_amount || 0)]));
+    expense.shares.forEach((share) => {
+      const delta = Number(share.paid_amount || 0) - (paidBefore.get(share.user_id) || 0);
+      if (delta > 0) {
+        const payer = expense.paid_by_name || "Payer";
+        showToast(`${share.name} paid ${payer} ₹${delta.toFixed(2)} for '${expense.title}'`);
+      }
     });
+  });
+}
+
+async function loadMoreExpenses() {
+  if (!nextExpenseCursor || loadingMoreExpenses) return;
+  loadingMoreExpenses = true;
+  try {
+    const page = await api.groups.expenses.list(groupId, { limit: EXPENSE_PAGE_SIZE, cursor: nextExpenseCursor });
+    loadedExpenses = loadedExpenses.concat(page.expenses);
+    nextExpenseCursor = page.next_cursor;
+    appendExpenses(page.expenses);
+  } catch (error) {
+    console.debug("load more expenses error", error);
+  } finally {
+    loadingMoreExpenses = false;
+    // re-observe so a sentinel that is still on screen triggers the next page
+    expenseObserver.unobserve(expenseSentinel);
+    expenseObserver.observe(expenseSentinel);
+  }
 }
 
+const expenseSentinel = document.createElement("div");
+expenseSentinel.className = "expense-sentinel";
+expenseList.after(expenseSentinel);
+const expenseObserver = new IntersectionObserver(
+  (entries) => {
+    if (entries.some((entry) => entry.isIntersecting)) {
+      loadMoreExpenses();
+    }
+  },
+  { rootMargin: "400px" }
+);
+
 async function loadGroup() {
   const members = await api.groups.members(groupId);
   renderMembers(members);
@@ -209,78 +312,54 @@ async function loadGroup() {
   renderBalances(balances.balances);
   renderSettlements(balances.settlements);
 
-  const expenses = await api.groups.expenses.list(groupId);
-  renderExpenses(expenses);
+  const page = await api.groups.expenses.list(groupId, { limit: EXPENSE_PAGE_SIZE });
+  loadedExpenses = page.expenses;
+  nextExpenseCursor = page.next_cursor;
+  renderExpenses(loadedExpenses);
+
+  // the older of the two versions, so a write between the requests is re-fetched
+  groupVersion = Math.min(balances.version, page.version);
+}
+
+// Fetch only what changed since `groupVersion`; both requests answer 304 when nothing did
+async function refreshGroup() {
+  if (groupVersion === null) return;
+  const since = groupVersion;
+  try {
+    const [balances, delta] = await Promise.all([
+      api.groups.balances(groupId, { since }),
+      api.groups.expenses.changes(groupId, since),
+    ]);
+    if (!balances && !delta) return;
+
+    console.debug("group refresh: change detected, updating UI", { since, balances, delta });
+    if (delta) {
+      announcePayments(delta.changed);
+      applyExpenseDelta(delta);
+      renderExpenses(loadedExpenses);
+    }
+    if (balances) {
+      renderBalances(balances.balances);
+      renderSettlements(balances.settlements);
+    }
+    groupVersion = Math.min(balances ? balances.version : since, delta ? delta.version : since);
+  } catch (err) {
+    if (err.status === 409) {
+      // too far behind for a delta; reload from scratch
+      await loadGroup();
+      return;
+    }
+    // ignore transient errors but log for debugging
+    console.debug("balances+expenses poll error", err);
+  }
 }
 
-// Lightweight polling to refresh balances when others pay (frontend-only)
+// Polling fallback for when the event stream is unavailable
 function startBalancesPolling(intervalMs = 5000) {
   // avoid multiple intervals
   if (_balancesPollHandle) return;
 
-  _balancesPollHandle = setInterval(async () => {
-    try {
-      const [balances, expenses] = await Promise.all([
-        api.groups.balances(groupId),
-        api.groups.expenses.list(groupId),
-      ]);
-
-      // Build lightweight expense snapshot: map expenseId -> { shares: {user_id: paid_amount} }
-      const expensesSnapshot = {};
-      expenses.forEach((e) => {
-        expensesSnapshot[e.id] = {
-          id: e.id,
-          title: e.title,
-          paid_by_name: e.paid_by_name,
-          shares: {},
-        };
-        (e.shares || []).forEach((s) => {
-          expensesSnapshot[e.id].shares[s.user_id] = Number(s.paid_amount || 0);
-        });
-      });
-
-      const snapshotObj = { b: balances.balances, s: balances.settlements, e: expensesSnapshot };
-      const snapshot = JSON.stringify(snapshotObj);
-
-      if (snapshot !== _lastBalancesSnapshot) {
-        console.debug("balances+expenses poll: change detected, updating UI");
-
-        // If we have a previous snapshot, compute per-expense share payment deltas to show specific messages
-        if (_lastBalancesSnapshot) {
-          try {
-            const prev = JSON.parse(_lastBalancesSnapshot);
-            const prevExpenses = prev.e || {};
-            // iterate current expenses and compare paid_amounts
-            Object.keys(expensesSnapshot).forEach((expId) => {
-              const currExp = expensesSnapshot[expId];
-              const prevExp = prevExpenses[expId] || { shares: {} };
-              Object.keys(currExp.shares).forEach((userId) => {
-                const prevPaid = Number(prevExp.shares[userId] || 0);
-                const currPaid = Number(currExp.shares[userId] || 0);
-                if (currPaid > prevPaid) {
-                  const delta = (currPaid - prevPaid).toFixed(2);
-                  const payer = currExp.paid_by_name || "Payer";
-                  // find the debtor name from balances list
-                  const debtor = balances.balances.find((b) => Number(b.user_id) === Number(userId))?.name || "User";
-                  showToast(`${debtor} paid ${payer} ₹${delta} for '${currExp.title}'`);
-                }
-              });
-            });
-          } catch (e) {
-            console.debug("error diffing snapshots", e);
-          }
-        }
-
-        _lastBalancesSnapshot = snapshot;
-        renderBalances(balances.balances);
-        renderSettlements(balances.settlements);
-        renderExpenses(expenses);
-      }
-    } catch (err) {
-      // ignore transient errors but log for debugging
-      console.debug("balances+expenses poll error", err);
-    }
-  }, intervalMs);
+  _balancesPollHandle = setInterval(refreshGroup, intervalMs);
 }
 
 function stopBalancesPolling() {
@@ -290,6 +369,35 @@ function stopBalancesPolling() {
   }
 }
 
+// Coalesce bursts of events (e.g. a multi-expense settlement) into one refresh
+function scheduleRefresh(delayMs = 250) {
+  clearTimeout(_refreshTimer);
+  _refreshTimer = setTimeout(refreshGroup, delayMs);
+}
+
+// Live updates pushed by the server; polling is only used while the stream is down
+function startEventStream() {
+  if (!window.EventSource) {
+    startBalancesPolling(5000);
+    return;
+  }
+
+  _eventSource = api.groups.events(groupId);
+  _eventSource.onopen = () => {
+    stopBalancesPolling();
+    // catch up on anything written while we were disconnected
+    scheduleRefresh(0);
+  };
+  _eventSource.onmessage = (message) => {
+    console.debug("group event", message.data);
+    scheduleRefresh();
+  };
+  _eventSource.onerror = () => {
+    // EventSource reconnects on its own; poll until it does
+    startBalancesPolling(5000);
+  };
+}
+
 async function handleMarkPaid(userId) {
   try {
     const res = await api.groups.markPaid(groupId, userId);
@@ -316,14 +424,8 @@ async function bootstrap() {
   addExpenseLink.href = `add_expense.html?group_id=${groupId}`;
 
   await loadGroup();
-  // capture initial snapshot and start polling so balances update when others pay
-  try {
-    const initial = await api.groups.balances(groupId);
-    _lastBalancesSnapshot = JSON.stringify({ b: initial.balances, s: initial.settlements });
-  } catch (e) {
-    _lastBalancesSnapshot = null;
-  }
-  startBalancesPolling(5000);
+  // refresh when others write to the group
+  startEventStream();
   const groups = await api.groups.list();
   const currentGroup = groups.find((g) => g.id === groupId);
   groupNameEl.textContent = currentGroup?.group_name ?? "Group";
@@ -337,19 +439,7 @@ async function bootstrap() {
     }
   });
 
-  // Attach delete handlers for expenses (payer only)
-  expenseList.querySelectorAll('[data-action="delete-expense"]').forEach((btn) => {
-    btn.addEventListener("click", async () => {
-      const expenseId = Number(btn.dataset.expenseId);
-      if (!confirm("Delete this expense? This action cannot be undone.")) return;
-      try {
-        await api.groups.expenses.delete(groupId, expenseId);
-        await loadGroup();
-      } catch (error) {
-        alert(error.payload?.error || "Unable to delete expense. Please try again.");
-      }
-    });
-  });
+  expenseObserver.observe(expenseSentinel);
 }
 
 bootstrap();